@@ -2,9 +2,9 @@ import json
 from datetime import datetime
 
 from django.contrib import admin
-from django.db.models import Count, Q, Sum
-from django.db.models.functions import TruncMonth
-from .serializers import JobSerializer
+from django.db.models import F
+from . import authentication, reference, rollups
+from .paginator import EstimatedCountPaginator
 from .models import *
 from rangefilter.filters import (
     DateRangeFilterBuilder,
@@ -27,37 +27,42 @@ class ShipperAdmin(admin.ModelAdmin):
 
     actions = ('verify',)
 
+    def get_queryset(self, request):
+        # vehicle columns come with the page query instead of one lookup per row
+        return super().get_queryset(request).annotate(vehicle_name=F('shippermore__vehicle__name'),
+                                                      vehicle_number=F('shippermore__vehicle_number'))
+
     @admin.display(empty_value="-")
     def name(self, obj):
         return f'{obj.first_name} {obj.last_name}'
 
-    @admin.display(empty_value="-")
+    @admin.display(empty_value="-", ordering='vehicle_name')
     def vehicle(self, obj):
-        return obj.more.vehicle
+        return obj.vehicle_name
 
-    @admin.display(empty_value="-")
+    @admin.display(empty_value="-", ordering='vehicle_number')
     def vehicle_number(self, obj):
-        return obj.more.vehicle_number
+        return obj.vehicle_number
 
     def verify(self, request, queryset):
+        shipper_ids = list(queryset.values_list('pk', flat=True))
         queryset.update(verified=True)
+        # update() sends no post_save: drop the cached copies of these users explicitly
+        authentication.forget_users(shipper_ids)
         self.message_user(request, 'The selected shipper have been verified')
 
 
 class CategoryFilter(admin.SimpleListFilter):
     title = 'category'
     parameter_name = 'custom_filter'
-    categories = ProductCategory.objects.all()
 
     def lookups(self, request, model_admin):
-        return tuple((cate.id,cate.name) for cate in self.categories)
+        return tuple((category.id, category.name) for category in reference.get().categories.rows.values())
 
     def queryset(self, request, queryset):
-        # apply the filter to the queryset
-        for cate in self.categories:
-            if self.value() == str(cate.id):
-                print(cate.id)
-                return queryset.filter(Q(product__category__id=cate.id))
+        if self.value():
+            return queryset.filter(product__category_id=self.value())
+        return queryset
 
 
 class JobAdmin(admin.ModelAdmin):
@@ -70,57 +75,69 @@ class JobAdmin(admin.ModelAdmin):
                 default_end=datetime(2024, 12, 1),
             ),
         ),]
+    # newest first over the (created_at, id) index; no second COUNT(*) for the unfiltered total
+    ordering = ('-created_at', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
-        return Job.objects.select_related('shipment', 'shipment__pick_up', 'shipment__delivery_address', 'product',
-                                   'product__category', 'payment',
-                                   'payment__method',
-                                   'vehicle')
+        return super().get_queryset(request).annotate(category_name=F('product__category__name'))
 
     @admin.display(empty_value="-")
     def uuid(self, obj):
-        return f'#{obj.uuid.int[:12]}'
-    @admin.display(empty_value="-")
+        return f'#{obj.track_number}'
+
+    @admin.display(empty_value="-", ordering='category_name')
     def category(self, obj):
-        job = JobSerializer(obj).data
-        return job['product']['category']['name']
+        return obj.category_name
 
     @admin.display(empty_value="-")
     def track_number(self, obj):
-        job = JobSerializer(obj).data
-        return '# ' + str(job['uuid'])
-
+        return f'# {obj.track_number}'
 
 
 class ShipmentAdmin(admin.ModelAdmin):
     change_list_template = 'admin/shipment_change_list.html'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    dashboard_months = 24
+    recent_page_size = 10
 
     def changelist_view(self, request, extra_context=None):
+        # the recent jobs panel has its own page parameter, which the changelist must not see as a lookup
+        params = request.GET.copy()
+        try:
+            recent_page = max(int(params.pop('recent', ['1'])[0]), 1)
+        except ValueError:
+            recent_page = 1
+        request.GET = params
+
         response = super().changelist_view(
             request,
             extra_context=extra_context,
         )
-        query = Job.objects.all()
-        job = Job.objects.aggregate(
-            total=Count('pk'),
-            pending=Count('pk', filter=(Q(status=Job.Status.FINDING_SHIPPER) | Q(status=Job.Status.WAITING_PAY))),
-            shipping=Count('pk', filter=Q(status=Job.Status.WAITING_SHIPPER)),
-            done=Count('pk', filter=Q(status=Job.Status.DONE)),
-        )
+        if not hasattr(response, 'context_data'):
+            return response
 
-        shipments = Shipment.objects.annotate(month=TruncMonth('shipment_date')).values('month').annotate(
-            total_cost=Sum('cost'), count_shipment=Count('pk'))
         labels = []
         cost_data = []
         shipment_count_data = []
-        for s in shipments:
-            labels.append(s['month'].strftime('%b'))
-            cost_data.append(float(s['total_cost'] / 1000000))
-            shipment_count_data.append(s['count_shipment'])
+        for month, shipment_count, total_cost in rollups.monthly_series(self.dashboard_months):
+            labels.append(month.strftime('%b %Y'))
+            cost_data.append(float(total_cost / 1000000))
+            shipment_count_data.append(shipment_count)
+
+        # one page of recent jobs; an extra row tells whether there is a next page
+        offset = (recent_page - 1) * self.recent_page_size
+        recent = list(Job.objects.select_related('product__category', 'shipment').order_by('-created_at', '-id')
+                      [offset:offset + self.recent_page_size + 1])
 
-        response.context_data['job'] = job
+        response.context_data['job'] = rollups.status_counts()
         response.context_data['shipment'] = json.dumps({'labels': labels, 'cost_data': cost_data,'shipment_count_data': shipment_count_data})
-        response.context_data['shipment_data'] = JobSerializer(query,many=True).data
+        response.context_data['shipment_data'] = recent[:self.recent_page_size]
+        response.context_data['recent_page'] = recent_page
+        response.context_data['recent_previous'] = recent_page - 1 if recent_page > 1 else None
+        response.context_data['recent_next'] = recent_page + 1 if len(recent) > self.recent_page_size else None
         return response
 
 
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import authentication, metrics, reference
+        reference.connect_signals()
+        authentication.connect_signals()
+        metrics.connect_signals()
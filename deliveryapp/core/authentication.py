@@ -0,0 +1,198 @@
+import copy
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from rest_framework import exceptions
+from oauth2_provider.models import get_access_token_model
+
+from . import caching
+
+# Access token authentication without the per-request AccessToken + User queries.
+# A validated token is pickled together with its user into the shared cache (Redis) and into a
+# small per-process LRU, both for at most AUTH_TOKEN_CACHE['TIMEOUT'] seconds and never past the
+# token's expiry; expiry is checked again on every hit. Deleting a token (revoke-token, logout,
+# refresh) or saving / deleting its user (through any of the user proxy models) removes the Redis
+# entries once the transaction commits and bumps a generation the processes compare their LRU
+# against at most every CHECK_INTERVAL seconds, like the reference data registry. Code changing
+# users with queryset.update() sends no signal and calls forget_users() itself. Inactive users are
+# refused, cached or not.
+
+NAMESPACE = 'auth'
+CHECK_INTERVAL = 2  # seconds
+
+
+def _key(token):
+    # tokens are credentials: only their hash ends up in Redis
+    return f'auth:token:{hashlib.sha256(token.encode()).hexdigest()}'
+
+
+class LocalTokens:
+    """Per-process LRU of pickled tokens with a deadline each."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked = 0
+
+    def _check(self):
+        now = time.monotonic()
+        if now - self._checked < CHECK_INTERVAL:
+            return
+        generation = caching.generations(NAMESPACE)[0]
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+            self._checked = now
+
+    def get(self, key):
+        self._check()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE['LOCAL_SIZE']:
+                self._entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._checked = 0
+
+
+local = LocalTokens()
+
+
+def _bearer(request):
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(parts) == 2 and parts[0].lower() == 'bearer':
+        return parts[1]
+    return None
+
+
+def _timeout(access_token):
+    left = (access_token.expires - timezone.now()).total_seconds()
+    return min(settings.AUTH_TOKEN_CACHE['TIMEOUT'], int(left))
+
+
+def _dump(access_token):
+    access_token = copy.copy(access_token)
+    access_token._state = copy.copy(access_token._state)
+    # keep the user, leave the application (and its client secret) out of the cache
+    access_token._state.fields_cache = {'user': access_token.user}
+    return pickle.dumps(access_token, pickle.HIGHEST_PROTOCOL)
+
+
+def _active(result):
+    if result is not None and not result[0].is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    return result
+
+
+class CachedOAuth2Authentication(OAuth2Authentication):
+    """
+    OAuth2Authentication answering from the token cache. Requests without a bearer header, and
+    tokens that are not cached yet, go through the toolkit's validation as before.
+    """
+
+    def authenticate(self, request):
+        return _active(self._authenticate(request))
+
+    def _authenticate(self, request):
+        token = _bearer(request)
+        if token is None or not settings.AUTH_TOKEN_CACHE['ENABLED']:
+            return super().authenticate(request)
+
+        key = _key(token)
+        data = local.get(key)
+        if data is None:
+            data = cache.get(key)
+        if data is not None:
+            # unpickled per request: views may change request.user, the cached copy must not
+            access_token = pickle.loads(data)
+            if access_token.is_valid():
+                local.set(key, data, _timeout(access_token))
+                return access_token.user, access_token
+            local.discard([key])
+
+        result = super().authenticate(request)
+        if result is not None:
+            access_token = result[1]
+            timeout = _timeout(access_token)
+            if timeout > 0:
+                data = _dump(access_token)
+                cache.set(key, data, timeout)
+                local.set(key, data, timeout)
+        return result
+
+
+def forget(tokens):
+    """Drop cached tokens everywhere once the current transaction commits."""
+    keys = [_key(token) for token in tokens]
+
+    def drop():
+        cache.delete_many(keys)
+        local.discard(keys)
+        caching.invalidate(NAMESPACE)
+
+    transaction.on_commit(drop)
+
+
+def forget_users(user_ids):
+    """Drop the cached tokens of users changed without a post_save, e.g. by queryset.update()."""
+    tokens = list(get_access_token_model().objects.filter(user_id__in=user_ids).values_list('token', flat=True))
+    if tokens:
+        forget(tokens)
+
+
+def _on_token_save(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    # a refresh may give an existing row a new token string: forget the one being replaced too
+    stored = sender.objects.filter(pk=instance.pk).values_list('token', flat=True).first()
+    forget({instance.token, stored} - {None})
+
+
+def _on_token_delete(sender, instance, **kwargs):
+    forget([instance.token])
+
+
+def _on_user_save(sender, instance, created, **kwargs):
+    # saves through Shipper / BasicUser are sent with the proxy as sender
+    if created or sender._meta.concrete_model is not get_user_model():
+        return
+    forget_users([instance.pk])
+
+
+def connect_signals():
+    AccessToken = get_access_token_model()
+    pre_save.connect(_on_token_save, sender=AccessToken, dispatch_uid='auth:token:save')
+    post_delete.connect(_on_token_delete, sender=AccessToken, dispatch_uid='auth:token:delete')
+    # a deleted user's tokens are deleted with it, and forgotten one by one
+    post_save.connect(_on_user_save, dispatch_uid='auth:user:save')
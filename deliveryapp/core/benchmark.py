@@ -0,0 +1,443 @@
+import json
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, resolve
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model, get_application_model
+from rest_framework.test import APIClient
+
+from . import events, geo, media, metrics, reference, throttling
+from .models import *
+
+# API benchmark.
+# Builds a synthetic dataset, calls every route of core.urls through the test client and records
+# the query count, wall time and peak allocations of each call, so runs can be compared with a
+# stored baseline. Used by the benchmark management command on a throwaway test database.
+
+# routes that can't be measured as a single request/response
+EXCLUDED_ROUTES = {
+    'shipper-jobs/feed/': 'server-sent events stream that stays open',
+}
+
+CITIES = [
+    ('Hồ Chí Minh', ['Quận 1', 'Quận 3', 'Bình Thạnh', 'Phú Nhuận'], 10.7769, 106.7009),
+    ('Hà Nội', ['Ba Đình', 'Hoàn Kiếm', 'Cầu Giấy', 'Đống Đa'], 21.0285, 105.8542),
+    ('Đà Nẵng', ['Hải Châu', 'Sơn Trà', 'Thanh Khê'], 16.0544, 108.2022),
+]
+STREETS = ['Nguyễn Huệ', 'Lê Lợi', 'Trần Hưng Đạo', 'Hai Bà Trưng', 'Điện Biên Phủ', 'Võ Văn Tần']
+
+
+# --- dataset ----------------------------------------------------------------------------------
+
+class Dataset:
+    def __init__(self, jobs, seed=0):
+        self.size = jobs
+        self.rng = random.Random(seed)
+        self.next_id = {}
+
+    def ids(self, model, count):
+        start = self.next_id.get(model, 1)
+        self.next_id[model] = start + count
+        return range(start, start + count)
+
+    def address(self, near=None):
+        city, districts, lat, lng = near or self.rng.choice(CITIES)
+        latitude = Decimal(f'{lat + self.rng.uniform(-0.05, 0.05):.15f}')
+        longitude = Decimal(f'{lng + self.rng.uniform(-0.05, 0.05):.14f}')
+        return Address(contact='Nguyễn Văn A', phone_number='0901234567', country='Việt Nam', city=city,
+                       district=self.rng.choice(districts), street=self.rng.choice(STREETS),
+                       home_number=str(self.rng.randint(1, 300)), latitude=latitude, longitude=longitude,
+                       geohash=geo.encode(latitude, longitude))
+
+    def build(self):
+        rng = self.rng
+        self.vehicles = Vehicle.objects.bulk_create([
+            Vehicle(id=1, name='Xe máy', description='', capacity='30kg', icon='vehicle_icon/motorbike'),
+            Vehicle(id=2, name='Xe tải', description='', capacity='500kg', icon='vehicle_icon/truck')])
+        self.categories = ProductCategory.objects.bulk_create([
+            ProductCategory(id=i, name=name) for i, name in enumerate(['Thực phẩm', 'Quần áo', 'Điện tử'], 1)])
+        self.cash, self.online = PaymentMethod.objects.bulk_create([
+            PaymentMethod(id=1, name='Tiền mặt'), PaymentMethod(id=2, name='VNPay')])
+        Coupon.objects.create(key='QWICKER', start_at=date.today(), end_at=date.today() + timedelta(days=30),
+                              percen_discount=10)
+
+        self.admin = User.objects.create_user(username='bench-admin', password='x', email='admin@bench.vn',
+                                              role=User.Roles.ADMIN, is_staff=True)
+        posters = max(self.size // 20, 2)
+        shippers = max(self.size // 50, 2)
+        password = make_password('x')
+        users = [User(id=self.admin.id + i, username=f'poster{i}', email=f'poster{i}@bench.vn', first_name='Poster',
+                      last_name=str(i), role=User.Roles.BASIC_USER, password=password)
+                 for i in range(1, posters + 1)]
+        users += [User(id=self.admin.id + posters + i, username=f'shipper{i}', email=f'shipper{i}@bench.vn',
+                       first_name='Shipper', last_name=str(i), role=User.Roles.SHIPPER, password=password)
+                  for i in range(1, shippers + 1)]
+        User.objects.bulk_create(users)
+        self.posters = users[:posters]
+        self.shippers = users[posters:]
+        ShipperMore.objects.bulk_create([ShipperMore(user_id=s.id, vehicle_id=1, vehicle_number='59A-12345')
+                                         for s in self.shippers])
+        self.poster = self.posters[0]
+        self.shipper = Shipper.objects.get(pk=self.shippers[0].id)
+
+        addresses, shipments, products, payments, jobs, auctions, feedbacks = [], [], [], [], [], [], []
+        start = datetime.now() - timedelta(days=self.size // 24 + 1)
+        statuses = Job.Status.values
+        for i, job_id in enumerate(self.ids(Job, self.size)):
+            pick_up, delivery = self.address(), self.address()
+            pick_up.id, delivery.id = self.ids(Address, 2)
+            addresses += [pick_up, delivery]
+            created = start + timedelta(hours=i)
+            shipments.append(Shipment(id=job_id, pick_up_id=pick_up.id, delivery_address_id=delivery.id,
+                                      shipment_date=created, cost=Decimal(rng.randint(15, 200) * 1000)))
+            products.append(Product(id=job_id, category=rng.choice(self.categories), quantity=rng.randint(1, 5),
+                                    image=f'product/{job_id}', mass='1kg'))
+            payments.append(Payment(id=job_id, method=rng.choice([self.cash, self.online])))
+            status = rng.choice(statuses)
+            joined = rng.sample(self.shippers, min(3, len(self.shippers)))
+            winner = joined[0] if status in (Job.Status.WAITING_SHIPPER, Job.Status.DONE) else None
+            poster = self.posters[i % len(self.posters)]
+            jobs.append(Job(id=job_id, poster_id=poster.id, status=status, product_id=job_id, payment_id=job_id,
+                            shipment_id=job_id, vehicle=rng.choice(self.vehicles), description='Giao hàng nhanh',
+                            winner_id=winner.id if winner else None, created_at=created, updated_at=created))
+            auctions += [Auction(job_id=job_id, shipper_id=s.id) for s in joined]
+            if status == Job.Status.DONE:
+                feedbacks.append(Feedback(user_id=poster.id, shipper_id=winner.id, job_id=job_id,
+                                          rating=rng.randint(1, 5), comment='Tốt'))
+
+        Address.objects.bulk_create(addresses, batch_size=1000)
+        AddressToken.objects.index(*addresses)
+        Shipment.objects.bulk_create(shipments, batch_size=1000)
+        Product.objects.bulk_create(products, batch_size=1000)
+        Payment.objects.bulk_create(payments, batch_size=1000)
+        Job.objects.bulk_create(jobs, batch_size=1000)
+        Auction.objects.bulk_create(auctions, batch_size=1000)
+        Feedback.objects.bulk_create(feedbacks, batch_size=1000)
+        for feedback in feedbacks:
+            ShipperRating.objects.record(feedback.shipper_id, feedback.rating)
+
+        self.job = Job.objects.filter(poster_id=self.poster.id).order_by('id').first()
+        # a real access token, for the scenarios that authenticate like the apps do
+        application = get_application_model().objects.create(
+            name='bench', client_type='confidential', authorization_grant_type='password', user=self.admin)
+        self.token = get_access_token_model().objects.create(
+            user=self.poster, application=application, token='bench-poster-token', scope='read write',
+            expires=timezone.now() + timedelta(days=1))
+        # bulk_create sends no signals
+        reference.registry.clear()
+        return self
+
+    def fresh_job(self, status=Job.Status.FINDING_SHIPPER, joined=(), winner=None, payment_method=None):
+        """A job of the benchmark poster in the given state, for scenarios that change it."""
+        pick_up = self.address(CITIES[0])
+        pick_up.save()
+        delivery = self.address()
+        delivery.save()
+        shipment = Shipment.objects.create(pick_up=pick_up, delivery_address=delivery, shipment_date=datetime.now(),
+                                           cost=Decimal(30000))
+        product = Product.objects.create(category=self.categories[0], quantity=1, image='product/x', mass='1kg')
+        payment = Payment.objects.create(method=payment_method or self.cash)
+        job = Job.objects.create(poster_id=self.poster.id, status=status, shipment=shipment, product=product,
+                                 payment=payment, vehicle=self.vehicles[0], winner=winner)
+        Auction.objects.bulk_create([Auction(job=job, shipper_id=s.id) for s in joined])
+        return job
+
+
+# --- scenarios --------------------------------------------------------------------------------
+
+class Scenario:
+    def __init__(self, name, method, user, request, expected=200, setup=None, clear_cache=False):
+        self.name = name
+        self.method = method
+        self.user = user
+        # request(dataset, prepared) -> (path, data, format)
+        self.request = request
+        self.expected = expected
+        # setup(dataset) -> prepared value for one call, run outside the measurement
+        self.setup = setup
+        self.clear_cache = clear_cache
+
+
+def _get(path, data=None):
+    return lambda d, _: (path.format(d=d), data or {}, None)
+
+
+def _job_payload(d):
+    pick_up = {'contact': 'Trần B', 'phone_number': '0909999999', 'country': 'Việt Nam', 'city': 'Hồ Chí Minh',
+               'district': 'Quận 1', 'street': 'Lê Lợi', 'home_number': '12', 'latitude': '10.7769',
+               'longitude': '106.7009'}
+    return {
+        'shipment': json.dumps({'pick_up': pick_up, 'delivery_address': dict(pick_up, district='Quận 3'),
+                                'shipment_date': datetime.now().isoformat(), 'cost': 30000}),
+        'product': json.dumps({'category_id': d.categories[0].id, 'quantity': 1, 'mass': '1kg',
+                               'image': 'https://example.com/p.png'}),
+        'payment': json.dumps({'method_id': d.cash.id}),
+        'order': json.dumps({'description': 'benchmark', 'vehicle_id': d.vehicles[0].id}),
+    }
+
+
+def _bulk_payload(d, size=50):
+    order = {name: json.loads(value) for name, value in _job_payload(d).items()}
+    return {'orders': [order] * size}
+
+
+def _register_payload(d, prepared):
+    n = prepared
+    return ('/account/user/register/', {
+        'first_name': 'Bench', 'last_name': str(n), 'username': f'new{n}', 'email': f'new{n}@bench.vn',
+        'password': 'x', 'avatar': SimpleUploadedFile('a.png', b'\x89PNG', content_type='image/png')}, 'multipart')
+
+
+def _counter():
+    count = iter(range(1, 10 ** 9))
+    return lambda d: next(count)
+
+
+SCENARIOS = [
+    Scenario('api root', 'get', None, _get('/')),
+    # poster
+    Scenario('jobs list', 'get', 'poster', _get('/jobs/')),
+    Scenario('jobs list by status', 'get', 'poster', _get('/jobs/', {'status': '1,3'})),
+    Scenario('jobs list keyword', 'get', 'poster', _get('/jobs/', {'kw': 'nguyen hue'})),
+    Scenario('jobs list cursor', 'get', 'poster', _get('/jobs/', {'pagination': 'cursor'})),
+    Scenario('jobs retrieve', 'get', 'poster', _get('/jobs/{d.job.id}/')),
+    Scenario('jobs retrieve (bearer token)', 'get', 'poster-token', _get('/jobs/{d.job.id}/')),
+    Scenario('jobs list shippers', 'get', 'poster', _get('/jobs/{d.job.id}/list-shipper/')),
+    Scenario('jobs create', 'post', 'poster', lambda d, _: ('/jobs/', _job_payload(d), 'multipart'), expected=201),
+    Scenario('jobs bulk create (50)', 'post', 'poster', lambda d, _: ('/jobs/bulk/', _bulk_payload(d), 'json'),
+             expected=201),
+    Scenario('jobs assign', 'post', 'poster',
+             lambda d, job: (f'/jobs/{job.id}/assign/', {'shipper': d.shipper.id}, None),
+             setup=lambda d: d.fresh_job(joined=d.shippers[:3])),
+    Scenario('jobs cancel', 'post', 'poster', lambda d, job: (f'/jobs/{job.id}/cancel/', {}, None),
+             setup=lambda d: d.fresh_job()),
+    Scenario('jobs feedback', 'post', 'poster',
+             lambda d, job: (f'/jobs/{job.id}/feedback/',
+                             {'shipper_id': d.shipper.id, 'rating': 4, 'comment': 'ok'}, 'multipart'),
+             expected=201, setup=lambda d: d.fresh_job(Job.Status.DONE, winner=d.shipper)),
+    Scenario('payments checkout', 'post', 'poster',
+             lambda d, job: (f'/payments/{job.payment_id}/checkout/', {'order_id': job.id}, None),
+             setup=lambda d: d.fresh_job(Job.Status.WAITING_PAY, payment_method=d.online)),
+    Scenario('feedbacks list', 'get', 'poster', _get('/feedbacks/')),
+    Scenario('feedbacks by shipper', 'get', 'poster', _get('/feedbacks/', {'shipper': '{d.shipper.id}'})),
+    Scenario('feedbacks mine', 'get', 'poster',
+             lambda d, _: ('/feedbacks/my-feedback/',
+                           {'orderId': Feedback.objects.filter(user_id=d.poster.id).values_list('job_id', flat=True)
+                            .first() or d.job.id}, None)),
+    Scenario('users current', 'get', 'poster', _get('/users/current-user/')),
+    Scenario('users create', 'post', None,
+             lambda d, n: ('/users/', {'first_name': 'Bench', 'last_name': str(n), 'username': f'user{n}',
+                                       'email': f'user{n}@bench.vn', 'password': 'x'}, 'multipart'),
+             expected=201, setup=_counter()),
+    Scenario('vehicles list', 'get', None, _get('/vehicles/')),
+    Scenario('product categories list', 'get', None, _get('/product-categories/')),
+    Scenario('payment methods list', 'get', None, _get('/payment-method/')),
+    Scenario('coupon check', 'post', 'poster', lambda d, _: ('/coupon/my-coupon/', {'key': 'QWICKER'}, None)),
+    # shipper
+    Scenario('find (cold cache)', 'get', 'shipper', _get('/shipper-jobs/find/', {'page': 1}), clear_cache=True),
+    Scenario('find (warm cache)', 'get', 'shipper', _get('/shipper-jobs/find/', {'page': 1})),
+    Scenario('find nearby', 'get', 'shipper',
+             _get('/shipper-jobs/find/', {'latitude': 10.7769, 'longitude': 106.7009, 'radius': 5})),
+    Scenario('shipper jobs retrieve', 'get', 'shipper', _get('/shipper-jobs/{d.job.id}/')),
+    Scenario('shipper my jobs', 'get', 'shipper', _get('/shipper-jobs/my-jobs/')),
+    Scenario('shipper join', 'post', 'shipper', lambda d, job: (f'/shipper-jobs/{job.id}/join/', {}, None),
+             expected=201, setup=lambda d: d.fresh_job()),
+    Scenario('shipper complete', 'post', 'shipper', lambda d, job: (f'/shipper-jobs/{job.id}/complete/', {}, None),
+             setup=lambda d: d.fresh_job(Job.Status.WAITING_SHIPPER, joined=[d.shipper], winner=d.shipper)),
+    Scenario('auction create', 'post', 'shipper',
+             lambda d, job: ('/auction/', {'job': job.id, 'shipper': d.shipper.id}, None),
+             expected=201, setup=lambda d: d.fresh_job()),
+    Scenario('shippers current', 'get', 'shipper', _get('/shippers/current-user/')),
+    Scenario('shippers retrieve', 'get', 'poster', _get('/shippers/{d.shipper.id}/')),
+    Scenario('shippers create', 'post', None,
+             lambda d, n: ('/shippers/', {'first_name': 'Bench', 'last_name': str(n), 'username': f'shipper-new{n}',
+                                          'email': f'shipper-new{n}@bench.vn', 'password': 'x'}, None),
+             expected=201, setup=_counter()),
+    # accounts
+    Scenario('account check', 'post', None,
+             lambda d, _: ('/account/check-account/', {'email': 'nobody@bench.vn', 'username': 'nobody'}, None)),
+    Scenario('account register user', 'post', None, _register_payload, expected=201, setup=_counter()),
+    Scenario('account register shipper', 'post', None,
+             lambda d, n: ('/account/shipper/register/', {
+                 'first_name': 'Bench', 'last_name': str(n), 'username': f'newshipper{n}',
+                 'email': f'newshipper{n}@bench.vn', 'password': 'x', 'vehicle_id': d.vehicles[0].id,
+                 'vehicle_number': '59A'}, 'multipart'), expected=201, setup=_counter()),
+    Scenario('account register otp', 'post', None,
+             lambda d, _: ('/account/register/sent-otp/', {'email': 'new@bench.vn', 'username': 'new'}, None)),
+    Scenario('account sent otp', 'post', None,
+             lambda d, _: ('/account/sent-otp/', {'email': d.poster.email}, None)),
+    Scenario('account verify email', 'post', None,
+             lambda d, _: ('/account/verify-email/', {'email': d.poster.email, 'otp': '0000'}, None), expected=None),
+    Scenario('account reset password', 'post', None,
+             lambda d, _: ('/account/reset-password/', {'email': d.poster.email, 'new_password': 'x'}, None),
+             expected=204),
+    Scenario('account change password', 'post', 'poster',
+             lambda d, _: ('/account/change-password/', {'old_password': 'x', 'new_password': 'x'}, None),
+             expected=204),
+    # admin
+    Scenario('export jobs csv', 'get', 'admin', _get('/exports/jobs/')),
+    Scenario('export jobs ndjson', 'get', 'admin', _get('/exports/jobs/', {'as': 'ndjson', 'status': '1,2,3'})),
+    Scenario('metrics', 'get', 'admin', _get('/metrics/')),
+    Scenario('metrics reset', 'post', 'admin', lambda d, _: ('/metrics/reset/', {}, None), expected=204),
+    Scenario('metrics db pool', 'get', 'admin', _get('/metrics/db-pool/')),
+]
+
+
+def _format_data(data, d):
+    return {key: value.format(d=d) if isinstance(value, str) and '{d.' in value else value
+            for key, value in data.items()}
+
+
+# --- runner -----------------------------------------------------------------------------------
+
+@contextmanager
+def isolated():
+    """Keep side effects (cache, Celery, mail, media, events) inside the benchmark process."""
+    from deliveryapp.celery import app
+
+    # settings are read through the CELERY_ namespace, whose keys take precedence over the plain ones
+    celery_conf = {key: app.conf.get(key) for key in ('CELERY_BROKER_URL', 'CELERY_TASK_ALWAYS_EAGER')}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            MEDIA_ROOT=media_root,
+            MEDIA_STORAGE_BACKEND='core.media.LocalMediaStorage',
+            # the debug toolbar would instrument every request of the benchmark client (127.0.0.1)
+            DEBUG_TOOLBAR_CONFIG={'SHOW_TOOLBAR_CALLBACK': lambda request: False},
+            JOB_EVENTS={'BROKER': 'core.events.InMemoryBroker', 'REDIS_URL': None, 'HISTORY': 1000, 'HEARTBEAT': 15},
+            REQUEST_METRICS={'ENABLED': False, 'SAMPLE_RATE': 0, 'STORE': 'core.metrics.InMemoryMetricsStore',
+                             'REDIS_URL': None},
+            # scenarios repeat the same request; the throttles' cost is still measured, they just never refuse
+            THROTTLING={'STORE': 'core.throttling.InMemoryBucketStore', 'REDIS_URL': None,
+                        'RATES': {scope: '1000000/s' for scope in settings.THROTTLING['RATES']}}):
+        # queued tasks stay in an in-memory transport instead of reaching a worker
+        app.conf.update(CELERY_BROKER_URL='memory://', CELERY_TASK_ALWAYS_EAGER=False)
+        for cached in (media.get_storage, events.get_broker, metrics.get_store, throttling.get_store):
+            cached.cache_clear()
+        try:
+            yield
+        finally:
+            app.conf.update(celery_conf)
+            for cached in (media.get_storage, events.get_broker, metrics.get_store, throttling.get_store):
+                cached.cache_clear()
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _call(client, scenario, dataset, prepared, trace=False):
+    path, data, fmt = scenario.request(dataset, prepared)
+    data = _format_data(data, dataset)
+    if scenario.clear_cache:
+        from django.core.cache import cache
+        cache.clear()
+        # a cleared cache makes the reference registry reload; do it here rather than in whichever
+        # timed call runs its next version check
+        reference.registry.clear()
+        reference.get()
+    counter = _QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        kwargs = {'format': fmt} if fmt else {}
+        response = getattr(client, scenario.method)(path, data, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+        peak = 0
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return path, response, counter.count, elapsed, peak
+
+
+def run(dataset, repeat=5, only=None):
+    clients = {None: APIClient()}
+    for role, user in (('poster', dataset.poster), ('shipper', dataset.shipper), ('admin', dataset.admin)):
+        clients[role] = APIClient()
+        clients[role].force_authenticate(user)
+    clients['poster-token'] = APIClient()
+    clients['poster-token'].credentials(HTTP_AUTHORIZATION=f'Bearer {dataset.token.token}')
+
+    results = {}
+    for scenario in SCENARIOS:
+        if only and scenario.name not in only:
+            continue
+        client = clients[scenario.user]
+        timings = []
+        queries = []
+        statuses = set()
+        # one warm-up call, one traced call for allocations, then the timed calls
+        for i in range(repeat + 2):
+            prepared = scenario.setup(dataset) if scenario.setup else None
+            path, response, count, elapsed, peak = _call(client, scenario, dataset, prepared, trace=(i == 1))
+            statuses.add(response.status_code)
+            if i == 1:
+                alloc_kb = round(peak / 1024, 1)
+            elif i > 1:
+                timings.append(elapsed)
+                queries.append(count)
+        results[scenario.name] = {
+            'route': resolve(path).route,
+            'status': sorted(statuses),
+            'queries': max(queries),
+            'ms': round(statistics.median(timings), 2),
+            'alloc_kb': alloc_kb,
+        }
+        if scenario.expected is not None and statuses != {scenario.expected}:
+            results[scenario.name]['error'] = f'expected {scenario.expected}, got {sorted(statuses)}'
+    return results
+
+
+def _patterns(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _patterns(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            yield route
+
+
+def uncovered_routes(results):
+    from . import urls
+
+    covered = {result['route'] for result in results.values()}
+    routes = [route for route in _patterns(urls.urlpatterns) if '<format>' not in route]
+    return [route for route in routes if route not in covered and route not in EXCLUDED_ROUTES]
+
+
+def compare(results, baseline, tolerance=0.5, slack_ms=2.0, slack_kb=32.0):
+    """Regressions of results against baseline: more queries, or time/allocations beyond tolerance."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {base['queries']} -> {result['queries']} queries")
+        if result['ms'] > base['ms'] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{name}: {base['ms']} -> {result['ms']} ms")
+        if result['alloc_kb'] > base['alloc_kb'] * (1 + tolerance) + slack_kb:
+            regressions.append(f"{name}: {base['alloc_kb']} -> {result['alloc_kb']} KiB allocated")
+    return regressions
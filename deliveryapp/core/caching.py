@@ -0,0 +1,70 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics
+
+# Namespaced, versioned cache for job listings.
+# Every key embeds the current generation of its namespaces, so a write only has to
+# bump a counter: old entries are never looked up again and simply expire by TTL.
+# This replaces enumerating keys with KEYS/SCAN on every write.
+
+JOBS = 'jobs'
+JOB_PAGE_TIMEOUT = 60 * 5
+
+
+def shipper_namespace(shipper_id):
+    return f'{JOBS}:shipper:{shipper_id}'
+
+
+def _generation_key(namespace):
+    return f'gen:{namespace}'
+
+
+def _new_generation():
+    # start from a clock value so a lost counter never reuses an older generation
+    return int(time.time() * 1000)
+
+
+def generations(*namespaces):
+    keys = [_generation_key(ns) for ns in namespaces]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        generation = found.get(key)
+        if generation is None:
+            cache.add(key, _new_generation(), None)
+            generation = cache.get(key)
+        result.append(generation)
+    return result
+
+
+def make_key(namespaces, suffix):
+    parts = [f'{ns}@{gen}' for ns, gen in zip(namespaces, generations(*namespaces))]
+    return ':'.join(parts + [suffix])
+
+
+def invalidate(*namespaces):
+    for namespace in namespaces:
+        key = _generation_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _new_generation(), None)
+
+
+def changed(*namespaces):
+    """Invalidate the namespaces once the current transaction commits (right away outside of one)."""
+    # bumping earlier would let a concurrent reader cache the pre-commit rows under the new generation
+    transaction.on_commit(lambda: invalidate(*namespaces))
+
+
+def get(key):
+    value = cache.get(key)
+    metrics.record_job_cache(value is not None)
+    return value
+
+
+def set(key, value, timeout=JOB_PAGE_TIMEOUT):
+    cache.set(key, value, timeout)
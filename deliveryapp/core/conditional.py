@@ -0,0 +1,56 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import reference
+
+# Conditional GET for job screens.
+# A job's validators are read with one narrow query over Job.updated_at / Job.version, which every
+# write to a job bumps (see core.transitions), so a client holding the current copy gets its 304
+# before the job is fetched or serialized. The reference data version is part of every ETag because
+# vehicles, categories and payment methods are nested in the job JSON.
+# Listings are validated after the page query, from the rows on the page and the page's links (and
+# count), so no aggregate runs over the whole list; the 304 saves the serialization and the body.
+# They only get an ETag: no timestamp of the page notices a job deleted from it.
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5(repr((reference.get().version,) + parts).encode()).hexdigest())
+
+
+def for_job(queryset, pk, *fields):
+    """Validators of one job; fields are extra values the representation depends on."""
+    row = queryset.order_by().filter(pk=pk).values_list('updated_at', 'version', *fields).first()
+    if row is None:
+        return None
+    return _etag(pk, *row), row[0]
+
+
+def for_page(request, paginator, page):
+    """Validators of a page of jobs: any job on the page changing, or the page's links moving, changes the ETag."""
+    rows = [(job.pk, job.version, job.updated_at) for job in page]
+    # links (and count, for numbered pages) without the results
+    meta = paginator.get_paginated_response(None)
+    return _etag(request.user.pk, request.get_full_path(), rows, meta), None
+
+
+def _timestamp(value):
+    return int(value.timestamp()) if value else None
+
+
+def not_modified(request, validators):
+    """The 304 (or 412) response when the request's preconditions say so, else None."""
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+
+
+def stamp(response, validators):
+    if validators is not None:
+        etag, last_modified = validators
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(_timestamp(last_modified))
+    return response
@@ -0,0 +1,58 @@
+from django.db.backends.mysql import base
+
+from .. import pool
+
+# The MySQL backend with pooled connections (see core.db.pool): ENGINE 'core.db.mysql', and an
+# optional 'POOL' dict next to OPTIONS with SIZE, TIMEOUT, MAX_LIFETIME and HEALTH_CHECK_AFTER.
+# Leave CONN_MAX_AGE at 0: Django "closes" the connection at the end of each request or Celery
+# task, which hands it back to the pool.
+
+
+def _ping(connection):
+    connection.ping()
+
+
+def _reset(connection):
+    if not connection.get_autocommit():
+        connection.rollback()
+        connection.autocommit(True)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _pool_entry = None
+
+    @property
+    def pool(self):
+        def create():
+            options = {**pool.DEFAULTS, **self.settings_dict.get('POOL', {})}
+            params = self.get_connection_params()
+            return pool.Pool(lambda: super(DatabaseWrapper, self).get_new_connection(params), _ping, _reset,
+                             size=options['SIZE'], timeout=options['TIMEOUT'],
+                             max_lifetime=options['MAX_LIFETIME'], health_check_after=options['HEALTH_CHECK_AFTER'])
+
+        return pool.get_pool(self.alias, create)
+
+    def get_new_connection(self, conn_params):
+        self._pool_entry = self.pool.checkout()
+        return self._pool_entry.connection
+
+    def init_connection_state(self):
+        # session settings stay with the connection; run them once, not at every checkout
+        if self._pool_entry is None or not self._pool_entry.initialized:
+            super().init_connection_state()
+            if self._pool_entry is not None:
+                self._pool_entry.initialized = True
+
+    def _set_autocommit(self, autocommit):
+        # pooled connections come back in autocommit mode, skip the round trip
+        if self.connection.get_autocommit() != autocommit:
+            super()._set_autocommit(autocommit)
+
+    def _close(self):
+        entry, self._pool_entry = self._pool_entry, None
+        if entry is None or entry.connection is not self.connection:
+            return super()._close()
+        # a connection that raised may be broken: don't hand it to the next request
+        discard = self.errors_occurred and not self.is_usable()
+        with self.wrap_database_errors:
+            self.pool.checkin(entry, discard=discard)
@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+# Process-wide pools of database connections, one per database alias.
+# Django opens a connection per thread when a request (or Celery task) first queries and closes it
+# when the request ends; with the pooled backend "open" takes a connection from here and "close"
+# puts it back, so the TCP handshake and MySQL authentication happen once per connection instead
+# of once per request. Connections are recycled after MAX_LIFETIME seconds, pinged before reuse
+# when they sat idle longer than HEALTH_CHECK_AFTER seconds, and at most SIZE are open per process;
+# a checkout waits up to TIMEOUT seconds for one to come back.
+
+DEFAULTS = {
+    'SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 30 * 60,
+    'HEALTH_CHECK_AFTER': 30,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class Entry:
+    __slots__ = ('connection', 'created', 'used', 'initialized', 'pid')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.used = time.monotonic()
+        # the backend's per-connection session setup has run
+        self.initialized = False
+        # the process that checked it out
+        self.pid = None
+
+
+class _Waiter:
+    __slots__ = ('event', 'granted', 'entry')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.entry = None
+
+
+class Pool:
+    """
+    connect() opens a DB-API connection, ping(connection) raises when it is unusable and
+    reset(connection) returns it to a clean state (no open transaction, autocommit on).
+    Waiting checkouts are served first come, first served: a returned connection goes straight to
+    the oldest waiter instead of to whichever thread asks next.
+    """
+
+    def __init__(self, connect, ping, reset, size=DEFAULTS['SIZE'], timeout=DEFAULTS['TIMEOUT'],
+                 max_lifetime=DEFAULTS['MAX_LIFETIME'], health_check_after=DEFAULTS['HEALTH_CHECK_AFTER']):
+        self.connect = connect
+        self.ping = ping
+        self.reset = reset
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._idle = []
+        self._waiters = deque()
+        # checked out connections, and slots reserved for ones being opened
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(('checkouts', 'created', 'waits', 'wait_ms', 'max_wait_ms', 'timeouts',
+                                    'recycled', 'health_check_failures', 'discarded'), 0)
+
+    def _after_fork(self):
+        # a forked child (e.g. a prefork Celery worker) must not talk over the parent's sockets;
+        # the connections are dropped without closing them, which would end the parent's sessions
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._waiters = deque()
+            self._in_use = 0
+
+    def _expired(self, entry, now):
+        return self.max_lifetime is not None and now - entry.created >= self.max_lifetime
+
+    @staticmethod
+    def _close(entry):
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        """Reserve a slot; returns an idle entry, or None when a connection has to be opened."""
+        with self._lock:
+            self._after_fork()
+            self.stats['checkouts'] += 1
+            if not self._waiters:
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if self._in_use < self.size:
+                    self._in_use += 1
+                    return None
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+            self.stats['waits'] += 1
+        started = time.monotonic()
+        waiter.event.wait(self.timeout)
+        waited = (time.monotonic() - started) * 1000
+        with self._lock:
+            self.stats['wait_ms'] += waited
+            self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], waited)
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                self.stats['timeouts'] += 1
+                raise PoolTimeout(f'no database connection available within {self.timeout}s ({self.size} in use)')
+        return waiter.entry
+
+    def _usable(self, entry):
+        now = time.monotonic()
+        if self._expired(entry, now):
+            self._count('recycled')
+            return False
+        if now - entry.used >= self.health_check_after:
+            try:
+                self.ping(entry.connection)
+            except Exception:
+                self._count('health_check_failures')
+                return False
+        return True
+
+    def _pop_idle(self):
+        with self._lock:
+            return self._idle.pop() if self._idle else None
+
+    def checkout(self):
+        entry = self._acquire()
+        # the slow parts run outside the lock, on the slot reserved above
+        try:
+            while entry is not None and not self._usable(entry):
+                self._close(entry)
+                entry = self._pop_idle()
+            if entry is None:
+                entry = Entry(self.connect())
+                self._count('created')
+            entry.pid = os.getpid()
+            return entry
+        except BaseException:
+            with self._lock:
+                self._hand_over(None)
+            raise
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _hand_over(self, entry):
+        # with the lock held: give the caller's slot (and entry, if any) to the oldest waiter,
+        # or back to the pool
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.entry = entry
+            waiter.granted = True
+            waiter.event.set()
+            return
+        self._in_use = max(self._in_use - 1, 0)
+        if entry is not None:
+            self._idle.append(entry)
+
+    def checkin(self, entry, discard=False):
+        if not discard:
+            try:
+                self.reset(entry.connection)
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        expired = not discard and self._expired(entry, now)
+        with self._lock:
+            if entry.pid != os.getpid():
+                # checked out before a fork; the child has no slot to give back
+                return
+            if expired:
+                self.stats['recycled'] += 1
+            elif discard:
+                self.stats['discarded'] += 1
+            else:
+                entry.used = now
+            self._hand_over(None if discard or expired else entry)
+        if discard or expired:
+            self._close(entry)
+
+    def close(self):
+        """Close the idle connections; checked out ones are closed when they come back."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._close(entry)
+
+    def status(self):
+        with self._lock:
+            status = {'size': self.size, 'in_use': self._in_use, 'idle': len(self._idle),
+                      'waiting': len(self._waiters)}
+            status.update(self.stats)
+        status['wait_ms'] = round(status['wait_ms'], 2)
+        status['max_wait_ms'] = round(status['max_wait_ms'], 2)
+        return status
+
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    """The pool of a database alias, created with factory() on first use."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = factory()
+    return pool
+
+
+def status():
+    return {alias: pool.status() for alias, pool in sorted(_pools.items())}
+
+
+def close_all():
+    for pool in list(_pools.values()):
+        pool.close()
@@ -0,0 +1,140 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Read replicas with read-your-writes.
+# ReplicaRoutingMiddleware opens a Routing for each request; PrimaryReplicaRouter sends the reads
+# of GET/HEAD/OPTIONS requests to a random replica, everything else (writes, unsafe requests,
+# Celery tasks, commands) to the primary. Once a request writes, its remaining reads go to the
+# primary, and its user (or client IP, when anonymous) is pinned to the primary for STICKY_SECONDS
+# through the shared cache, so the next screens see the job, join or feedback just saved even
+# when the replicas lag. Views opt in or out with the replica_reads decorator.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = ContextVar('db_routing', default=None)
+
+
+def replica_reads(enabled=True):
+    """Decorator for views, viewsets and viewset actions: whether their reads may go to a replica."""
+    def decorate(view):
+        view.replica_reads = enabled
+        return view
+
+    return decorate
+
+
+def view_setting(view_func, method):
+    """The replica_reads of the handler a request resolved to, None when not set."""
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    # a viewset action (list, retrieve, @action methods) decorated on its own
+    handler = getattr(cls, actions.get(method.lower(), ''), None) if cls is not None else None
+    for target in (handler, cls, view_func):
+        value = getattr(target, 'replica_reads', None)
+        if value is not None:
+            return value
+    return None
+
+
+def pin_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'db:pin:user:{user.pk}'
+    return f"db:pin:ip:{request.META.get('REMOTE_ADDR')}"
+
+
+class Routing:
+    __slots__ = ('request', 'replica', 'wrote', '_alias', '_pinned', '_resolving')
+
+    def __init__(self, request):
+        self.request = request
+        self.replica = request.method in SAFE_METHODS
+        self.wrote = False
+        self._alias = None
+        self._pinned = None
+        self._resolving = False
+
+    @property
+    def alias(self):
+        # one replica per request, so its queries all see the same point of the replication stream
+        if self._alias is None:
+            self._alias = random.choice(settings.REPLICA_ROUTING['REPLICAS'])
+        return self._alias
+
+    def pinned(self):
+        if self._resolving:
+            # resolving request.user reads the user itself: that read goes to the primary
+            return True
+        if self._pinned is None:
+            self._resolving = True
+            try:
+                self._pinned = cache.get(pin_key(self.request)) is not None
+            finally:
+                self._resolving = False
+        return self._pinned
+
+    def pin(self):
+        cache.set(pin_key(self.request), 1, settings.REPLICA_ROUTING['STICKY_SECONDS'])
+
+
+def start(request):
+    routing = Routing(request)
+    return routing, _current.set(routing)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def within(routing, iterable):
+    """Iterate a streaming response body with the request's routing in place."""
+    iterator = iter(iterable)
+    while True:
+        token = _current.set(routing)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield item
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # related objects come from where the instance came from
+            return instance._state.db
+        replicas = settings.REPLICA_ROUTING['REPLICAS']
+        routing = _current.get()
+        if (not replicas or routing is None or not routing.replica or routing.wrote
+                or model._meta.app_label in settings.REPLICA_ROUTING['PRIMARY_APPS'] or routing.pinned()):
+            return DEFAULT_DB_ALIAS
+        return routing.alias
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_ROUTING['REPLICAS']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema through replication
+        if db in settings.REPLICA_ROUTING['REPLICAS']:
+            return False
+        return None
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+from collections import deque
+from functools import lru_cache
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Live job feed.
+# Views publish job events; shippers subscribed to the feed endpoint receive them instead of
+# polling find. Every event has an id that clients send back (Last-Event-ID / ?cursor=) when they
+# reconnect, so they resume where they stopped.
+
+JOB_CREATED = 'job.created'
+JOB_ASSIGNED = 'job.assigned'
+JOB_CANCELLED = 'job.cancelled'
+# sent when a subscriber fell too far behind or resumed from an expired cursor:
+# the client should reload find and subscribe again without a cursor
+RESYNC = 'resync'
+
+# a Redis stream id as XREAD accepts it: <milliseconds>[-<sequence>]
+_STREAM_ID = re.compile(r'\d+(-\d+)?')
+
+
+class InMemoryBroker:
+    """Single-process broker for tests and development."""
+
+    def __init__(self, history=1000, queue_size=100):
+        self.queue_size = queue_size
+        self._events = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._subscribers = set()
+
+    def publish(self, event):
+        with self._lock:
+            self._last_id += 1
+            item = (str(self._last_id), event)
+            self._events.append(item)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(item)
+
+    async def subscribe(self, last_id=None, heartbeat=15):
+        subscriber = _Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            backlog = []
+            expired = False
+            if last_id is not None:
+                try:
+                    last_id = int(last_id)
+                    backlog = [item for item in self._events if int(item[0]) > last_id]
+                    oldest = int(self._events[0][0]) if self._events else self._last_id + 1
+                    expired = oldest > last_id + 1
+                except ValueError:
+                    expired = True
+            self._subscribers.add(subscriber)
+        try:
+            if expired:
+                yield str(self._last_id), {'type': RESYNC}
+                return
+            for item in backlog:
+                yield item
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield item
+                if item[1]['type'] == RESYNC:
+                    return
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+class _Subscriber:
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.size = size
+        # one extra slot is kept for the resync marker
+        self.queue = asyncio.Queue(size + 1)
+        self.overflowed = False
+
+    def offer(self, item):
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.size:
+            # slow consumer: stop buffering and tell it to resync instead of growing without bound
+            self.overflowed = True
+            item = (item[0], {'type': RESYNC})
+        self.queue.put_nowait(item)
+
+
+class RedisBroker:
+    """Fan-out through a capped Redis stream; the stream ids double as resume cursors."""
+
+    def __init__(self, url=None, stream='job:events', history=1000, batch_size=100):
+        self.url = url or settings.JOB_EVENTS['REDIS_URL']
+        self.stream = stream
+        self.history = history
+        self.batch_size = batch_size
+        self._client = None
+
+    def publish(self, event):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        self._client.xadd(self.stream, {'event': json.dumps(event)}, maxlen=self.history, approximate=True)
+
+    async def _latest(self, client):
+        latest = await client.xrevrange(self.stream, count=1)
+        return latest[0][0].decode() if latest else '0-0'
+
+    async def _oldest(self, client):
+        oldest = await client.xrange(self.stream, count=1)
+        return oldest[0][0].decode() if oldest else '0-0'
+
+    async def subscribe(self, last_id=None, heartbeat=15):
+        client = aioredis.Redis.from_url(self.url)
+        try:
+            if last_id is None:
+                last_id = await self._latest(client)
+            elif (not _STREAM_ID.fullmatch(last_id)
+                  or _stream_id(await self._oldest(client)) > _stream_id(last_id)):
+                # a malformed cursor (XREAD would reject it and end the stream) or one past the
+                # capped history; the resync carries the current id, which the browser sends back
+                # as Last-Event-ID when it reconnects
+                yield await self._latest(client), {'type': RESYNC}
+                return
+            while True:
+                # reading in bounded batches only when the client has consumed the previous one
+                # keeps a slow connection from buffering the whole stream
+                response = await client.xread({self.stream: last_id}, count=self.batch_size,
+                                              block=heartbeat * 1000)
+                if not response:
+                    yield None
+                    continue
+                for event_id, fields in response[0][1]:
+                    last_id = event_id.decode()
+                    yield last_id, json.loads(fields[b'event'])
+        finally:
+            await client.aclose()
+
+
+def _stream_id(value):
+    millis, _, seq = value.partition('-')
+    return int(millis), int(seq or 0)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    options = settings.JOB_EVENTS
+    return import_string(options['BROKER'])(history=options['HISTORY'])
+
+
+def job_payload(job):
+    pick_up = job.shipment.pick_up if job.shipment_id else None
+    return {
+        'id': job.id,
+        'status': job.status,
+        'vehicle': job.vehicle_id,
+        'cost': str(job.shipment.cost) if job.shipment_id and job.shipment.cost is not None else None,
+        'latitude': str(pick_up.latitude) if pick_up else None,
+        'longitude': str(pick_up.longitude) if pick_up else None,
+        'geohash': pick_up.geohash if pick_up else None,
+    }
+
+
+def publish(event_type, job):
+    """
+    Publish once the current transaction commits; a broker outage never fails the request.
+    job is a payload from job_payload() or a bare {'id': ...}.
+    """
+
+    def send():
+        try:
+            get_broker().publish({'type': event_type, 'job': job})
+        except Exception as e:
+            logger.warning('could not publish %s for job %s: %s', event_type, job['id'], e)
+
+    transaction.on_commit(send)
+
+
+def format_sse(event_id, event):
+    return f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,170 @@
+import csv
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import orjson
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .models import Job
+
+# Full exports of jobs with their shipment, addresses, payment and winner.
+# Rows are read as tuples (values_list, no model instances) in keyset windows over the
+# (created_at, id) indexes, each window a fresh query. QuerySet.iterator() alone would not keep
+# memory flat here: mysqlclient buffers a whole result set on the client. Writers turn every
+# window into text as it arrives, so memory is bounded by CHUNK_SIZE, not by the export size.
+
+CHUNK_SIZE = 1000
+# lines are handed to the response / file in blocks of about this size, not one write per row
+BLOCK_SIZE = 64 * 1024
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# (column, lookup)
+COLUMNS = [
+    ('id', 'id'),
+    ('uuid', 'uuid'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('poster_id', 'poster_id'),
+    ('poster_username', 'poster__username'),
+    ('description', 'description'),
+    ('vehicle', 'vehicle__name'),
+    ('product_category', 'product__category__name'),
+    ('product_quantity', 'product__quantity'),
+    ('product_mass', 'product__mass'),
+    ('shipment_type', 'shipment__type'),
+    ('shipment_date', 'shipment__shipment_date'),
+    ('shipment_cost', 'shipment__cost'),
+    ('pick_up_contact', 'shipment__pick_up__contact'),
+    ('pick_up_phone', 'shipment__pick_up__phone_number'),
+    ('pick_up_home_number', 'shipment__pick_up__home_number'),
+    ('pick_up_street', 'shipment__pick_up__street'),
+    ('pick_up_district', 'shipment__pick_up__district'),
+    ('pick_up_city', 'shipment__pick_up__city'),
+    ('pick_up_latitude', 'shipment__pick_up__latitude'),
+    ('pick_up_longitude', 'shipment__pick_up__longitude'),
+    ('delivery_contact', 'shipment__delivery_address__contact'),
+    ('delivery_phone', 'shipment__delivery_address__phone_number'),
+    ('delivery_home_number', 'shipment__delivery_address__home_number'),
+    ('delivery_street', 'shipment__delivery_address__street'),
+    ('delivery_district', 'shipment__delivery_address__district'),
+    ('delivery_city', 'shipment__delivery_address__city'),
+    ('delivery_latitude', 'shipment__delivery_address__latitude'),
+    ('delivery_longitude', 'shipment__delivery_address__longitude'),
+    ('payment_method', 'payment__method__name'),
+    ('payment_amount', 'payment__amount'),
+    ('payment_date', 'payment__payment_date'),
+    ('poster_pays', 'payment__is_poster_pay'),
+    ('winner_id', 'winner_id'),
+    ('winner_username', 'winner__username'),
+    ('winner_first_name', 'winner__first_name'),
+    ('winner_last_name', 'winner__last_name'),
+]
+HEADER = [column for column, _ in COLUMNS]
+LOOKUPS = [lookup for _, lookup in COLUMNS]
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_filters(since=None, until=None, status=None):
+    """Filters from request/command strings: since and until are inclusive dates, status a comma list."""
+    filters = {}
+    for name, value in (('since', since), ('until', until)):
+        if value:
+            try:
+                # None when malformed, ValueError for a well formed day that doesn't exist (2024-02-30)
+                day = parse_date(value) if isinstance(value, str) else value
+            except ValueError:
+                day = None
+            if day is None:
+                raise ExportError(f'{name} must be a date (YYYY-MM-DD)')
+            filters[name] = day
+    if status:
+        statuses = [s.strip() for s in status.split(',') if s.strip()]
+        unknown = set(statuses) - set(Job.Status.values)
+        if unknown:
+            raise ExportError(f"unknown status {', '.join(sorted(unknown))}")
+        filters['statuses'] = statuses
+    return filters
+
+
+def jobs(since=None, until=None, statuses=None):
+    query = Job.objects.all()
+    if since:
+        query = query.filter(created_at__gte=datetime.combine(since, time.min))
+    if until:
+        query = query.filter(created_at__lt=datetime.combine(until + timedelta(days=1), time.min))
+    if statuses:
+        query = query.filter(status__in=statuses)
+    return query
+
+
+def rows(query, chunk_size=CHUNK_SIZE):
+    """Tuples in COLUMNS order, oldest first, one query per chunk_size rows."""
+    query = query.order_by('created_at', 'id').values_list(*LOOKUPS)
+    after = None
+    while True:
+        window = query
+        if after is not None:
+            created_at, pk = after
+            window = query.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        chunk = list(window[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1][3], chunk[-1][0]
+
+
+class _Line:
+    # file-like target for csv.writer that hands each written line back
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield orjson.dumps(dict(zip(HEADER, row)), default=_default, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _blocks(lines):
+    block, size = [], 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield line[:0].join(block)
+            block, size = [], 0
+    if block:
+        yield block[0][:0].join(block)
+
+
+def lines(rows, export_format):
+    return _blocks(csv_lines(rows) if export_format == 'csv' else ndjson_lines(rows))
+
+
+def filename(export_format, filters):
+    parts = ['jobs']
+    if filters.get('since'):
+        parts.append(filters['since'].isoformat())
+    if filters.get('until'):
+        parts.append(filters['until'].isoformat())
+    return f"{'_'.join(parts)}.{export_format}"
@@ -0,0 +1,97 @@
+import math
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# precision used when storing an address geohash
+GEOHASH_PRECISION = 9
+# upper bound of cells used to cover a search circle
+MAX_COVER_CELLS = 16
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    latitude = float(latitude)
+    longitude = float(longitude)
+    code = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(code) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            code.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(code)
+
+
+def cell_size(precision):
+    """Return (lat_degrees, lng_degrees) of a geohash cell."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometers."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _steps(start, stop, step):
+    values = []
+    value = start
+    while value < stop:
+        values.append(value)
+        value += step
+    values.append(stop)
+    return values
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle (latitude, longitude, radius_km).
+    The finest precision that needs at most MAX_COVER_CELLS cells is used, so a search only
+    touches the rows under those prefixes instead of every open job.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    d_lat = radius_km / KM_PER_DEGREE
+    d_lng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    south, north = max(latitude - d_lat, -90.0), min(latitude + d_lat, 90.0)
+    west, east = max(longitude - d_lng, -180.0), min(longitude + d_lng, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lng = cell_size(precision)
+        rows = math.floor(north / cell_lat) - math.floor(south / cell_lat) + 1
+        cols = math.floor(east / cell_lng) - math.floor(west / cell_lng) + 1
+        if rows * cols <= MAX_COVER_CELLS:
+            break
+
+    cells = set()
+    for lat in _steps(south, north, cell_lat):
+        for lng in _steps(west, east, cell_lng):
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
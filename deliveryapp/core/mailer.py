@@ -0,0 +1,110 @@
+import logging
+import smtplib
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+# one SMTP connection per worker process, reopened when the server drops it
+_connection = None
+
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        _connection = get_connection()
+        _connection.open()
+    return _connection
+
+
+def _reset_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+    _connection = None
+
+
+@lru_cache(maxsize=None)
+def _template(template_name):
+    return get_template(template_name)
+
+
+class MailBatch:
+    """
+    Queue of outgoing emails delivered over the worker's pooled connection.
+    Each template/context pair is rendered once, every recipient gets their own message,
+    and messages are flushed in batches of batch_size. A dropped connection is reopened once right
+    away; messages still unsent after that are reported back so the Celery task can retry just
+    those recipients later, instead of blocking the worker or mailing the others twice.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.messages = []
+
+    def add(self, subject, template_name, context, recipients):
+        html_message = _template(template_name).render(context)
+        for recipient in recipients:
+            message = EmailMultiAlternatives(subject=subject, from_email=settings.EMAIL_HOST_USER, to=[recipient])
+            message.attach_alternative(html_message, "text/html")
+            self.messages.append(message)
+
+    def _send_batch(self, batch):
+        """Send a batch; returns how many of its messages went out before the connection failed for good."""
+        sent = 0
+        reconnected = False
+        while sent < len(batch):
+            try:
+                connection = _get_connection()
+                # one message per call, so a failure tells which messages are still unsent;
+                # the backend loops over the messages of a call the same way, on the same connection
+                for message in batch[sent:]:
+                    connection.send_messages([message])
+                    sent += 1
+            except (smtplib.SMTPException, OSError) as e:
+                _reset_connection()
+                if reconnected:
+                    logger.error('email batch of %d stopped after %d sent: %s', len(batch), sent, e)
+                    break
+                reconnected = True
+        return sent
+
+    def flush(self):
+        messages, self.messages = self.messages, []
+        started = time.perf_counter()
+        sent = 0
+        batches = 0
+        for i in range(0, len(messages), self.batch_size):
+            batch = messages[i:i + self.batch_size]
+            batch_sent = self._send_batch(batch)
+            sent += batch_sent
+            batches += 1
+            if batch_sent < len(batch):
+                # the server is unreachable: leave the rest to the task's retry
+                break
+        elapsed = time.perf_counter() - started
+        unsent = [recipient for message in messages[sent:] for recipient in message.to]
+        stats = {
+            'sent': sent,
+            'failed': len(messages) - sent,
+            'unsent': unsent,
+            'batches': batches,
+            'seconds': round(elapsed, 3),
+            'per_second': round(sent / elapsed, 1) if elapsed else sent,
+        }
+        logger.info('email flush: %(sent)d sent, %(failed)d failed, %(batches)d batches in %(seconds)ss '
+                    '(%(per_second)s/s)', stats)
+        return stats
+
+
+def send_template(subject, template_name, context, recipients):
+    batch = MailBatch()
+    batch.add(subject, template_name, context, recipients)
+    return batch.flush()
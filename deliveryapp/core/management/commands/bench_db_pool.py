@@ -0,0 +1,79 @@
+import copy
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+
+from core.db import pool
+
+ENGINES = [('direct', 'django.db.backends.mysql'), ('pooled', 'core.db.mysql')]
+
+
+class Command(BaseCommand):
+    help = ('Requests/sec of short requests against the configured MySQL database, opening a connection '
+            'per request vs taking it from the pool, with concurrent threads')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='threads')
+        parser.add_argument('--requests', type=int, default=2000, help='requests per run')
+        parser.add_argument('--queries', type=int, default=3, help='queries per request')
+        parser.add_argument('--pool-size', type=int, help='pool SIZE, the POOL setting by default')
+
+    def handle(self, *args, **options):
+        base = copy.deepcopy(connections.settings[options['database']])
+        if options['pool_size']:
+            base['POOL'] = {**base.get('POOL', {}), 'SIZE': options['pool_size']}
+
+        self.stdout.write(f"{'threads':>7} {'mode':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'opened':>7} {'waits':>6}")
+        for concurrency in options['concurrency']:
+            for mode, engine in ENGINES:
+                settings_dict = {**base, 'ENGINE': engine, 'CONN_MAX_AGE': 0}
+                alias = f'bench-{mode}-{concurrency}'
+                rate, latencies, opened = self.run(alias, settings_dict, concurrency, options['requests'],
+                                                   options['queries'])
+                waits = pool.status().get(alias, {}).get('waits', '-')
+                self.stdout.write(f'{concurrency:>7} {mode:>7} {rate:>9.0f} {statistics.median(latencies):>8.2f} '
+                                  f'{latencies[int(len(latencies) * 0.99) - 1]:>8.2f} {opened:>7} {waits:>6}')
+        pool.close_all()
+
+    def run(self, alias, settings_dict, concurrency, requests, queries):
+        backend = load_backend(settings_dict['ENGINE'])
+        remaining = iter(range(requests))
+        lock = threading.Lock()
+        latencies = []
+
+        def worker():
+            # a wrapper per thread, like django.db.connections
+            connection = backend.DatabaseWrapper(settings_dict, alias)
+            mine = []
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                started = time.perf_counter()
+                # one request: connect on first query, then close as the request_finished handler does
+                with connection.cursor() as cursor:
+                    for _ in range(queries):
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+                mine.append((time.perf_counter() - started) * 1000)
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        # without the pool every request opens its own connection
+        opened = pool.status()[alias]['created'] if alias in pool.status() else requests
+        return requests / elapsed, latencies, opened
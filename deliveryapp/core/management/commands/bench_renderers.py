@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from core.middleware import brotli
+from core.renderers import ORJSONRenderer
+from core.representation import represent_jobs
+
+from .bench_serializers import build_jobs
+
+
+def cpu_per_call(repeat, func):
+    """Best CPU time of one call, over repeat rounds of enough calls to last ~50 ms."""
+    calls = 1
+    while True:
+        started = time.process_time()
+        for _ in range(calls):
+            result = func()
+        if time.process_time() - started > 0.05 or calls >= 1 << 16:
+            break
+        calls *= 2
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        for _ in range(calls):
+            func()
+        elapsed = (time.process_time() - started) / calls
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def page(jobs):
+    # the job list endpoints' payload (see core.paginator.JobPaginator)
+    return {'links': {'next': 'https://api.example.com/jobs/?page=3', 'previous': 'https://api.example.com/jobs/?page=1'},
+            'count': 10000, 'results': represent_jobs(jobs)}
+
+
+class Command(BaseCommand):
+    help = 'Bytes on the wire and CPU per response for job list pages: stdlib vs orjson rendering, gzip, brotli'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[4, 50, 500], help='jobs per page')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        quality = settings.RESPONSE_COMPRESSION['BROTLI_QUALITY']
+        drf, fast = JSONRenderer(), ORJSONRenderer()
+        encodings = [('gzip', lambda content: compress_string(content, max_random_bytes=100))]
+        if brotli is not None:
+            encodings.append(('br', lambda content: brotli.compress(content, quality=quality)))
+        else:
+            self.stderr.write('brotli is not installed, only gzip is measured')
+
+        self.stdout.write(f"{'jobs':>6} {'encoding':>9} {'bytes':>9} {'ratio':>6} "
+                          f"{'stdlib µs':>10} {'orjson µs':>10} {'speedup':>8}")
+        for size in options['sizes']:
+            data = page(build_jobs(size))
+            drf_time, content = cpu_per_call(options['repeat'], lambda: drf.render(data))
+            fast_time, fast_content = cpu_per_call(options['repeat'], lambda: fast.render(data))
+            if content != fast_content:
+                self.stderr.write(self.style.ERROR(f'orjson output differs for {size} jobs'))
+            self.stdout.write(f'{size:>6} {"identity":>9} {len(content):>9} {1:>6.2f} '
+                              f'{drf_time * 1e6:>10.0f} {fast_time * 1e6:>10.0f} {drf_time / fast_time:>7.1f}x')
+            for name, compress in encodings:
+                compress_time, compressed = cpu_per_call(options['repeat'], lambda: compress(content))
+                # CPU of the whole response: rendering plus compression
+                total_drf, total_fast = drf_time + compress_time, fast_time + compress_time
+                self.stdout.write(f'{size:>6} {name:>9} {len(compressed):>9} {len(content) / len(compressed):>6.2f} '
+                                  f'{total_drf * 1e6:>10.0f} {total_fast * 1e6:>10.0f} {total_drf / total_fast:>7.1f}x')
@@ -0,0 +1,74 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from core.models import *
+from core.representation import represent_jobs
+from core.serializers import JobSerializer
+
+
+def build_jobs(count, seed=0):
+    """In-memory job graphs shaped like the select_related list querysets (no database needed)."""
+    rng = random.Random(seed)
+    categories = [ProductCategory(id=i, name=name) for i, name in enumerate(['Thực phẩm', 'Quần áo', 'Điện tử'], 1)]
+    methods = [PaymentMethod(id=1, name='Tiền mặt'), PaymentMethod(id=2, name='VNPay')]
+    vehicles = [Vehicle(id=i, name=name, description='', capacity=capacity, icon=f'vehicle_icon/{i}')
+                for i, (name, capacity) in enumerate([('Xe máy', '30kg'), ('Xe tải', '500kg')], 1)]
+    start = datetime(2024, 1, 1)
+    jobs = []
+    for i in range(1, count + 1):
+        pick_up, delivery_address = [
+            Address(id=2 * i + k, contact='Nguyễn Văn A', phone_number='0901234567', country='Việt Nam',
+                    city='Hồ Chí Minh', district=f'Quận {rng.randint(1, 12)}', street='Nguyễn Huệ',
+                    home_number=str(rng.randint(1, 300)),
+                    latitude=Decimal(f'{rng.uniform(10.7, 10.9):.15f}'),
+                    longitude=Decimal(f'{rng.uniform(106.6, 106.8):.14f}'))
+            for k in range(2)]
+        created = start + timedelta(minutes=i)
+        jobs.append(Job(
+            id=i, status=rng.choice(Job.Status.values), uuid=uuid.UUID(int=rng.getrandbits(128)),
+            description='Giao hàng nhanh', created_at=created, updated_at=created, poster_id=rng.randint(1, 500),
+            vehicle=rng.choice(vehicles),
+            product=Product(id=i, category=rng.choice(categories), quantity=rng.randint(1, 5),
+                            image=f'product/{i}', mass='1kg'),
+            payment=Payment(id=i, method=rng.choice(methods), amount=None),
+            shipment=Shipment(id=i, pick_up=pick_up, delivery_address=delivery_address, type=Shipment.Type.NOW,
+                              shipment_date=created, cost=Decimal(rng.randint(15, 200) * 1000)),
+        ))
+    return jobs
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = 'Compare JobSerializer with the compiled representation builder on job lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        self.stdout.write(f"{'jobs':>8} {'DRF ms':>10} {'compiled ms':>12} {'speedup':>8}  identical")
+        for size in options['sizes']:
+            jobs = build_jobs(size)
+            drf_time, drf_data = best_of(options['repeat'], lambda: JobSerializer(jobs, many=True).data)
+            fast_time, fast_data = best_of(options['repeat'], lambda: represent_jobs(jobs))
+            identical = renderer.render(drf_data) == renderer.render(fast_data)
+            self.stdout.write(f'{size:>8} {drf_time * 1000:>10.1f} {fast_time * 1000:>12.1f} '
+                              f'{drf_time / fast_time:>7.1f}x  {identical}')
+            if not identical:
+                self.stderr.write(self.style.ERROR(f'output differs for {size} jobs'))
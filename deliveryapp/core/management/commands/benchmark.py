@@ -0,0 +1,69 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import benchmark
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every API route on a synthetic dataset (query count, time, allocations) '
+            'and compare with a stored baseline. Runs on a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=500, help='size of the synthetic dataset')
+        parser.add_argument('--repeat', type=int, default=5, help='timed calls per route')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', nargs='+', help='scenario names to run')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save', action='store_true', help='store this run as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='allowed relative increase of time and allocations (query counts must not grow)')
+        parser.add_argument('--keepdb', action='store_true', help='reuse the test database if it exists')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with benchmark.isolated():
+                dataset = benchmark.Dataset(options['jobs'], options['seed']).build()
+                results = benchmark.run(dataset, options['repeat'], options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+
+        self.stdout.write(f"{'scenario':<28} {'status':>8} {'queries':>8} {'ms':>9} {'KiB':>9}  baseline q/ms/KiB")
+        for name, result in results.items():
+            base = baseline.get(name)
+            reference = f"{base['queries']}/{base['ms']}/{base['alloc_kb']}" if base else '-'
+            self.stdout.write(f"{name:<28} {','.join(map(str, result['status'])):>8} {result['queries']:>8} "
+                              f"{result['ms']:>9} {result['alloc_kb']:>9}  {reference}")
+
+        errors = [f"{name}: {result['error']}" for name, result in results.items() if 'error' in result]
+        uncovered = benchmark.uncovered_routes(results) if not options['only'] else []
+        for route in uncovered:
+            self.stderr.write(self.style.WARNING(f'route not benchmarked: {route}'))
+
+        if options['save']:
+            if errors:
+                raise CommandError('not saving a baseline with failing scenarios:\n' + '\n'.join(errors))
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as f:
+                json.dump({'jobs': options['jobs'], 'repeat': options['repeat'], 'database': connection.vendor,
+                           'results': results}, f, indent=2, ensure_ascii=False)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        regressions = benchmark.compare(results, baseline, options['tolerance'])
+        if errors or regressions:
+            raise CommandError('\n'.join(errors + regressions))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(results)} scenarios, no regressions' if baseline else f'{len(results)} scenarios, no baseline yet'))
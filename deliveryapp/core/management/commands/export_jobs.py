@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import export
+
+
+class Command(BaseCommand):
+    help = 'Stream jobs with shipment, addresses, payment and winner as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(export.FORMATS), default='csv')
+        parser.add_argument('--since', help='created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--until', help='created on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--status', help='comma separated job statuses, e.g. 1,5')
+        parser.add_argument('--output', '-o', help='file to write, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            filters = export.parse_filters(options['since'], options['until'], options['status'])
+        except export.ExportError as e:
+            raise CommandError(e)
+
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        rows = counted(export.rows(export.jobs(**filters), options['chunk_size']))
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for block in export.lines(rows, options['format']):
+                out.write(block.encode() if isinstance(block, str) else block)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"{count} jobs written to {options['output']}"))
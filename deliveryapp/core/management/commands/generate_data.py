@@ -0,0 +1,90 @@
+import multiprocessing
+import time
+from datetime import datetime
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+
+from core import synthetic
+from core.models import *
+
+_generator = None
+
+
+def _init_worker(generator):
+    global _generator
+    _generator = generator
+    # each worker process opens its own connection
+    connections.close_all()
+
+
+def _insert(bounds):
+    return bounds[1] - bounds[0], synthetic.insert_batch(_generator, *bounds)
+
+
+class Command(BaseCommand):
+    help = ('Bulk-generate a synthetic dataset for load testing (jobs with shipments, addresses, products, '
+            'payments, auctions and feedback). Rerunning with the same options resumes an interrupted run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=100000)
+        parser.add_argument('--posters', type=int, help='default: one per 50 jobs')
+        parser.add_argument('--shippers', type=int, help='default: one per 200 jobs')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=365, help='jobs are spread over this many days')
+        parser.add_argument('--until', type=datetime.fromisoformat,
+                            help='date of the newest jobs (YYYY-MM-DD), default today; keep it when resuming')
+        parser.add_argument('--batch-size', type=int, default=5000, help='jobs per transaction')
+        parser.add_argument('--workers', type=int, default=1, help='parallel processes (MySQL only)')
+        parser.add_argument('--base-id', type=int, default=100_000_000,
+                            help='generated ids start here, away from real rows; keep it when resuming')
+        parser.add_argument('--skip-aggregates', action='store_true',
+                            help='do not rebuild ratings and dashboard rollups at the end')
+
+    def handle(self, *args, **options):
+        jobs = options['jobs']
+        plan = synthetic.Plan(jobs, options['posters'] or max(jobs // 50, 1),
+                              options['shippers'] or max(jobs // 200, 1), options['base_id'])
+        generator = synthetic.Generator(plan, seed=options['seed'], days=options['days'], now=options['until'])
+        generator.reference_data()
+
+        users, more = generator.users()
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=1000)
+            ShipperMore.objects.bulk_create(more, batch_size=1000)
+        self.stdout.write(f'{len(users)} users created')
+
+        batches = [(start, min(start + options['batch_size'], jobs)) for start in range(0, jobs, options['batch_size'])]
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING('SQLite has a single writer, using one worker'))
+            workers = 1
+
+        started = time.perf_counter()
+        processed = created = 0
+        if workers > 1:
+            connections.close_all()
+            pool = multiprocessing.Pool(workers, _init_worker, (generator,))
+            results = pool.imap_unordered(_insert, batches)
+        else:
+            pool = None
+            results = ((stop - start, synthetic.insert_batch(generator, start, stop)) for start, stop in batches)
+        try:
+            for size, inserted in results:
+                processed += size
+                created += inserted
+                elapsed = time.perf_counter() - started
+                rate = created / elapsed if elapsed else 0
+                self.stdout.write(f'{processed}/{jobs} jobs, {created} new ({rate:.0f}/s)')
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if not options['skip_aggregates']:
+            call_command('rebuild_ratings', stdout=self.stdout)
+            call_command('rebuild_rollups', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} jobs generated in {time.perf_counter() - started:.0f}s (seed {options["seed"]})'))
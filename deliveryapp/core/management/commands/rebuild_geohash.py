@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core import geo
+from core.models import Address
+
+
+class Command(BaseCommand):
+    help = 'Recompute the geohash of every address (used by proximity job search)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(Address.objects.filter(id__gt=last_id).order_by('id')
+                         .only('id', 'latitude', 'longitude', 'geohash')[:batch_size])
+            if not batch:
+                break
+            for address in batch:
+                address.geohash = geo.encode(address.latitude, address.longitude)
+            Address.objects.bulk_update(batch, ['geohash'])
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'{updated} addresses indexed...')
+
+        self.stdout.write(self.style.SUCCESS(f'Geohash rebuilt for {updated} addresses'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from core.models import Feedback, ShipperRating
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored shipper rating aggregates from the feedback table'
+
+    def handle(self, *args, **options):
+        stars = {f'star_{star}': Count('pk', filter=Q(rating=star)) for star in range(1, 6)}
+        rows = Feedback.objects.order_by().values('shipper_id').annotate(
+            rating_sum=Sum('rating'), rating_count=Count('pk'), **stars)
+
+        ratings = [ShipperRating(**row) for row in rows]
+        with transaction.atomic():
+            ShipperRating.objects.all().delete()
+            ShipperRating.objects.bulk_create(ratings, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f'Ratings rebuilt for {len(ratings)} shippers'))
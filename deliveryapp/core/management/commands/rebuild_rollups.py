@@ -0,0 +1,56 @@
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+from core.models import DailyShipmentStats, Job, JobStatusCount, MonthlyShipmentStats, Shipment
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard rollup tables from the shipment and job tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.fromisoformat,
+                            help='only rebuild shipment stats from this date on (YYYY-MM-DD); '
+                                 'months are rebuilt from the first day of its month')
+
+    def handle(self, *args, **options):
+        since = options['since']
+        month_start = since.date().replace(day=1) if since else None
+
+        shipments = Shipment.objects.order_by()
+        if month_start:
+            shipments = shipments.filter(shipment_date__gte=datetime.combine(month_start, time.min))
+        rows = shipments.annotate(day=TruncDate('shipment_date')).values('day').annotate(
+            shipment_count=Count('pk'), total_cost=Coalesce(Sum('cost'), Value(Decimal(0))))
+        days = [DailyShipmentStats(**row) for row in rows]
+
+        months = {}
+        for row in days:
+            month = months.setdefault(row.day.replace(day=1), MonthlyShipmentStats(month=row.day.replace(day=1)))
+            month.shipment_count += row.shipment_count
+            month.total_cost += row.total_cost
+        if since:
+            days = [row for row in days if row.day >= since.date()]
+
+        statuses = [JobStatusCount(**row) for row in
+                    Job.objects.order_by().values('status').annotate(count=Count('pk'))]
+
+        with transaction.atomic():
+            daily = DailyShipmentStats.objects.all()
+            monthly = MonthlyShipmentStats.objects.all()
+            if since:
+                daily = daily.filter(day__gte=since.date())
+                monthly = monthly.filter(month__gte=month_start)
+            daily.delete()
+            monthly.delete()
+            JobStatusCount.objects.all().delete()
+            DailyShipmentStats.objects.bulk_create(days, batch_size=1000)
+            MonthlyShipmentStats.objects.bulk_create(months.values(), batch_size=1000)
+            JobStatusCount.objects.bulk_create(statuses)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rollups rebuilt: {len(days)} days, {len(months)} months, {len(statuses)} job statuses'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Address, AddressToken
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the keyword index of every address (used by the kw filter of job lists)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        indexed = 0
+        while True:
+            batch = list(Address.objects.filter(id__gt=last_id).order_by('id')
+                         .only('id', 'city', 'district', 'street', 'home_number')[:batch_size])
+            if not batch:
+                break
+            AddressToken.objects.index(*batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'{indexed} addresses indexed...')
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt for {indexed} addresses'))
@@ -0,0 +1,135 @@
+import base64
+import mimetypes
+import os
+import uuid
+from functools import lru_cache
+
+import cloudinary.uploader
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job, MediaUpload, Product
+
+# Uploads no longer happen inside the request: the row is committed with an empty media
+# reference plus a MediaUpload record, and a Celery worker pushes the file to the configured
+# storage backend and writes the final URL back onto the row.
+
+PENDING_DIR = 'pending'
+
+
+class CloudinaryMediaStorage:
+    def upload(self, source, folder):
+        return cloudinary.uploader.upload(source, folder=folder)['secure_url']
+
+
+class LocalMediaStorage:
+    """Stores files under MEDIA_ROOT. Stand-in for Cloudinary in development and offline benchmarks."""
+
+    def __init__(self, location=None, base_url=None):
+        self.location = location or settings.MEDIA_ROOT
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def upload(self, source, folder):
+        if source.startswith(('http://', 'https://')):
+            return source
+        if source.startswith('data:'):
+            header, encoded = source.split(',', 1)
+            extension = mimetypes.guess_extension(header[5:].split(';')[0]) or ''
+            content = base64.b64decode(encoded)
+        else:
+            extension = os.path.splitext(source)[1]
+            with open(source, 'rb') as f:
+                content = f.read()
+
+        name = f"{folder.strip('/')}/{uuid.uuid4().hex}{extension}"
+        path = os.path.join(self.location, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return f'{self.base_url}{name}'
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    return import_string(settings.MEDIA_STORAGE_BACKEND)()
+
+
+def stage(source):
+    """Keep an uploaded file on disk until the worker picks it up; strings (URL, data URI) pass through."""
+    if not hasattr(source, 'read'):
+        return str(source)
+    extension = os.path.splitext(getattr(source, 'name', '') or '')[1]
+    path = os.path.join(settings.MEDIA_ROOT, PENDING_DIR, f'{uuid.uuid4().hex}{extension}')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        if hasattr(source, 'chunks'):
+            for chunk in source.chunks():
+                f.write(chunk)
+        else:
+            f.write(source.read())
+    return path
+
+
+def upload_later(instance, field, source, folder):
+    """Record a pending upload for instance.<field> and queue it once the transaction commits."""
+    from .tasks import upload_media
+
+    if not source:
+        return None
+    upload = MediaUpload.objects.create(target=instance._meta.label, object_id=instance.pk, field=field,
+                                        folder=folder, source=stage(source))
+    transaction.on_commit(lambda: upload_media.delay(upload.id))
+    return upload
+
+
+def upload_later_many(targets, field, folder):
+    """upload_later for a list of (instance, source) pairs, recording the uploads with one INSERT."""
+    from .bulk import insert
+    from .tasks import upload_media
+
+    uploads = insert(MediaUpload, [MediaUpload(target=instance._meta.label, object_id=instance.pk, field=field,
+                                               folder=folder, source=stage(source))
+                                   for instance, source in targets if source])
+
+    def queue():
+        for upload in uploads:
+            upload_media.delay(upload.id)
+
+    transaction.on_commit(queue)
+    return uploads
+
+
+def complete(upload, url):
+    from . import authentication, reference
+
+    model = apps.get_model(upload.target)
+    model.objects.filter(pk=upload.object_id).update(**{upload.field: url})
+    if model in reference.MODELS:
+        # e.g. a vehicle icon: update() sends no post_save
+        reference.changed()
+    elif model._meta.concrete_model is get_user_model():
+        # e.g. an avatar: the user is cached with its access tokens
+        authentication.forget_users([upload.object_id])
+    elif model is Product:
+        # the image is part of the job JSON, see core.conditional
+        Job.objects.filter(product_id=upload.object_id).update(updated_at=timezone.now())
+    MediaUpload.objects.filter(pk=upload.pk).update(status=MediaUpload.Status.DONE, url=url, error=None)
+    if upload.source.startswith(os.path.join(settings.MEDIA_ROOT, PENDING_DIR)):
+        try:
+            os.remove(upload.source)
+        except OSError:
+            pass
+
+
+def media_url(resource):
+    """Final URL of a CloudinaryField value, or None while its upload is pending."""
+    if not resource or not getattr(resource, 'public_id', None):
+        return None
+    if resource.public_id.startswith('/'):
+        # stored by LocalMediaStorage
+        return f'{resource.public_id}.{resource.format}' if resource.format else resource.public_id
+    return resource.url
@@ -0,0 +1,199 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils.module_loading import import_string
+
+# Per-request measurements.
+# RequestMetricsMiddleware opens a RequestMetrics for each request; code that wants to report
+# something (e.g. job listing cache lookups in core.caching) adds to the current one, a no-op outside
+# a request. The job_cache_* counts cover only that cache: OTP codes, throttle buckets, auth tokens and
+# reference data are looked up elsewhere and not counted.
+# Queries are timed by a wrapper added to every database connection as it opens, so they are counted in
+# whichever thread the request's code runs: under ASGI, sync views run in worker threads that carry the
+# request's context.
+# Sampled requests go to a store that keeps per-view latency histograms for the metrics endpoint.
+
+_current = ContextVar('request_metrics', default=None)
+
+# latency histogram: bucket i counts durations up to BUCKETS[i] ms, the last one everything above
+BUCKETS = [round(0.5 * 1.25 ** i, 3) for i in range(54)]  # 0.5 ms .. ~65 s
+PERCENTILES = (50, 95, 99)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_ms', 'job_cache_hits', 'job_cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.job_cache_hits = 0
+        self.job_cache_misses = 0
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record_query(ms):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.db_ms += ms
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record_query((time.perf_counter() - started) * 1000)
+
+
+def _instrument(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def connect_signals():
+    if settings.REQUEST_METRICS['ENABLED']:
+        connection_created.connect(_instrument, dispatch_uid='metrics:connection')
+
+
+def record_job_cache(hit):
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.job_cache_hits += 1
+        else:
+            metrics.job_cache_misses += 1
+
+
+def bucket(ms):
+    return bisect.bisect_left(BUCKETS, ms)
+
+
+def _sample_fields(metrics, ms):
+    return {
+        'count': 1,
+        'ms': ms,
+        'queries': metrics.queries,
+        'db_ms': metrics.db_ms,
+        'job_cache_hits': metrics.job_cache_hits,
+        'job_cache_misses': metrics.job_cache_misses,
+        f'b{bucket(ms)}': 1,
+    }
+
+
+def percentile(histogram, count, p):
+    """Estimate the p-th percentile (ms) from bucket counts, interpolating inside the bucket."""
+    rank = count * p / 100
+    seen = 0
+    for index in sorted(histogram):
+        n = histogram[index]
+        if seen + n >= rank:
+            low = BUCKETS[index - 1] if index > 0 else 0
+            high = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+            return round(low + (high - low) * (rank - seen) / n, 2)
+        seen += n
+    return BUCKETS[-1]
+
+
+def summarize(fields):
+    count = int(fields.get('count', 0))
+    if not count:
+        return None
+    histogram = {int(name[1:]): int(value) for name, value in fields.items() if name.startswith('b') and value}
+    summary = {'count': count}
+    summary.update({f'p{p}': percentile(histogram, count, p) for p in PERCENTILES})
+    summary.update({
+        'mean_ms': round(float(fields['ms']) / count, 2),
+        'queries_mean': round(float(fields['queries']) / count, 2),
+        'db_ms_mean': round(float(fields['db_ms']) / count, 2),
+        'job_cache_hits': int(float(fields.get('job_cache_hits', 0))),
+        'job_cache_misses': int(float(fields.get('job_cache_misses', 0))),
+    })
+    return summary
+
+
+class InMemoryMetricsStore:
+    """Single-process store for tests and development."""
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def add(self, view, metrics, ms):
+        with self._lock:
+            fields = self._views.setdefault(view, {})
+            for name, value in _sample_fields(metrics, ms).items():
+                fields[name] = fields.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(fields) for view, fields in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+class RedisMetricsStore:
+    """One Redis hash per view, shared by every worker process."""
+
+    prefix = 'metrics:requests'
+    # recording happens on the response path: a slow Redis must not hold up every response
+    socket_timeout = 0.1
+
+    def __init__(self, url=None):
+        self.url = url or settings.REQUEST_METRICS['REDIS_URL']
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, decode_responses=True, socket_timeout=self.socket_timeout,
+                                                socket_connect_timeout=self.socket_timeout)
+        return self._client
+
+    def add(self, view, metrics, ms):
+        key = f'{self.prefix}:{view}'
+        pipe = self.client.pipeline(transaction=False)
+        pipe.sadd(f'{self.prefix}:views', view)
+        for name, value in _sample_fields(metrics, ms).items():
+            if isinstance(value, float):
+                pipe.hincrbyfloat(key, name, value)
+            else:
+                pipe.hincrby(key, name, value)
+        pipe.execute()
+
+    def snapshot(self):
+        views = sorted(self.client.smembers(f'{self.prefix}:views'))
+        pipe = self.client.pipeline(transaction=False)
+        for view in views:
+            pipe.hgetall(f'{self.prefix}:{view}')
+        return dict(zip(views, pipe.execute()))
+
+    def reset(self):
+        views = self.client.smembers(f'{self.prefix}:views')
+        self.client.delete(f'{self.prefix}:views', *[f'{self.prefix}:{view}' for view in views])
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(settings.REQUEST_METRICS['STORE'])()
+
+
+def report():
+    summaries = {view: summarize(fields) for view, fields in get_store().snapshot().items()}
+    return {view: summary for view, summary in summaries.items() if summary}
@@ -1,7 +1,26 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
 from django.http import QueryDict
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
 
+from . import metrics
+from .db import routers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
 
 class ProvideClientIdAndClinetSecret(MiddlewareMixin):
 
@@ -22,3 +41,163 @@ class ProvideClientIdAndClinetSecret(MiddlewareMixin):
         response = self.get_response(request)
         return response
 
+
+
+class RequestMetricsMiddleware:
+    """
+    Query count, DB time, job listing cache hits/misses and view time of every request, sent back
+    as a Server-Timing header. A sample of the requests is also logged and added to the per-view
+    histograms served by the metrics endpoint. Removed from the chain when REQUEST_METRICS is off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = settings.REQUEST_METRICS
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = options['SAMPLE_RATE']
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics, token = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        self.finish(request, response, request_metrics, started)
+        return response
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop(token)
+        self.finish(request, response, request_metrics, started)
+        return response
+
+    def finish(self, request, response, request_metrics, started):
+        ms = (time.perf_counter() - started) * 1000
+        response['Server-Timing'] = (
+            f'db;dur={request_metrics.db_ms:.1f};desc="{request_metrics.queries} queries", '
+            f'job-cache;desc="{request_metrics.job_cache_hits} hits {request_metrics.job_cache_misses} misses", '
+            f'view;dur={ms:.1f}')
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        view = f'{request.method} {_view_label(request)}'
+        logger.info('request %s', json.dumps({
+            'view': view, 'path': request.path, 'status': response.status_code, 'ms': round(ms, 2),
+            'queries': request_metrics.queries, 'db_ms': round(request_metrics.db_ms, 2),
+            'job_cache_hits': request_metrics.job_cache_hits, 'job_cache_misses': request_metrics.job_cache_misses,
+        }))
+        try:
+            metrics.get_store().add(view, request_metrics, ms)
+        except Exception as e:
+            logger.warning('could not record request metrics: %s', e)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope of core.db.routers' read routing: one Routing per request, the view's replica_reads
+    override applied once the URL is resolved, and the primary pin set when the request wrote.
+    Removed from the chain when no replica is configured.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_ROUTING['REPLICAS']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing, token = routers.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.stop(token)
+        if response.streaming and not response.is_async:
+            # the body is produced after this returns; keep routing its queries the same way
+            response.streaming_content = routers.within(routing, response.streaming_content)
+        if routing.wrote:
+            routing.pin()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        enabled = routers.view_setting(view_func, request.method)
+        if enabled is not None:
+            routers.current().replica = enabled and request.method in routers.SAFE_METHODS
+        return None
+
+
+def _view_label(request):
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    # url names are shared by viewsets on the same model, so viewsets are labelled by class and action
+    cls = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if cls is not None and actions:
+        return f'{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    return match.view_name
+
+
+def _accepted_encodings(header):
+    """Content codings of an Accept-Encoding header with a non-zero q value."""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Brotli for clients that accept it, gzip (Django's GZipMiddleware) for the rest.
+    Responses under RESPONSE_COMPRESSION['MIN_LENGTH'] bytes and event streams are sent as they are.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        options = settings.RESPONSE_COMPRESSION
+        self.min_length = options['MIN_LENGTH']
+        self.brotli_quality = options['BROTLI_QUALITY']
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            # compressors buffer, which would hold events back
+            return response
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        if brotli is None or 'br' not in accepted or response.streaming or response.has_header('Content-Encoding'):
+            if 'gzip' not in accepted:
+                patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -1,15 +1,17 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Exists, F, OuterRef, Q
 from cloudinary.models import CloudinaryField
+from . import geo, search
 import uuid
 
 
 class BaseModel(models.Model):
-    updated_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
-    created_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         abstract = True
@@ -103,7 +105,7 @@ class Job(BaseModel):
         CANCELED = '6'
 
     status = models.CharField(max_length=50, choices=Status.choices, default=Status.FINDING_SHIPPER)
-    uuid = models.UUIDField(default=uuid.uuid4(), editable=False)
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False)
     poster = models.ForeignKey(User, null=True, blank=True, related_name='job_poster', on_delete=models.CASCADE)
     vehicle = models.ForeignKey(Vehicle, null=True, blank=True, related_name='job_vehicle', on_delete=models.CASCADE)
     description = models.CharField(max_length=255, null=True)
@@ -112,6 +114,21 @@ class Job(BaseModel):
     payment = models.ForeignKey('Payment', null=True, blank=True, related_name='job_payment', on_delete=models.CASCADE)
     shipment = models.ForeignKey('Shipment', null=True, blank=True, related_name='job_shipment',
                                  on_delete=models.CASCADE)
+    # bumped by every state transition (see core.transitions)
+    version = models.PositiveIntegerField(default=0)
+
+    @property
+    def track_number(self):
+        # the tracking number customers, shippers and the admin see
+        return str(self.uuid.int)[:12]
+
+    class Meta:
+        # keyset pagination walks these indexes on (created_at, id)
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['poster', 'created_at', 'id']),
+            models.Index(fields=['status', 'created_at', 'id']),
+        ]
 
 
 class Auction(models.Model):
@@ -133,6 +150,58 @@ class Feedback(models.Model):
 
     class Meta:
         unique_together = ('user', 'job')
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['shipper', 'created_at', 'id']),
+        ]
+
+
+class CounterManager(models.Manager):
+    def add(self, pk, **deltas):
+        """Add deltas to one counter row with a single atomic UPDATE, creating the row on first use."""
+        changes = {name: F(name) + value for name, value in deltas.items()}
+        if not self.filter(pk=pk).update(**changes):
+            try:
+                with transaction.atomic():
+                    self.create(pk=pk)
+            except IntegrityError:
+                # created concurrently by another request
+                pass
+            self.filter(pk=pk).update(**changes)
+
+
+class ShipperRatingManager(CounterManager):
+    def record(self, shipper_id, rating):
+        """Add one rating to a shipper's aggregate."""
+        rating = int(rating)
+        deltas = {'rating_sum': rating, 'rating_count': 1}
+        if 1 <= rating <= 5:
+            deltas[f'star_{rating}'] = 1
+        self.add(shipper_id, **deltas)
+
+
+class ShipperRating(models.Model):
+    # maintained from Feedback so reading a shipper's rating never touches the feedback table
+    shipper = models.OneToOneField(User, primary_key=True, related_name='rating_stats', on_delete=models.CASCADE)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+
+    objects = ShipperRatingManager()
+
+    @property
+    def average(self):
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 2)
+        return 0
+
+    @property
+    def histogram(self):
+        return {star: getattr(self, f'star_{star}') for star in range(1, 6)}
 
 
 class Shipment(models.Model):
@@ -159,6 +228,13 @@ class Address(models.Model):
     home_number = models.CharField(max_length=10, null=True)
     latitude = models.DecimalField(max_digits=17, decimal_places=15)
     longitude = models.DecimalField(max_digits=17, decimal_places=14)
+    # precomputed spatial index used by proximity search
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        self.geohash = geo.encode(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+        AddressToken.objects.index(self)
 
     def get_long_name(self):
         if self.home_number and self.street:
@@ -173,6 +249,42 @@ class Address(models.Model):
             return f'{self.district}'
 
 
+class AddressTokenManager(models.Manager):
+    def index(self, *addresses):
+        self.filter(address_id__in=[address.id for address in addresses]).delete()
+        self.bulk_create([AddressToken(address_id=address.id, token=token)
+                          for address in addresses for token in search.address_tokens(address)],
+                         batch_size=1000)
+
+    def keyword_filter(self, keyword, *addresses):
+        """
+        Q matching rows where one of the given address relations (e.g. 'shipment__pick_up') contains
+        every word of the keyword, each word as a prefix. Every word is an EXISTS probe on
+        (address, token), so the cost doesn't depend on the size of the address table.
+        """
+        tokens = search.query_tokens(keyword)
+        match = Q(pk__in=[])
+        if not tokens:
+            return match
+        for address in addresses:
+            # istartswith is used for its plain LIKE 'word%' on MySQL, which can range-scan the index;
+            # tokens are lowercase already
+            match |= Q(*[Exists(self.filter(address_id=OuterRef(f'{address}_id'), token__istartswith=token))
+                         for token in tokens])
+        return match
+
+
+class AddressToken(models.Model):
+    # folded words of an address (see core.search), maintained by Address.save
+    address = models.ForeignKey(Address, related_name='tokens', on_delete=models.CASCADE)
+    token = models.CharField(max_length=search.TOKEN_MAX_LENGTH)
+
+    objects = AddressTokenManager()
+
+    class Meta:
+        unique_together = ('address', 'token')
+
+
 class Payment(models.Model):
     method = models.ForeignKey('PaymentMethod', null=True, blank=True, related_name='job_pmt', on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=8, decimal_places=0, null=True)
@@ -189,3 +301,50 @@ class Coupon(models.Model):
     start_at = models.DateField()
     end_at = models.DateField()
     percen_discount = models.DecimalField(max_digits=3, decimal_places=0)
+
+
+class MediaUpload(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    # the row/field that receives the final URL, e.g. core.Product / image
+    target = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=50)
+    folder = models.CharField(max_length=100)
+    # staged file path, data URI or remote URL
+    source = models.TextField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    url = models.CharField(max_length=255, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+# Dashboard rollups, kept up to date by core.rollups from the write paths
+# and rebuilt from the source tables by the rebuild_rollups command.
+class DailyShipmentStats(models.Model):
+    day = models.DateField(primary_key=True)
+    shipment_count = models.IntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+
+    objects = CounterManager()
+
+
+class MonthlyShipmentStats(models.Model):
+    # first day of the month
+    month = models.DateField(primary_key=True)
+    shipment_count = models.IntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=16, decimal_places=0, default=0)
+
+    objects = CounterManager()
+
+
+class JobStatusCount(models.Model):
+    # one row per status, updated inside every job write transaction: writes of the same status queue on it
+    status = models.CharField(max_length=50, choices=Job.Status.choices, primary_key=True)
+    count = models.IntegerField(default=0)
+
+    objects = CounterManager()
@@ -1,4 +1,14 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+from base64 import b64decode, b64encode
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import Response
 
 
@@ -28,3 +38,139 @@ class FeedbackPaginator(PageNumberPagination):
             'count': self.page.paginator.count,
             'results': data
         }
+
+
+class KeysetPaginator(BasePagination):
+    """
+    Cursor pagination on (created_at, id), newest first.
+    Pages are fetched with a WHERE on the last seen key instead of OFFSET and no COUNT(*) is run,
+    so every page costs the same however deep it is.
+    """
+    page_size = 4
+    cursor_query_param = 'cursor'
+    ordering = ('created_at', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        field, tie_breaker = self.ordering
+
+        if self.cursor is None:
+            queryset = queryset.order_by(f'-{field}', f'-{tie_breaker}')
+        else:
+            reverse, value, pk = self.cursor
+            if reverse:
+                queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, f'{tie_breaker}__gt': pk}))
+                queryset = queryset.order_by(field, tie_breaker)
+            else:
+                queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, f'{tie_breaker}__lt': pk}))
+                queryset = queryset.order_by(f'-{field}', f'-{tie_breaker}')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.cursor is not None and self.cursor[0]:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        self.page = results
+        return results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, value, pk = b64decode(encoded.encode('ascii'), altchars=b'-_').decode('ascii').split('|')
+            return direction == 'p', datetime.fromisoformat(value), int(pk)
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound('Invalid cursor')
+
+    def encode_cursor(self, reverse, instance):
+        field, tie_breaker = self.ordering
+        raw = f"{'p' if reverse else 'n'}|{getattr(instance, field).isoformat()}|{getattr(instance, tie_breaker)}"
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   b64encode(raw.encode('ascii'), altchars=b'-_').decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(True, self.page[0])
+
+    def get_paginated_response(self, data):
+        return {
+            'links': {
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link()
+            },
+            'results': data
+        }
+
+
+class JobKeysetPaginator(KeysetPaginator):
+    page_size = 4
+
+
+class FeedbackKeysetPaginator(KeysetPaginator):
+    page_size = 10
+
+
+class OptionalKeysetPaginationMixin:
+    """
+    Lets clients opt into keyset pagination with ?pagination=cursor (or by following a cursor link),
+    while the default stays page-number based.
+    """
+    keyset_pagination_class = None
+
+    def use_keyset_pagination(self):
+        params = self.request.query_params
+        return self.keyset_pagination_class is not None and (
+                params.get('pagination') == 'cursor' or 'cursor' in params)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.use_keyset_pagination():
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin changelist paginator. COUNT(*) over an unfiltered InnoDB table scans the whole index,
+    so for big tables the row estimate kept by MySQL is used instead; filtered querysets and small
+    tables are still counted exactly.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self._estimate(self.object_list)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'mysql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                           'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row else None
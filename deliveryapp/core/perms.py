@@ -23,6 +23,14 @@ class IsBasicUser(permissions.BasePermission):
             return request.user.role == User.Roles.BASIC_USER
 
 
+class IsAdmin(permissions.IsAuthenticated):
+    def has_permission(self, request, view):
+        if request.user.is_anonymous:
+            return False
+        else:
+            return request.user.is_staff or request.user.role == User.Roles.ADMIN
+
+
 class BasicUserOwnerJob(permissions.IsAuthenticated):
     def has_permission(self, request, view):
         if request.user.is_anonymous:
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import caching
+from .models import PaymentMethod, ProductCategory, Vehicle
+from .representation import represent
+from .serializers import PaymentMethodSerializer, ProductCategorySerializer, VehicleSerializer
+
+# Reference data: vehicles, product categories and payment methods.
+# These tables are tiny and only change through the admin, so every process loads them once and
+# serves lookups and list endpoints from memory. A write bumps a version in the shared cache
+# (Redis); the other processes compare their copy against it at most every CHECK_INTERVAL seconds
+# and reload when it moved.
+
+NAMESPACE = 'reference'
+CHECK_INTERVAL = 2  # seconds
+CASH_PAYMENT_NAME = 'tiền mặt'
+
+MODELS = {
+    Vehicle: ('vehicles', VehicleSerializer),
+    ProductCategory: ('categories', ProductCategorySerializer),
+    PaymentMethod: ('payment_methods', PaymentMethodSerializer),
+}
+
+
+class Table:
+    def __init__(self, model, serializer_class):
+        self.rows = {obj.pk: obj for obj in model.objects.order_by('pk')}
+        self.data = represent(serializer_class, self.rows.values())
+        self.etag = '"%s"' % hashlib.md5(json.dumps(self.data, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+    def get(self, pk):
+        return self.rows.get(pk)
+
+
+class Snapshot:
+    def __init__(self, version):
+        self.version = version
+        for model, (name, serializer_class) in MODELS.items():
+            setattr(self, name, Table(model, serializer_class))
+
+
+class Registry:
+    def __init__(self):
+        self._snapshot = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked < CHECK_INTERVAL:
+            return snapshot
+        version = caching.generations(NAMESPACE)[0]
+        if snapshot is None or snapshot.version != version:
+            with self._lock:
+                if self._snapshot is snapshot:
+                    self._snapshot = Snapshot(version)
+                snapshot = self._snapshot
+        self._checked = now
+        return snapshot
+
+    def clear(self):
+        self._snapshot = None
+
+
+registry = Registry()
+
+
+def get():
+    return registry.get()
+
+
+def cash_payment_method():
+    for method in get().payment_methods.rows.values():
+        if CASH_PAYMENT_NAME in method.name.lower():
+            return method
+    return None
+
+
+def changed():
+    """Drop every process' copy once the current transaction commits."""
+    def bump():
+        caching.invalidate(NAMESPACE)
+        registry.clear()
+
+    transaction.on_commit(bump)
+
+
+def _on_write(sender, **kwargs):
+    changed()
+
+
+def connect_signals():
+    for model in MODELS:
+        post_save.connect(_on_write, sender=model, dispatch_uid=f'reference:save:{model._meta.label}')
+        post_delete.connect(_on_write, sender=model, dispatch_uid=f'reference:delete:{model._meta.label}')
@@ -0,0 +1,33 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson is several times faster than the stdlib encoder on the nested job payloads.
+# Output decodes to the same values as JSONRenderer's with the default (compact, unicode) settings;
+# types orjson doesn't know, and datetimes, go through DRF's encoder. The text is not always the same:
+# orjson writes floats as 1e16 / 1e-7 (json: 1e+16 / 1e-07) and NaN / Infinity as null, where the
+# strict JSONRenderer raises. Data orjson can't encode at all (ints beyond 64 bits) is rendered by
+# JSONRenderer.
+
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None or \
+                self.ensure_ascii or not self.compact:
+            # pretty printing (browsable API, '; indent=') and non-default settings
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping as JSONRenderer, which keeps the output a strict JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,134 @@
+from functools import lru_cache
+from operator import attrgetter
+
+from rest_framework import fields as drf_fields
+from rest_framework.relations import ManyRelatedField, PKOnlyObject, PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .serializers import JobSerializer
+
+# Read-only fast path for serializer output.
+# A serializer class is compiled once into a flat list of (name, getter) pairs, so building a
+# representation skips DRF's per-field get_attribute/SkipField/ordered-dict machinery. Output is the
+# same as serializer.data: fields come in the serializer's order, values go through the same
+# to_representation of the field, and serializers' extend_representation hooks are applied.
+# Fields without a fast path (many=True serializers and relations, source='*') go through DRF's own
+# get_attribute/to_representation, so they cost what they cost in serializer.data.
+# Works on model instances only, not values() rows; related objects should be preloaded with
+# select_related (and prefetch_related for the many=True fields).
+
+# a field DRF leaves out of the output
+_SKIP = object()
+
+
+def _value_getter(field):
+    get = attrgetter('.'.join(field.source_attrs))
+
+    def getter(instance):
+        try:
+            return get(instance)
+        except AttributeError:
+            # e.g. a missing reverse one-to-one
+            return None
+
+    return getter
+
+
+def _drf_getter(field):
+    def getter(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except drf_fields.SkipField:
+            return _SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+
+    return getter
+
+
+def _drf_only(field):
+    if isinstance(field, (drf_fields.SerializerMethodField, drf_fields.ModelField)):
+        return False
+    return isinstance(field, (ListSerializer, ManyRelatedField)) or not field.source_attrs
+
+
+def _compile_field(field, serializer):
+    if _drf_only(field):
+        return _drf_getter(field)
+
+    if isinstance(field, drf_fields.SerializerMethodField):
+        return getattr(serializer, field.method_name)
+
+    if isinstance(field, drf_fields.ModelField):
+        # ModelField reads the value from the whole instance
+        return field.to_representation
+
+    if isinstance(field, PrimaryKeyRelatedField) and field.use_pk_only_optimization() \
+            and len(field.source_attrs) == 1 and field.pk_field is None:
+        # the foreign key column, without loading the related row
+        return attrgetter(f'{field.source_attrs[0]}_id')
+
+    value = _value_getter(field)
+
+    if isinstance(field, BaseSerializer):
+        build = compile_serializer(type(field))
+
+        def nested(instance):
+            related = value(instance)
+            return None if related is None else build(related)
+
+        return nested
+
+    if isinstance(field, drf_fields.IntegerField):
+        def integer(instance):
+            v = value(instance)
+            return None if v is None else int(v)
+
+        return integer
+
+    if type(field) is drf_fields.CharField:
+        def char(instance):
+            v = value(instance)
+            return None if v is None else str(v)
+
+        return char
+
+    to_representation = field.to_representation
+
+    def generic(instance):
+        v = value(instance)
+        return None if v is None else to_representation(v)
+
+    return generic
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    serializer = serializer_class()
+    fields = [(name, field) for name, field in serializer.fields.items() if not field.write_only]
+    plan = [(name, _compile_field(field, serializer)) for name, field in fields]
+    # only DRF's own path leaves fields out
+    skippable = any(_drf_only(field) for _, field in fields)
+    extend = getattr(serializer, 'extend_representation', None)
+
+    def build(instance):
+        if isinstance(instance, dict):
+            # attribute lookups on a dict would quietly give None for every field
+            raise TypeError(f'{serializer_class.__name__} representation needs model instances, not values() rows')
+        data = {name: getter(instance) for name, getter in plan}
+        if skippable and _SKIP in data.values():
+            data = {name: value for name, value in data.items() if value is not _SKIP}
+        if extend is not None:
+            data = extend(instance, data)
+        return data
+
+    return build
+
+
+def represent(serializer_class, instances):
+    build = compile_serializer(serializer_class)
+    return [build(instance) for instance in instances]
+
+
+def represent_jobs(jobs):
+    return represent(JobSerializer, jobs)
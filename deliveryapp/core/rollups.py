@@ -0,0 +1,73 @@
+from collections import Counter
+from datetime import date
+
+from django.db import transaction
+
+from .models import DailyShipmentStats, Job, JobStatusCount, MonthlyShipmentStats, Shipment
+
+# Incremental dashboard counters.
+# Every hook runs inside the caller's transaction, so a rolled back write never leaves a count behind.
+# Deletes are not tracked; rebuild_rollups recomputes everything from the source tables.
+
+
+def _shipment_day(shipment):
+    value = Shipment._meta.get_field('shipment_date').to_python(shipment.shipment_date)
+    return value.date()
+
+
+def shipment_added(shipment, count=1):
+    day = _shipment_day(shipment)
+    cost = (shipment.cost or 0) * count
+    DailyShipmentStats.objects.add(day, shipment_count=count, total_cost=cost)
+    MonthlyShipmentStats.objects.add(day.replace(day=1), shipment_count=count, total_cost=cost)
+
+
+def shipments_added(shipments):
+    # one update per day and month touched, in order
+    days, months = {}, {}
+    for shipment in shipments:
+        day = _shipment_day(shipment)
+        for totals, key in ((days, day), (months, day.replace(day=1))):
+            count, cost = totals.get(key, (0, 0))
+            totals[key] = (count + 1, cost + (shipment.cost or 0))
+    for day, (count, cost) in sorted(days.items()):
+        DailyShipmentStats.objects.add(day, shipment_count=count, total_cost=cost)
+    for month, (count, cost) in sorted(months.items()):
+        MonthlyShipmentStats.objects.add(month, shipment_count=count, total_cost=cost)
+
+
+def job_added(status, count=1):
+    JobStatusCount.objects.add(status, count=count)
+
+
+def jobs_added(statuses):
+    # in status order, like job_moved, so a bulk create can't deadlock with a transition
+    for status, count in sorted(Counter(statuses).items()):
+        JobStatusCount.objects.add(status, count=count)
+
+
+def job_moved(old_status, new_status):
+    # rows are always touched in the same order, so two opposite moves can't deadlock
+    with transaction.atomic():
+        for status, delta in sorted([(old_status, -1), (new_status, 1)]):
+            JobStatusCount.objects.add(status, count=delta)
+
+
+def status_counts():
+    counts = dict(JobStatusCount.objects.values_list('status', 'count'))
+    return {
+        'total': sum(counts.values()),
+        'pending': counts.get(Job.Status.FINDING_SHIPPER, 0) + counts.get(Job.Status.WAITING_PAY, 0),
+        'shipping': counts.get(Job.Status.WAITING_SHIPPER, 0),
+        'done': counts.get(Job.Status.DONE, 0),
+    }
+
+
+def monthly_series(months=None):
+    rows = MonthlyShipmentStats.objects.order_by('month')
+    if months:
+        today = date.today()
+        first = today.replace(day=1)
+        year, month = divmod(first.year * 12 + first.month - 1 - (months - 1), 12)
+        rows = rows.filter(month__gte=date(year, month + 1, 1))
+    return rows.values_list('month', 'shipment_count', 'total_cost')
@@ -0,0 +1,38 @@
+import re
+import unicodedata
+
+# Keyword search over addresses.
+# Text is folded to lowercase ASCII (Vietnamese diacritics removed, đ -> d) and split into
+# words; Address keeps its words in AddressToken, so a keyword becomes a few index lookups
+# instead of LIKE '%kw%' scans.
+
+TOKEN_MAX_LENGTH = 50
+# longer keywords are cut to this many words
+MAX_QUERY_TOKENS = 8
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    text = str(text).lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return [word[:TOKEN_MAX_LENGTH] for word in _WORD.findall(fold(text))] if text else []
+
+
+def address_tokens(address):
+    tokens = set()
+    for value in (address.city, address.district, address.street, address.home_number):
+        tokens.update(tokenize(value))
+    return tokens
+
+
+def query_tokens(keyword):
+    tokens = []
+    for token in tokenize(keyword):
+        if token not in tokens:
+            tokens.append(token)
+    return tokens[:MAX_QUERY_TOKENS]
@@ -1,6 +1,7 @@
-import cloudinary.uploader
-from rest_framework.serializers import ModelSerializer, SerializerMethodField, DateTimeField
+from rest_framework.serializers import ModelSerializer, SerializerMethodField, DateTimeField, Serializer, \
+    IntegerField, CharField
 from .models import *
+from .media import media_url
 from django.utils import timezone
 
 
@@ -24,14 +25,14 @@ class ShipperSerializer(ModelSerializer):
         }
 
     def to_representation(self, instance):
-
         # Customize the representation of the serialized data here
-        representation = super().to_representation(instance)
+        return self.extend_representation(instance, super().to_representation(instance))
+
+    def extend_representation(self, instance, representation):
         try:
             representation['more'] = ShipperMoreSerializer(instance=instance.more).data
         except AttributeError:
             pass
-
         return representation
 
 
@@ -42,9 +43,11 @@ class VehicleSerializer(ModelSerializer):
 
     def to_representation(self, instance):
         # Customize the representation of the serialized data here
-        representation = super().to_representation(instance)
+        return self.extend_representation(instance, super().to_representation(instance))
+
+    def extend_representation(self, instance, representation):
         try:
-            representation['icon'] = instance.icon.url
+            representation['icon'] = media_url(instance.icon)
         except AttributeError:
             pass
         return representation
@@ -73,9 +76,11 @@ class ProductSerializer(ModelSerializer):
 
     def to_representation(self, instance):
         # Customize the representation of the serialized data here
-        representation = super().to_representation(instance)
-        if instance.category:
-            representation['image'] = instance.image.url
+        return self.extend_representation(instance, super().to_representation(instance))
+
+    def extend_representation(self, instance, representation):
+        if instance.category_id:
+            representation['image'] = media_url(instance.image)
         return representation
 
 
@@ -137,26 +142,23 @@ class PaymentSerializer(ModelSerializer):
 
 class ShipperWithRatingSerializer(ShipperSerializer):
     rating = SerializerMethodField()
+    feedback_count = SerializerMethodField()
 
     def get_rating(self, shipper):
-        fb_query = self.context.get('feedback')
-        if fb_query:
-            fb = FeedbackSerializer(fb_query, many=True)
-            data = fb.data
-        else:
-            fb = Feedback.objects.filter(shipper_id=shipper.id)
-            data = FeedbackSerializer(fb, many=True).data
-
-        if len(data) > 0:
-            s = [s['rating'] for s in data]
-            avg = sum(s) / len(data)
-            return round(avg, 2)
-        else:
+        try:
+            return shipper.rating_stats.average
+        except ShipperRating.DoesNotExist:
+            return 0
+
+    def get_feedback_count(self, shipper):
+        try:
+            return shipper.rating_stats.rating_count
+        except ShipperRating.DoesNotExist:
             return 0
 
     class Meta:
         model = Shipper
-        fields = ['id', 'first_name', 'last_name', 'avatar', 'email', 'rating', 'verified']
+        fields = ['id', 'first_name', 'last_name', 'avatar', 'email', 'rating', 'feedback_count', 'verified']
 
 
 class JobSerializer(ModelSerializer):
@@ -171,9 +173,11 @@ class JobSerializer(ModelSerializer):
 
     def to_representation(self, instance):
         # Customize the representation of the serialized data here
-        representation = super().to_representation(instance)
+        return self.extend_representation(instance, super().to_representation(instance))
+
+    def extend_representation(self, instance, representation):
         try:
-            representation['uuid'] = str(instance.uuid.int)[:12]
+            representation['uuid'] = instance.track_number
         except AttributeError:
             pass
         return representation
@@ -196,9 +200,11 @@ class JobWithProductSerializer(ModelSerializer):
 
     def to_representation(self, instance):
         # Customize the representation of the serialized data here
-        representation = super().to_representation(instance)
+        return self.extend_representation(instance, super().to_representation(instance))
+
+    def extend_representation(self, instance, representation):
         try:
-            representation['uuid'] = str(instance.uuid.int)[:12]
+            representation['uuid'] = instance.track_number
         except AttributeError:
             pass
         return representation
@@ -217,3 +223,54 @@ class CouponSerializer(ModelSerializer):
     class Meta:
         model = Coupon
         fields = '__all__'
+
+
+# Input of POST /jobs/bulk/, one order in the shape JobViewSet.create takes.
+# Foreign keys are plain ids here, checked for the whole batch at once (core.bulk.check_references).
+class BulkAddressSerializer(ModelSerializer):
+    class Meta:
+        model = Address
+        fields = ['contact', 'phone_number', 'country', 'city', 'district', 'street', 'home_number', 'latitude',
+                  'longitude']
+
+
+class BulkShipmentSerializer(ModelSerializer):
+    pick_up = BulkAddressSerializer()
+    delivery_address = BulkAddressSerializer()
+
+    class Meta:
+        model = Shipment
+        fields = ['pick_up', 'delivery_address', 'type', 'shipment_date', 'cost']
+
+
+class BulkProductSerializer(ModelSerializer):
+    category_id = IntegerField(required=False, allow_null=True)
+    # URL or data URI, uploaded by the media worker
+    image = CharField(required=False, allow_blank=True)
+
+    class Meta:
+        model = Product
+        fields = ['category_id', 'quantity', 'mass', 'image']
+
+
+class BulkPaymentSerializer(ModelSerializer):
+    method_id = IntegerField()
+
+    class Meta:
+        model = Payment
+        fields = ['method_id', 'is_poster_pay']
+
+
+class BulkOrderSerializer(ModelSerializer):
+    vehicle_id = IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = Job
+        fields = ['description', 'vehicle_id']
+
+
+class BulkJobSerializer(Serializer):
+    shipment = BulkShipmentSerializer()
+    product = BulkProductSerializer()
+    payment = BulkPaymentSerializer()
+    order = BulkOrderSerializer(required=False, default=dict)
@@ -0,0 +1,236 @@
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import geo, search
+from .models import *
+
+# Synthetic data for load testing.
+# Every row gets an explicit id derived from the job number, and every job draws from its own
+# random stream seeded with (seed, job number), so the data is the same whether a run is fresh or
+# resumed, whatever the batch size, and no id has to be read back from the database
+# (MySQL's bulk_create doesn't return them).
+
+# city, districts, latitude, longitude, share of the jobs
+CITIES = [
+    ('Hồ Chí Minh', ['Quận 1', 'Quận 3', 'Quận 5', 'Quận 7', 'Quận 10', 'Bình Thạnh', 'Phú Nhuận', 'Gò Vấp',
+                     'Tân Bình', 'Thủ Đức'], 10.7769, 106.7009, 40),
+    ('Hà Nội', ['Ba Đình', 'Hoàn Kiếm', 'Đống Đa', 'Cầu Giấy', 'Hai Bà Trưng', 'Thanh Xuân', 'Long Biên'],
+     21.0285, 105.8542, 30),
+    ('Đà Nẵng', ['Hải Châu', 'Thanh Khê', 'Sơn Trà', 'Ngũ Hành Sơn', 'Liên Chiểu'], 16.0544, 108.2022, 8),
+    ('Hải Phòng', ['Hồng Bàng', 'Lê Chân', 'Ngô Quyền', 'Kiến An'], 20.8449, 106.6881, 6),
+    ('Cần Thơ', ['Ninh Kiều', 'Cái Răng', 'Bình Thủy'], 10.0452, 105.7469, 5),
+    ('Biên Hòa', ['Tân Phong', 'Trảng Dài', 'Long Bình'], 10.9574, 106.8427, 4),
+    ('Nha Trang', ['Lộc Thọ', 'Vĩnh Hải', 'Phước Long'], 12.2388, 109.1967, 3),
+    ('Huế', ['Phú Hội', 'Vĩnh Ninh', 'Thuận Hòa'], 16.4637, 107.5909, 2),
+    ('Vũng Tàu', ['Thắng Tam', 'Phường 7', 'Rạch Dừa'], 10.3460, 107.0843, 2),
+]
+STREETS = ['Nguyễn Huệ', 'Lê Lợi', 'Trần Hưng Đạo', 'Hai Bà Trưng', 'Điện Biên Phủ', 'Võ Văn Tần', 'Lý Thường Kiệt',
+           'Nguyễn Trãi', 'Phan Đình Phùng', 'Cách Mạng Tháng Tám', 'Hoàng Diệu', 'Quang Trung', 'Bạch Đằng']
+FAMILY_NAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ']
+GIVEN_NAMES = ['An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hùng', 'Lan', 'Linh', 'Minh', 'Nam', 'Phương',
+               'Quân', 'Thảo', 'Trang', 'Tuấn', 'Việt', 'Yến']
+
+VEHICLES = [('Xe máy', '30kg'), ('Xe tải nhỏ', '500kg'), ('Xe tải', '2 tấn')]
+CATEGORIES = ['Thực phẩm', 'Quần áo', 'Điện tử', 'Tài liệu', 'Nội thất', 'Khác']
+PAYMENT_METHODS = ['Tiền mặt', 'VNPay']
+
+# most jobs of a running service are finished; the rest are spread over the live states
+STATUS_WEIGHTS = {
+    Job.Status.DONE: 58,
+    Job.Status.CANCELED: 8,
+    Job.Status.FINDING_SHIPPER: 12,
+    Job.Status.WAITING_SHIPPER: 9,
+    Job.Status.SHIPPING: 6,
+    Job.Status.WAITING_PAY: 7,
+}
+# share of finished jobs that get a feedback
+FEEDBACK_RATE = 0.7
+RATINGS = [1, 2, 3, 4, 5]
+RATING_WEIGHTS = [3, 4, 10, 33, 50]
+MAX_BIDDERS = 4
+
+
+class Plan:
+    """Id layout of a generated dataset: everything is a function of base_id and the job number."""
+
+    def __init__(self, jobs, posters, shippers, base_id):
+        self.jobs = jobs
+        self.posters = posters
+        self.shippers = shippers
+        self.base_id = base_id
+
+    def poster_id(self, n):
+        return self.base_id + n
+
+    def shipper_id(self, n):
+        return self.base_id + self.posters + n
+
+    def job_id(self, n):
+        # shared by the job's shipment, product, payment and feedback
+        return self.base_id + n
+
+    def address_ids(self, n):
+        return 2 * (self.base_id + n), 2 * (self.base_id + n) + 1
+
+    def auction_id(self, n, k):
+        return MAX_BIDDERS * (self.base_id + n) + k
+
+
+@contextmanager
+def manual_timestamps():
+    """Let generated rows keep their own dates instead of auto_now/auto_now_add."""
+    fields = [Job._meta.get_field('created_at'), Job._meta.get_field('updated_at'),
+              Auction._meta.get_field('time_joined'), Feedback._meta.get_field('created_at')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    def __init__(self, plan, seed=42, days=365, now=None):
+        self.plan = plan
+        self.seed = seed
+        self.days = days
+        # a fixed end date keeps resumed runs identical to uninterrupted ones
+        self.now = now or datetime.combine(date.today(), time.min)
+        self.cities = [city[:4] for city in CITIES]
+        self.city_weights = [city[4] for city in CITIES]
+        self.statuses = list(STATUS_WEIGHTS)
+        self.status_weights = list(STATUS_WEIGHTS.values())
+
+    def reference_data(self):
+        self.vehicles = [Vehicle.objects.get_or_create(name=name, defaults={
+            'description': '', 'capacity': capacity, 'icon': 'vehicle_icon/default'})[0].id
+                         for name, capacity in VEHICLES]
+        self.categories = [ProductCategory.objects.get_or_create(name=name)[0].id for name in CATEGORIES]
+        self.cash, self.online = [PaymentMethod.objects.get_or_create(name=name)[0].id for name in PAYMENT_METHODS]
+
+    def users(self):
+        """Posters and shippers that don't exist yet (a resumed run skips them)."""
+        plan = self.plan
+        rng = random.Random(f'{self.seed}:users')
+        password = make_password(None)
+        existing = set(User.objects.filter(id__gte=plan.poster_id(0), id__lt=plan.shipper_id(plan.shippers))
+                       .values_list('id', flat=True))
+        users = []
+        more = []
+        for n in range(plan.posters + plan.shippers):
+            is_poster = n < plan.posters
+            user_id = plan.poster_id(n) if is_poster else plan.shipper_id(n - plan.posters)
+            first_name, last_name = rng.choice(GIVEN_NAMES), rng.choice(FAMILY_NAMES)
+            vehicle_id = rng.choice(self.vehicles)
+            vehicle_number = f'{rng.randint(29, 99)}A-{rng.randint(10000, 99999)}'
+            if user_id in existing:
+                continue
+            role = User.Roles.BASIC_USER if is_poster else User.Roles.SHIPPER
+            username = f'load-{role.lower()}-{user_id}'
+            users.append(User(id=user_id, username=username, email=f'{username}@example.com', password=password,
+                              first_name=first_name, last_name=last_name, role=role,
+                              date_joined=self.now - timedelta(days=self.days)))
+            if not is_poster:
+                more.append(ShipperMore(user_id=user_id, vehicle_id=vehicle_id, vehicle_number=vehicle_number))
+        return users, more
+
+    def _address(self, rng, address_id, city=None):
+        name, districts, lat, lng = city or rng.choices(self.cities, self.city_weights)[0]
+        # about 10 km around the city centre
+        latitude = Decimal(f'{lat + rng.gauss(0, 0.05):.15f}')
+        longitude = Decimal(f'{lng + rng.gauss(0, 0.05):.14f}')
+        return Address(id=address_id, contact=f'{rng.choice(FAMILY_NAMES)} {rng.choice(GIVEN_NAMES)}',
+                       phone_number=f'09{rng.randint(10000000, 99999999)}', country='Việt Nam', city=name,
+                       district=rng.choice(districts), street=rng.choice(STREETS),
+                       home_number=str(rng.randint(1, 500)), latitude=latitude, longitude=longitude,
+                       geohash=geo.encode(latitude, longitude))
+
+    def batch(self, numbers):
+        """Rows of the given job numbers, by model, in insert order."""
+        plan = self.plan
+        rows = {model: [] for model in (Address, AddressToken, Shipment, Product, Payment, Job, Auction, Feedback)}
+        span = self.days * 86400
+        for n in numbers:
+            rng = random.Random(f'{self.seed}:job:{n}')
+            job_id = plan.job_id(n)
+            # later job numbers are newer, like an auto increment id
+            created = self.now - timedelta(seconds=span - span * n // plan.jobs + rng.randint(0, 59))
+            city = rng.choices(self.cities, self.city_weights)[0]
+            pick_up_id, delivery_id = plan.address_ids(n)
+            pick_up = self._address(rng, pick_up_id, city)
+            # most deliveries stay in the same city
+            delivery = self._address(rng, delivery_id, city if rng.random() < 0.9 else None)
+            for address in (pick_up, delivery):
+                rows[Address].append(address)
+                rows[AddressToken] += [AddressToken(address_id=address.id, token=token)
+                                       for token in search.address_tokens(address)]
+
+            status = rng.choices(self.statuses, self.status_weights)[0]
+            cost = Decimal(rng.randint(15, 300) * 1000)
+            rows[Shipment].append(Shipment(
+                id=job_id, pick_up_id=pick_up_id, delivery_address_id=delivery_id, cost=cost,
+                type=Shipment.Type.NOW if rng.random() < 0.8 else Shipment.Type.LATTER,
+                shipment_date=created + timedelta(hours=rng.randint(0, 48))))
+            rows[Product].append(Product(id=job_id, category_id=rng.choice(self.categories),
+                                         quantity=rng.randint(1, 5), image='product/default',
+                                         mass=f'{rng.randint(1, 30)}kg'))
+
+            online = status == Job.Status.WAITING_PAY or rng.random() < 0.35
+            paid = status == Job.Status.DONE or (online and status != Job.Status.WAITING_PAY)
+            rows[Payment].append(Payment(id=job_id, method_id=self.online if online else self.cash,
+                                         amount=cost if paid else None,
+                                         payment_date=created + timedelta(minutes=rng.randint(1, 600)) if paid
+                                         else None))
+
+            bidders = []
+            if status != Job.Status.WAITING_PAY:
+                count = rng.randint(1, MAX_BIDDERS) if status not in (Job.Status.FINDING_SHIPPER,
+                                                                      Job.Status.CANCELED) \
+                    else rng.randint(0, MAX_BIDDERS - 1)
+                bidders = rng.sample(range(plan.shippers), min(count, plan.shippers))
+            for k, shipper in enumerate(bidders):
+                rows[Auction].append(Auction(id=plan.auction_id(n, k), job_id=job_id,
+                                             shipper_id=plan.shipper_id(shipper),
+                                             time_joined=created + timedelta(minutes=rng.randint(1, 120))))
+            winner = plan.shipper_id(bidders[0]) if bidders and status in (
+                Job.Status.WAITING_SHIPPER, Job.Status.SHIPPING, Job.Status.DONE) else None
+
+            poster_id = plan.poster_id(rng.randrange(plan.posters))
+            updated = created + timedelta(minutes=rng.randint(0, 2880)) if status != Job.Status.FINDING_SHIPPER \
+                else created
+            rows[Job].append(Job(id=job_id, status=status, uuid=uuid.UUID(int=rng.getrandbits(128), version=4),
+                                 poster_id=poster_id, vehicle_id=rng.choice(self.vehicles), description='',
+                                 product_id=job_id, payment_id=job_id, shipment_id=job_id, winner_id=winner,
+                                 created_at=created, updated_at=updated))
+
+            if status == Job.Status.DONE and rng.random() < FEEDBACK_RATE:
+                rows[Feedback].append(Feedback(id=job_id, user_id=poster_id, shipper_id=winner, job_id=job_id,
+                                               rating=rng.choices(RATINGS, RATING_WEIGHTS)[0], comment='',
+                                               created_at=updated))
+        return rows
+
+
+def insert_batch(generator, start, stop):
+    """
+    Generate and insert jobs number start..stop-1 in one transaction, skipping those that exist.
+    A job's rows are always committed together, so an existing job id means the whole job is there.
+    """
+    plan = generator.plan
+    existing = set(Job.objects.filter(id__gte=plan.job_id(start), id__lt=plan.job_id(stop))
+                   .values_list('id', flat=True))
+    numbers = [n for n in range(start, stop) if plan.job_id(n) not in existing]
+    if not numbers:
+        return 0
+    rows = generator.batch(numbers)
+    with manual_timestamps(), transaction.atomic():
+        for model, objects in rows.items():
+            model.objects.bulk_create(objects, batch_size=2000)
+    return len(numbers)
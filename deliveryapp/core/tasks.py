@@ -0,0 +1,25 @@
+from celery import shared_task
+from django.conf import settings
+from django.db.models import F
+
+from . import media
+from .models import MediaUpload
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=settings.MEDIA_UPLOAD_MAX_RETRIES)
+def upload_media(self, upload_id):
+    upload = MediaUpload.objects.filter(pk=upload_id, status=MediaUpload.Status.PENDING).first()
+    if upload is None:
+        return None
+    try:
+        url = media.get_storage().upload(upload.source, upload.folder)
+    except Exception as e:
+        failed = self.request.retries >= self.max_retries
+        MediaUpload.objects.filter(pk=upload_id).update(
+            attempts=F('attempts') + 1, error=str(e)[:255],
+            status=MediaUpload.Status.FAILED if failed else MediaUpload.Status.PENDING)
+        if failed:
+            raise
+        raise self.retry(exc=e, countdown=10 * 2 ** self.request.retries)
+    media.complete(upload, url)
+    return None
@@ -1,3 +1,1314 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import gzip
+import json
+import os
+import re
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import PrimaryKeyRelatedField
+from rest_framework.test import APIClient
+
+from deliveryapp.celery import send_apologia
+
+from . import (authentication, bulk, caching, events, export, geo, mailer, media, metrics, middleware, reference, representation,
+               rollups, search, tasks, throttling, transitions)
+from .admin import ShipperAdmin
+from .db import pool, routers
+from .models import *
+from .paginator import JobKeysetPaginator
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .serializers import AuctionSerializer, JobDetailSerializer, JobSerializer
+
+
+def run_concurrently(*calls):
+    """Run the calls on separate threads released at the same moment; return their results in order."""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def worker(index, func, args):
+        try:
+            barrier.wait()
+            results[index] = func(*args)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, func, args)) for i, (func, args) in enumerate(calls)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def make_job(poster, latitude='10.77', longitude='106.70', cost=30000, **fields):
+    address = Address.objects.create(contact='A', phone_number='0900000000', country='VN', city='HCM',
+                                     district='1', street='Lê Lợi', home_number='1',
+                                     latitude=Decimal(latitude), longitude=Decimal(longitude))
+    shipment = Shipment.objects.create(pick_up=address, delivery_address=address,
+                                       shipment_date=timezone.now(), cost=Decimal(cost))
+    return Job.objects.create(poster=poster, shipment=shipment, payment=Payment.objects.create(), **fields)
+
+
+# SQLite locks the whole database for a write, so racing writers fail with "database table is locked"
+# instead of queueing on the row locks these tests are about
+@skipIf(connection.vendor == 'sqlite', 'needs a database with concurrent writers')
+class JobTransitionConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.shippers = [User.objects.create_user(username=f'shipper{i}', password='x', role=User.Roles.SHIPPER)
+                         for i in range(10)]
+        address = Address.objects.create(contact='A', phone_number='0900000000', country='VN', city='HCM',
+                                         district='1', latitude=Decimal('10.77'), longitude=Decimal('106.70'))
+        shipment = Shipment.objects.create(pick_up=address, delivery_address=address,
+                                           shipment_date=timezone.now(), cost=Decimal(30000))
+        payment = Payment.objects.create()
+        self.job = Job.objects.create(poster=self.poster, shipment=shipment, payment=payment)
+
+    def test_concurrent_assigns_have_one_winner(self):
+        for shipper in self.shippers:
+            self.assertEqual(transitions.join(self.job.id, shipper.id), transitions.JOINED)
+
+        results = run_concurrently(*[(transitions.assign, (self.job.id, s.id, self.poster.id))
+                                     for s in self.shippers])
+
+        self.assertEqual(results.count(True), 1)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, Job.Status.WAITING_SHIPPER)
+        self.assertEqual(self.job.winner_id, self.shippers[results.index(True)].id)
+
+    def test_joins_racing_an_assign(self):
+        first = self.shippers[0]
+        transitions.join(self.job.id, first.id)
+
+        calls = [(transitions.join, (self.job.id, s.id)) for s in self.shippers[1:]]
+        calls.append((transitions.assign, (self.job.id, first.id, self.poster.id)))
+        results = run_concurrently(*calls)
+
+        self.assertTrue(results[-1])
+        joined = results[:-1].count(transitions.JOINED)
+        self.assertEqual(Auction.objects.filter(job=self.job).count(), joined + 1)
+        self.assertEqual(joined + results[:-1].count(transitions.NOT_AVAILABLE), len(self.shippers) - 1)
+
+    def test_duplicate_join_is_rejected(self):
+        shipper = self.shippers[0]
+        results = run_concurrently(*[(transitions.join, (self.job.id, shipper.id)) for _ in range(5)])
+
+        self.assertEqual(results.count(transitions.JOINED), 1)
+        self.assertEqual(results.count(transitions.ALREADY_JOINED), 4)
+        self.assertEqual(Auction.objects.filter(job=self.job).count(), 1)
+
+    def test_complete_settles_payment_once(self):
+        transitions.join(self.job.id, self.shippers[0].id)
+        transitions.assign(self.job.id, self.shippers[0].id, self.poster.id)
+
+        results = run_concurrently(*[(transitions.complete, (self.job.id,)) for _ in range(5)])
+
+        self.assertEqual(results.count(True), 1)
+        payment = Payment.objects.get(pk=self.job.payment_id)
+        self.assertEqual(payment.amount, Decimal(30000))
+        self.assertIsNotNone(payment.payment_date)
+
+
+class AuctionCreateTest(TestCase):
+    def setUp(self):
+        poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        self.job = make_job(poster)
+        self.client = APIClient()
+        self.client.force_authenticate(self.shipper)
+
+    def bid(self, job=None, shipper=None):
+        return self.client.post('/auction/', {'job': job or self.job.id, 'shipper': shipper or self.shipper.id})
+
+    def test_goes_through_the_join_transition(self):
+        response = self.bid()
+        self.assertEqual((response.status_code, response.data['shipper']['id']), (201, self.shipper.id))
+        self.assertEqual(Job.objects.get(pk=self.job.pk).version, self.job.version + 1)
+        self.assertEqual(self.bid().status_code, 409)
+        self.assertEqual(Auction.objects.filter(job=self.job).count(), 1)
+
+    def test_rejected_bids(self):
+        Job.objects.filter(pk=self.job.pk).update(status=Job.Status.CANCELED)
+        self.assertEqual(self.bid().status_code, 400)
+        self.assertEqual(self.bid(job=self.job.id + 100).status_code, 400)
+        self.assertEqual(self.bid(job='abc').status_code, 400)
+        self.assertFalse(Auction.objects.exists())
+
+
+class BulkCreateTest(TestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.cash = PaymentMethod.objects.create(name='Tiền mặt')
+        self.online = PaymentMethod.objects.create(name='VNPay')
+        reference.registry.clear()
+        self.addCleanup(reference.registry.clear)
+
+    def order(self, method, **order):
+        address = {'contact': 'A', 'phone_number': '0900000000', 'country': 'VN', 'city': 'HCM', 'district': '1',
+                   'street': 'Nguyễn Huệ', 'home_number': '1', 'latitude': '10.7700', 'longitude': '106.7000'}
+        return {'shipment': {'pick_up': address, 'delivery_address': address, 'type': Shipment.Type.NOW,
+                             'shipment_date': '2024-03-01T09:00:00', 'cost': '30000'},
+                'product': {'quantity': 1, 'mass': '1kg'},
+                'payment': {'method_id': method.id, 'is_poster_pay': True},
+                'order': order}
+
+    def test_create_jobs(self):
+        client = APIClient()
+        client.force_authenticate(self.poster)
+        orders = [self.order(self.online), self.order(self.cash, description='b'), self.order(self.cash, vehicle_id=999),
+                  self.order(self.cash, description='d')]
+        response = client.post('/jobs/bulk/', {'orders': orders}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([created['index'] for created in response.data['created']], [0, 1, 3])
+        self.assertEqual([error['index'] for error in response.data['errors']], [2])
+
+        jobs = Job.objects.filter(poster=self.poster).select_related('shipment__pick_up', 'payment').order_by('pk')
+        self.assertEqual([job.id for job in jobs], [created['job']['id'] for created in response.data['created']])
+        self.assertEqual([job.status for job in jobs],
+                         [Job.Status.WAITING_PAY, Job.Status.FINDING_SHIPPER, Job.Status.FINDING_SHIPPER])
+        self.assertEqual([job.payment.method_id for job in jobs], [self.online.id, self.cash.id, self.cash.id])
+        self.assertEqual(jobs[0].shipment.pick_up.geohash, geo.encode(Decimal('10.77'), Decimal('106.70')))
+        self.assertEqual(dict(JobStatusCount.objects.values_list('status', 'count')),
+                         {Job.Status.WAITING_PAY: 1, Job.Status.FINDING_SHIPPER: 2})
+        self.assertEqual(AddressToken.objects.filter(address=jobs[1].shipment.pick_up).exists(), True)
+
+    def test_status_counts_are_locked_in_order(self):
+        statuses = [Job.Status.WAITING_PAY, Job.Status.FINDING_SHIPPER, Job.Status.WAITING_PAY]
+        with mock.patch.object(JobStatusCount.objects, 'add') as add:
+            rollups.jobs_added(statuses)
+        self.assertEqual(add.call_args_list, [mock.call(Job.Status.FINDING_SHIPPER, count=1),
+                                              mock.call(Job.Status.WAITING_PAY, count=2)])
+
+    def test_insert_fills_ids_from_last_insert_id(self):
+        lookups = []
+
+        def last_insert_id(execute, sql, params, many, context):
+            # SQLite's equivalent: the first rowid of the last multi-row INSERT
+            if sql.startswith('SELECT LAST_INSERT_ID()'):
+                lookups.append(sql)
+                sql = 'SELECT last_insert_rowid() - changes() + 1, 1'
+            return execute(sql, params, many, context)
+
+        PaymentMethod.objects.create(name='before')
+        methods = [PaymentMethod(name=f'method {i}') for i in range(5)]
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                connection.execute_wrapper(last_insert_id):
+            bulk.insert(PaymentMethod, methods, batch_size=2)
+        # one INSERT and one lookup per batch
+        self.assertEqual(len(lookups), 3)
+        self.assertEqual({method.pk: method.name for method in methods},
+                         dict(PaymentMethod.objects.filter(name__startswith='method').values_list('pk', 'name')))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachedTokenTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.local.clear()
+        self.user = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        self.token = AccessToken.objects.create(user=self.user, token='secret-token', scope='read write',
+                                                expires=timezone.now() + timedelta(hours=1))
+
+    def authenticate(self):
+        request = Request(RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer secret-token'))
+        return authentication.CachedOAuth2Authentication().authenticate(request)
+
+    def cached(self):
+        return cache.get(authentication._key('secret-token')) is not None
+
+    def test_cached_after_first_use(self):
+        user, token = self.authenticate()
+        self.assertEqual((user.pk, token.pk), (self.user.pk, self.token.pk))
+        self.assertTrue(self.cached())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate()[0].pk, self.user.pk)
+
+    def test_revoked_token(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertFalse(self.cached())
+        self.assertIsNone(self.authenticate())
+
+    def test_expired_token(self):
+        self.authenticate()
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            # the cached copy is checked again, then the toolkit refuses it too
+            self.assertIsNone(self.authenticate())
+
+    def test_deactivated_through_a_proxy_model(self):
+        self.authenticate()
+        shipper = Shipper.objects.get(pk=self.user.pk)
+        shipper.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            shipper.save()
+        self.assertFalse(self.cached())
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_updated_without_signals(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(ShipperAdmin, 'message_user'):
+            ShipperAdmin(Shipper, None).verify(RequestFactory().post('/'), Shipper.objects.filter(pk=self.user.pk))
+        self.assertFalse(self.cached())
+        self.assertTrue(self.authenticate()[0].verified)
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def make_pool(self, **options):
+        self.opened = []
+
+        def connect():
+            connection = sqlite3.connect(':memory:', check_same_thread=False)
+            self.opened.append(connection)
+            return connection
+
+        return pool.Pool(connect, lambda c: c.execute('SELECT 1'), lambda c: c.rollback(), **options)
+
+    def wait_for_waiters(self, connections, count):
+        for _ in range(200):
+            if connections.status()['waiting'] == count:
+                return
+            time.sleep(0.005)
+        self.fail(f'{count} waiters never queued')
+
+    def test_connections_are_reused(self):
+        connections = self.make_pool(size=2)
+        entry = connections.checkout()
+        connections.checkin(entry)
+        self.assertIs(connections.checkout().connection, entry.connection)
+        self.assertEqual((connections.stats['checkouts'], connections.stats['created']), (2, 1))
+
+    def test_checkout_timeout(self):
+        connections = self.make_pool(size=1, timeout=0.05)
+        connections.checkout()
+        with self.assertRaises(pool.PoolTimeout):
+            connections.checkout()
+        self.assertEqual(connections.status()['timeouts'], 1)
+        self.assertEqual(connections.status()['waiting'], 0)
+
+    def test_waiters_are_served_in_order(self):
+        connections = self.make_pool(size=1, timeout=5)
+        entry = connections.checkout()
+        served = []
+
+        def wait(name):
+            got = connections.checkout()
+            served.append(name)
+            connections.checkin(got)
+
+        threads = []
+        for count, name in enumerate(('first', 'second', 'third'), 1):
+            threads.append(threading.Thread(target=wait, args=(name,)))
+            threads[-1].start()
+            self.wait_for_waiters(connections, count)
+        # a thread asking now queues behind them instead of taking the returned connection
+        connections.checkin(entry)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(served, ['first', 'second', 'third'])
+        self.assertEqual(len(self.opened), 1)
+
+    def test_old_connections_are_recycled(self):
+        connections = self.make_pool(size=1, max_lifetime=60)
+        entry = connections.checkout()
+        entry.created -= 61
+        connections.checkin(entry)
+        self.assertIsNot(connections.checkout().connection, entry.connection)
+        self.assertEqual((connections.stats['recycled'], len(self.opened)), (1, 2))
+        with self.assertRaises(sqlite3.ProgrammingError):
+            entry.connection.execute('SELECT 1')
+
+    def test_broken_idle_connections_are_replaced(self):
+        connections = self.make_pool(size=1, health_check_after=30)
+        entry = connections.checkout()
+        connections.checkin(entry)
+        entry.connection.close()
+        # a connection used within health_check_after seconds is handed out without a ping
+        self.assertIs(connections.checkout(), entry)
+
+        connections = self.make_pool(size=1, health_check_after=30)
+        entry = connections.checkout()
+        connections.checkin(entry)
+        entry.used -= 31
+        entry.connection.close()
+        self.assertIsNot(connections.checkout().connection, entry.connection)
+        self.assertEqual(connections.stats['health_check_failures'], 1)
+
+    def test_forked_child_starts_empty(self):
+        connections = self.make_pool(size=1, timeout=0.05)
+        idle = connections.checkout()
+        connections.checkin(idle)
+        busy = connections.checkout()
+        with mock.patch('core.db.pool.os.getpid', return_value=os.getpid() + 1):
+            # the parent's connections are neither reused nor counted against the child's size
+            child = connections.checkout()
+            self.assertNotIn(child.connection, (idle.connection, busy.connection))
+            connections.checkin(busy)
+            self.assertEqual(connections.status()['in_use'], 1)
+            self.assertEqual(connections.status()['idle'], 0)
+
+
+class CounterTest(TestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+
+    def rows(self):
+        return (list(DailyShipmentStats.objects.order_by('day').values_list('day', 'shipment_count', 'total_cost')),
+                list(MonthlyShipmentStats.objects.order_by('month').values_list('month', 'shipment_count',
+                                                                                  'total_cost')),
+                dict(JobStatusCount.objects.exclude(count=0).values_list('status', 'count')))
+
+    def test_rating_aggregate_matches_rebuild(self):
+        for rating in (5, 3, 4, 5, 0):
+            job = make_job(self.poster)
+            Feedback.objects.create(user=self.poster, shipper_id=self.shipper.id, job=job, rating=rating)
+            ShipperRating.objects.record(self.shipper.id, rating)
+        stats = ShipperRating.objects.get(shipper=self.shipper)
+        self.assertEqual((stats.rating_sum, stats.rating_count, stats.average), (17, 5, 3.4))
+        self.assertEqual(stats.histogram, {1: 0, 2: 0, 3: 1, 4: 1, 5: 2})
+
+        call_command('rebuild_ratings', stdout=io.StringIO())
+        rebuilt = ShipperRating.objects.get(shipper=self.shipper)
+        self.assertEqual((rebuilt.rating_sum, rebuilt.rating_count, rebuilt.histogram),
+                         (stats.rating_sum, stats.rating_count, stats.histogram))
+
+    def test_rollups_match_rebuild(self):
+        jobs = [make_job(self.poster, cost=cost) for cost in (10000, 20000, 30000)]
+        for job in jobs[:2]:
+            rollups.shipment_added(job.shipment)
+            rollups.job_added(job.status)
+        rollups.shipments_added([jobs[2].shipment])
+        rollups.jobs_added([jobs[2].status])
+        Job.objects.filter(pk=jobs[0].pk).update(status=Job.Status.WAITING_PAY)
+        rollups.job_moved(Job.Status.FINDING_SHIPPER, Job.Status.WAITING_PAY)
+
+        maintained = self.rows()
+        self.assertEqual(maintained[2], {Job.Status.FINDING_SHIPPER: 2, Job.Status.WAITING_PAY: 1})
+        self.assertEqual(maintained[0][0][1:], (3, Decimal(60000)))
+        self.assertEqual(rollups.status_counts(), {'total': 3, 'pending': 3, 'shipping': 0, 'done': 0})
+
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rows(), maintained)
+
+
+@override_settings(REQUEST_METRICS={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'STORE': 'core.metrics.InMemoryMetricsStore',
+                                   'REDIS_URL': None})
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        metrics.get_store.cache_clear()
+        self.addCleanup(metrics.get_store.cache_clear)
+        self.shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        self.url = f'/shippers/{self.shipper.id}/'
+
+    def queries(self, response):
+        self.assertEqual(response.status_code, 200)
+        return int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+    def recorded_queries(self):
+        return sum(fields['queries'] for fields in metrics.get_store().snapshot().values())
+
+    def test_sync_request(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url)
+        self.assertEqual(self.queries(response), len(captured))
+        self.assertEqual(self.recorded_queries(), len(captured))
+
+    async def test_async_request(self):
+        # the view runs in a worker thread; its queries still count for the request
+        response = await self.async_client.get(self.url)
+        self.assertGreater(self.queries(response), 0)
+        self.assertEqual(self.recorded_queries(), self.queries(response))
+
+    def test_no_recording_outside_requests(self):
+        self.client.get(self.url)
+        User.objects.count()
+        queries = self.queries(self.client.get(self.url))
+        self.assertEqual(self.recorded_queries(), queries * 2)
+
+    def test_redis_store_has_timeouts(self):
+        options = metrics.RedisMetricsStore(url='redis://localhost:6379/0').client.connection_pool.connection_kwargs
+        self.assertEqual((options['socket_timeout'], options['socket_connect_timeout']), (0.1, 0.1))
+
+
+@override_settings(REPLICA_ROUTING={'REPLICAS': ['replica'], 'STICKY_SECONDS': 5, 'PRIMARY_APPS': ['sessions']},
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = routers.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def request(self, method, user_id=1):
+        request = getattr(self.factory, method)('/jobs/')
+        request.user = User(pk=user_id)
+        return request
+
+    def read_in(self, request, write=False):
+        routing, token = routers.start(request)
+        try:
+            if write:
+                self.router.db_for_write(Job)
+            return self.router.db_for_read(Job)
+        finally:
+            routers.stop(token)
+            if routing.wrote:
+                routing.pin()
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.read_in(self.request('get')), 'replica')
+        self.assertEqual(self.read_in(self.request('post')), 'default')
+        # outside a request (Celery tasks, commands)
+        self.assertEqual(self.router.db_for_read(Job), 'default')
+
+    def test_writer_reads_from_primary_for_a_while(self):
+        self.assertEqual(self.read_in(self.request('post'), write=True), 'default')
+
+        self.assertEqual(self.read_in(self.request('get')), 'default')
+        self.assertEqual(self.read_in(self.request('get', user_id=2)), 'replica')
+        cache.clear()  # the pin expired
+        self.assertEqual(self.read_in(self.request('get')), 'replica')
+
+    def test_primary_apps(self):
+        from django.contrib.sessions.models import Session
+
+        routing, token = routers.start(self.request('get'))
+        try:
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+        finally:
+            routers.stop(token)
+
+    def test_view_override(self):
+        class View:
+            def list(self):
+                pass
+
+        def view_func():
+            pass
+
+        view_func.cls, view_func.actions = View, {'get': 'list'}
+        self.assertIsNone(routers.view_setting(view_func, 'GET'))
+        routers.replica_reads(False)(View.list)
+        self.assertIs(routers.view_setting(view_func, 'GET'), False)
+        self.assertIsNone(routers.view_setting(view_func, 'POST'))
+
+
+@override_settings(THROTTLING={'STORE': 'core.throttling.InMemoryBucketStore', 'REDIS_URL': None, 'RATES': {}})
+class FindNearbyTest(TestCase):
+    def setUp(self):
+        poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        self.near = make_job(poster, '10.7770', '106.7010')
+        self.nearer = make_job(poster, '10.7701', '106.7001')
+        make_job(poster, '21.0285', '105.8542')  # Hà Nội
+        make_job(poster, '10.7702', '106.7002', status=Job.Status.DONE)
+        self.client = APIClient()
+        self.client.force_authenticate(shipper)
+
+    def find(self, **params):
+        return self.client.get('/shipper-jobs/find/', params)
+
+    def test_ranked_by_distance(self):
+        response = self.find(latitude='10.77', longitude='106.70', radius='5')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([job['id'] for job in results], [self.nearer.id, self.near.id])
+        self.assertLessEqual(results[0]['distance'], results[1]['distance'])
+
+    def test_invalid_parameters(self):
+        for params in ({'latitude': 'x', 'longitude': '106.70'},
+                       {'latitude': '', 'longitude': '106.70'},
+                       {'latitude': '10.77', 'longitude': '106.70', 'radius': 'nan'},
+                       {'latitude': '10.77', 'longitude': '106.70', 'radius': 'inf'},
+                       {'latitude': 'nan', 'longitude': '106.70'},
+                       {'latitude': '91', 'longitude': '106.70'},
+                       {'latitude': '10.77', 'longitude': '106.70', 'radius': '0'}):
+            self.assertEqual(self.find(**params).status_code, 400, params)
+
+
+@override_settings(THROTTLING={'STORE': 'core.throttling.InMemoryBucketStore', 'REDIS_URL': None, 'RATES': {}})
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        self.jobs = [make_job(self.poster), make_job(self.poster)]
+        self.poster_client = APIClient()
+        self.poster_client.force_authenticate(self.poster)
+        self.shipper_client = APIClient()
+        self.shipper_client.force_authenticate(self.shipper)
+
+    def revalidate(self, client, url):
+        """A conditional GET of url, with the ETag url has now."""
+        etag = client.get(url)['ETag']
+        return lambda: client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_join_changes_the_detail_etag(self):
+        url = f'/shipper-jobs/{self.jobs[0].id}/'
+        conditional_get = self.revalidate(self.shipper_client, url)
+        self.assertEqual(conditional_get().status_code, 304)
+        self.assertEqual(self.shipper_client.post(f'{url}join/').status_code, 201)
+        response = conditional_get()
+        self.assertEqual((response.status_code, response.data['shipper_count']), (200, 1))
+
+    def test_rating_changes_the_detail_etag(self):
+        Job.objects.filter(pk=self.jobs[0].pk).update(winner_id=self.shipper.id, status=Job.Status.WAITING_SHIPPER)
+        conditional_get = self.revalidate(self.poster_client, f'/jobs/{self.jobs[0].id}/')
+        self.assertEqual(conditional_get().status_code, 304)
+        # the winner's rating is part of the detail, but rating a shipper does not touch the job row
+        ShipperRating.objects.record(self.shipper.id, 4)
+        self.assertEqual(conditional_get().status_code, 200)
+
+    def test_list_has_no_last_modified(self):
+        response = self.poster_client.get('/jobs/')
+        self.assertNotIn('Last-Modified', response)
+        conditional_get = self.revalidate(self.poster_client, '/jobs/')
+        self.assertEqual(conditional_get().status_code, 304)
+        # deleting a job leaves the newest updated_at as it was
+        self.jobs[0].delete()
+        self.assertEqual(conditional_get().status_code, 200)
+        response = self.poster_client.get('/jobs/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual((response.status_code, response.data['count']), (200, 1))
+
+    def test_keyset_list_is_validated_from_the_page(self):
+        url = '/jobs/?pagination=cursor'
+        conditional_get = self.revalidate(self.poster_client, url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(conditional_get().status_code, 304)
+        # the page query only: no aggregate over the poster's whole history
+        self.assertEqual(len(queries), 1, [q['sql'] for q in queries])
+        self.assertNotRegex(queries[0]['sql'], r'COUNT|MAX|SUM')
+        transitions.cancel(self.jobs[0].id, self.poster.id)
+        self.assertEqual(conditional_get().status_code, 200)
+
+
+class TokenBucketTest(TestCase):
+    def test_capacity_and_refill(self):
+        store = throttling.InMemoryBucketStore()
+        capacity, rate = throttling.parse_rate('3/10m')
+        self.assertEqual((capacity, rate), (3, 3 / 600))
+        with mock.patch('core.throttling.time') as clock:
+            clock.monotonic.return_value = 1000.0
+            self.assertEqual([store.take('k', capacity, rate)[0] for _ in range(4)], [True, True, True, False])
+            self.assertAlmostEqual(store.take('k', capacity, rate)[1], 200)
+            # one token every 200 seconds, never more than the capacity
+            clock.monotonic.return_value = 1200.0
+            self.assertEqual([store.take('k', capacity, rate)[0] for _ in range(2)], [True, False])
+            clock.monotonic.return_value = 100000.0
+            self.assertEqual([store.take('k', capacity, rate)[0] for _ in range(4)], [True, True, True, False])
+            # buckets are per key
+            self.assertTrue(store.take('other', capacity, rate)[0])
+
+    def test_ip_key_ignores_forwarded_for(self):
+        keys = {throttling.IPThrottle().get_key(Request(RequestFactory().post(
+            '/', REMOTE_ADDR='203.0.113.7', HTTP_X_FORWARDED_FOR=forwarded)), None)
+            for forwarded in ('198.51.100.1', '198.51.100.2, 10.0.0.1')}
+        self.assertEqual(keys, {'ip:203.0.113.7'})
+
+    @override_settings(THROTTLING={'STORE': 'core.throttling.InMemoryBucketStore', 'REDIS_URL': None,
+                                   'RATES': {'find': '2/m'}})
+    def test_429_with_retry_after(self):
+        throttling.get_store.cache_clear()
+        self.addCleanup(throttling.get_store.cache_clear)
+        shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        client = APIClient()
+        client.force_authenticate(shipper)
+        self.assertEqual([client.get('/shipper-jobs/find/?page=1').status_code for _ in range(2)], [200, 200])
+        response = client.get('/shipper-jobs/find/?page=1')
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '30'))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'job-cache-test'}})
+class JobCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidated_on_commit(self):
+        before = caching.generations(caching.JOBS)
+        with self.captureOnCommitCallbacks() as callbacks:
+            caching.changed(caching.JOBS)
+            # readers inside the transaction window still see the old generation
+            self.assertEqual(caching.generations(caching.JOBS), before)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(caching.generations(caching.JOBS), before)
+
+    def test_join_drops_the_shippers_find_pages(self):
+        poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        job = make_job(poster)
+        client = APIClient()
+        client.force_authenticate(shipper)
+        with override_settings(THROTTLING={'STORE': 'core.throttling.InMemoryBucketStore', 'REDIS_URL': None,
+                                           'RATES': {}}):
+            self.assertEqual([j['id'] for j in client.get('/shipper-jobs/find/?page=1').data['results']], [job.id])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(client.post(f'/shipper-jobs/{job.id}/join/').status_code, 201)
+            self.assertEqual(client.get('/shipper-jobs/find/?page=1').data['results'], [])
+
+    def test_find_pages_are_served_from_the_cache(self):
+        poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        job = make_job(poster)
+        client = APIClient()
+        client.force_authenticate(shipper)
+        with override_settings(THROTTLING={'STORE': 'core.throttling.InMemoryBucketStore', 'REDIS_URL': None,
+                                           'RATES': {}}):
+            first = client.get('/shipper-jobs/find/?page=1').data
+            with CaptureQueriesContext(connection) as queries:
+                second = client.get('/shipper-jobs/find/?page=1').data
+        self.assertEqual(second, first)
+        self.assertEqual([j['id'] for j in second['results']], [job.id])
+        self.assertFalse([q for q in queries if 'core_job' in q['sql']])
+
+
+def collect(stream, count):
+    """The next count items of an event stream, stopping early when it ends."""
+    async def take():
+        items = []
+        async for item in stream:
+            items.append(item)
+            if len(items) == count:
+                break
+        return items
+
+    return take()
+
+
+class InMemoryBrokerTest(SimpleTestCase):
+    def event(self, job_id):
+        return {'type': events.JOB_CREATED, 'job': {'id': job_id}}
+
+    def test_publish_subscribe(self):
+        broker = events.InMemoryBroker()
+
+        async def scenario():
+            stream = broker.subscribe(heartbeat=0.01)
+            # the first heartbeat means the subscription is in place
+            self.assertIsNone(await anext(stream))
+            broker.publish(self.event(1))
+            broker.publish(self.event(2))
+            items = await collect(stream, 2)
+            await stream.aclose()
+            return items
+
+        self.assertEqual(asyncio.run(scenario()), [('1', self.event(1)), ('2', self.event(2))])
+
+    def test_resume_from_last_event_id(self):
+        broker = events.InMemoryBroker(history=3)
+        for job_id in range(1, 5):
+            broker.publish(self.event(job_id))
+        self.assertEqual(asyncio.run(collect(broker.subscribe('2'), 2)), [('3', self.event(3)), ('4', self.event(4))])
+        # event 1 is no longer in the history, so resuming from the start would skip it
+        self.assertEqual(asyncio.run(collect(broker.subscribe('0'), 2)), [('4', {'type': events.RESYNC})])
+        self.assertEqual(asyncio.run(collect(broker.subscribe('abc'), 2)), [('4', {'type': events.RESYNC})])
+
+    def test_slow_subscriber_is_told_to_resync(self):
+        broker = events.InMemoryBroker(queue_size=2)
+
+        async def scenario():
+            stream = broker.subscribe(heartbeat=0.01)
+            self.assertIsNone(await anext(stream))
+            for job_id in range(1, 6):
+                broker.publish(self.event(job_id))
+            # the stream ends after the resync marker
+            return await collect(stream, 10)
+
+        self.assertEqual(asyncio.run(scenario()),
+                         [('1', self.event(1)), ('2', self.event(2)), ('3', {'type': events.RESYNC})])
+
+
+class RedisBrokerTest(SimpleTestCase):
+    class Client:
+        def __init__(self, ids):
+            self.ids = [(event_id.encode(), {}) for event_id in ids]
+            self.read = []
+
+        async def xrange(self, stream, count):
+            return self.ids[:count]
+
+        async def xrevrange(self, stream, count):
+            return self.ids[::-1][:count]
+
+        async def xread(self, streams, count, block):
+            self.read.append(streams)
+            return []
+
+        async def aclose(self):
+            pass
+
+    def subscribe(self, client, last_id):
+        broker = events.RedisBroker(url='redis://unused')
+        with mock.patch('redis.asyncio.Redis.from_url', return_value=client):
+            return asyncio.run(collect(broker.subscribe(last_id, heartbeat=0), 1))
+
+    def test_bad_cursor_resyncs(self):
+        for cursor in ('abc', '1-2-3', '-1', ''):
+            client = self.Client(['5-0', '6-0'])
+            self.assertEqual(self.subscribe(client, cursor), [('6-0', {'type': events.RESYNC})], cursor)
+            self.assertEqual(client.read, [])
+
+    def test_expired_cursor_resyncs(self):
+        client = self.Client(['5-0', '6-0'])
+        self.assertEqual(self.subscribe(client, '4-9'), [('6-0', {'type': events.RESYNC})])
+
+    def test_valid_cursor_reads_after_it(self):
+        client = self.Client(['5-0', '6-0'])
+        self.assertEqual(self.subscribe(client, '5'), [None])
+        self.assertEqual(client.read, [{'job:events': '5'}])
+
+
+class JobWithBiddersSerializer(JobSerializer):
+    # many=True fields have no fast path in core.representation
+    auction_job = AuctionSerializer(many=True, read_only=True)
+    bidders = PrimaryKeyRelatedField(source='auction_job', many=True, read_only=True)
+
+
+class RepresentationTest(TestCase):
+    def setUp(self):
+        poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        shippers = [User.objects.create_user(username=f'shipper{i}', password='x', role=User.Roles.SHIPPER)
+                    for i in range(2)]
+        self.jobs = [make_job(poster), make_job(poster, cost=45000)]
+        for shipper in shippers:
+            Auction.objects.create(job=self.jobs[0], shipper=shipper)
+        Job.objects.filter(pk=self.jobs[0].pk).update(winner_id=shippers[0].id, status=Job.Status.WAITING_SHIPPER)
+
+    def assertSameAsSerializer(self, serializer_class, jobs):
+        expected = json.loads(json.dumps(serializer_class(jobs, many=True).data, cls=DjangoJSONEncoder))
+        actual = json.loads(json.dumps(representation.represent(serializer_class, jobs), cls=DjangoJSONEncoder))
+        self.assertEqual(actual, expected)
+
+    def test_matches_serializer(self):
+        jobs = Job.objects.select_related('product', 'shipment__pick_up', 'shipment__delivery_address', 'payment',
+                                          'vehicle', 'winner__rating_stats').order_by('pk')
+        for serializer_class in (JobSerializer, JobDetailSerializer, JobWithBiddersSerializer):
+            with self.subTest(serializer_class.__name__):
+                self.assertSameAsSerializer(serializer_class, list(jobs.prefetch_related('auction_job__shipper')))
+
+    def test_values_rows_are_rejected(self):
+        with self.assertRaises(TypeError):
+            representation.represent_jobs(Job.objects.values())
+
+
+class ShipperRatingTest(TestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.shipper = User.objects.create_user(username='shipper', password='x', role=User.Roles.SHIPPER)
+        self.client = APIClient()
+        self.client.force_authenticate(self.poster)
+
+    def feedback(self, job, rating):
+        return self.client.post(f'/jobs/{job.id}/feedback/', {'shipper_id': self.shipper.id, 'rating': rating,
+                                                               'comment': 'ok'})
+
+    def test_feedback_maintains_the_aggregate(self):
+        jobs = [make_job(self.poster) for _ in range(3)]
+        for job, rating in zip(jobs, (5, 4, 4)):
+            self.assertEqual(self.feedback(job, rating).status_code, 201)
+        # a second feedback on the same job is rejected and its rating not counted
+        self.assertEqual(self.feedback(jobs[0], 1).status_code, 400)
+
+        stats = ShipperRating.objects.get(shipper=self.shipper)
+        self.assertEqual((stats.rating_count, stats.rating_sum, stats.average), (3, 13, 4.33))
+        self.assertEqual(stats.histogram, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+        self.assertEqual(Feedback.objects.filter(shipper_id=self.shipper.id).count(), 3)
+
+
+class ListShipperTest(TestCase):
+    def test_bidders_with_ratings_in_one_query(self):
+        poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        vehicle = Vehicle.objects.create(name='Motorbike', description='', capacity='20kg', icon='icon')
+        job = make_job(poster)
+        shippers = [User.objects.create_user(username=f'shipper{i}', password='x', role=User.Roles.SHIPPER)
+                    for i in range(3)]
+        ShipperMore.objects.create(user=shippers[0], vehicle=vehicle, vehicle_number='59A1')
+        ShipperMore.objects.create(user=shippers[1], vehicle=vehicle, vehicle_number='59A2')
+        for shipper in shippers:
+            Auction.objects.create(job=job, shipper_id=shipper.id)
+        ShipperRating.objects.record(shippers[0].id, 5)
+        ShipperRating.objects.record(shippers[0].id, 4)
+        ShipperRating.objects.record(shippers[1].id, 3)
+
+        client = APIClient()
+        client.force_authenticate(poster)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/jobs/{job.id}/list-shipper/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([(s['id'], s['rating'], s['feedback_count']) for s in response.data],
+                         [(shippers[0].id, 4.5, 2), (shippers[1].id, 3, 1), (shippers[2].id, 0, 0)])
+        self.assertEqual(response.data[0]['more']['vehicle_number'], '59A1')
+        self.assertNotIn('more', response.data[2])
+
+        self.assertEqual(client.get('/jobs/0/list-shipper/').status_code, 400)
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='x', email='admin@example.com')
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.client.force_login(self.admin)
+
+    def changelist(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_job_changelist_queries_do_not_grow_with_rows(self):
+        category = ProductCategory.objects.create(name='Food')
+        job = make_job(self.poster, product=Product.objects.create(category=category, quantity=1, mass='1kg',
+                                                                   image='image'))
+        # the category filter's first request loads the reference data
+        self.changelist('/admin/core/job/')
+        response, few = self.changelist('/admin/core/job/')
+        self.assertContains(response, f'# {job.track_number}')
+        self.assertContains(response, 'Food')
+        for _ in range(5):
+            make_job(self.poster, product=Product.objects.create(category=category, quantity=1, mass='1kg',
+                                                                 image='image'))
+        self.assertEqual(self.changelist('/admin/core/job/')[1], few)
+
+    def test_shipper_changelist_queries_do_not_grow_with_rows(self):
+        vehicle = Vehicle.objects.create(name='Motorbike', description='', capacity='20kg', icon='icon')
+
+        def add_shipper(index):
+            shipper = User.objects.create_user(username=f'shipper{index}', password='x', role=User.Roles.SHIPPER)
+            ShipperMore.objects.create(user=shipper, vehicle=vehicle, vehicle_number=f'59A{index}')
+
+        add_shipper(0)
+        response, few = self.changelist('/admin/core/shipper/')
+        self.assertContains(response, 'Motorbike')
+        self.assertContains(response, '59A0')
+        for index in range(1, 6):
+            add_shipper(index)
+        response, many = self.changelist('/admin/core/shipper/?o=5')
+        self.assertEqual(many, few)
+        self.assertEqual(response.context['cl'].result_list[0].vehicle_number, '59A0')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'reference-test'}})
+class ReferenceDataTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference.registry.clear()
+        self.addCleanup(reference.registry.clear)
+        self.vehicle = Vehicle.objects.create(name='Motorbike', description='', capacity='20kg', icon='icon')
+        self.cash = PaymentMethod.objects.create(name='Tiền mặt')
+        PaymentMethod.objects.create(name='VNPay')
+
+    def test_lists_are_served_from_memory(self):
+        first = self.client.get('/vehicles/')
+        self.assertEqual([v['name'] for v in first.json()], ['Motorbike'])
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/vehicles/')
+            not_modified = self.client.get('/vehicles/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual((second.content, second['ETag']), (first.content, first['ETag']))
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(reference.get().vehicles.get(self.vehicle.pk), self.vehicle)
+        self.assertEqual(reference.cash_payment_method(), self.cash)
+
+    def test_write_reloads_after_commit(self):
+        etag = self.client.get('/vehicles/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Vehicle.objects.create(name='Truck', description='', capacity='1t', icon='icon')
+            # the transaction isn't committed yet: the old copy is still served
+            self.assertEqual(len(reference.get().vehicles.rows), 1)
+        response = self.client.get('/vehicles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([v['name'] for v in response.json()], ['Motorbike', 'Truck'])
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_processes_reload_within_the_check_interval(self):
+        # another process: its own registry, seeing the change only through the shared version
+        registry = reference.Registry()
+        now = time.monotonic()
+        with mock.patch.object(reference.time, 'monotonic', return_value=now):
+            snapshot = registry.get()
+            Vehicle.objects.filter(pk=self.vehicle.pk).update(name='Scooter')
+            caching.invalidate(reference.NAMESPACE)
+            self.assertIs(registry.get(), snapshot)
+        with mock.patch.object(reference.time, 'monotonic', return_value=now + reference.CHECK_INTERVAL):
+            self.assertEqual(registry.get().vehicles.get(self.vehicle.pk).name, 'Scooter')
+
+
+class AddressSearchTest(TestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+
+    def address(self, street, district='1', city='Hồ Chí Minh'):
+        return Address.objects.create(contact='A', phone_number='0900000000', country='VN', city=city,
+                                      district=district, street=street, home_number='12A',
+                                      latitude=Decimal('10.77'), longitude=Decimal('106.70'))
+
+    def job(self, pick_up, delivery_address):
+        shipment = Shipment.objects.create(pick_up=pick_up, delivery_address=delivery_address,
+                                           shipment_date=timezone.now(), cost=Decimal(30000))
+        return Job.objects.create(poster=self.poster, shipment=shipment, payment=Payment.objects.create())
+
+    def test_folding(self):
+        self.assertEqual(search.fold('Đường Nguyễn Huệ'), 'duong nguyen hue')
+        self.assertEqual(search.tokenize('Quận Thủ Đức, P.12/3'), ['quan', 'thu', 'duc', 'p', '12', '3'])
+        self.assertEqual(search.query_tokens('lê LÊ le lợi'), ['le', 'loi'])
+        self.assertEqual(len(search.query_tokens(' '.join(str(i) for i in range(20)))), search.MAX_QUERY_TOKENS)
+
+    def test_save_reindexes(self):
+        address = self.address('Lê Lợi')
+
+        def tokens():
+            return set(address.tokens.values_list('token', flat=True))
+
+        self.assertEqual(tokens(), {'ho', 'chi', 'minh', '1', 'le', 'loi', '12a'})
+        address.street = 'Đồng Khởi'
+        address.save()
+        self.assertEqual(tokens(), {'ho', 'chi', 'minh', '1', 'dong', 'khoi', '12a'})
+
+    def test_kw_filter(self):
+        nguyen_hue = self.job(self.address('Nguyễn Huệ'), self.address('Lê Lợi', district='3'))
+        dong_khoi = self.job(self.address('Đồng Khởi'), self.address('Hai Bà Trưng', city='Hà Nội'))
+        client = APIClient()
+        client.force_authenticate(self.poster)
+
+        def found(kw):
+            response = client.get('/jobs/', {'kw': kw})
+            self.assertEqual(response.status_code, 200)
+            return {job['id'] for job in response.data['results']}
+
+        self.assertEqual(found('Nguyễn Huệ'), {nguyen_hue.id})
+        self.assertEqual(found('nguyen hue'), {nguyen_hue.id})
+        self.assertEqual(found('NGUY'), {nguyen_hue.id})
+        # delivery addresses are searched too
+        self.assertEqual(found('ha noi'), {dong_khoi.id})
+        self.assertEqual(found('12a'), {nguyen_hue.id, dong_khoi.id})
+        # every word has to be in the same address
+        self.assertEqual(found('nguyen loi'), set())
+        self.assertEqual(found('!!'), set())
+
+
+class MediaUploadTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/',
+                                     MEDIA_STORAGE_BACKEND='core.media.LocalMediaStorage')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        media.get_storage.cache_clear()
+        self.addCleanup(media.get_storage.cache_clear)
+        self.user = User.objects.create_user(username='user', password='x', role=User.Roles.BASIC_USER)
+
+    def queue(self, source):
+        with self.captureOnCommitCallbacks(execute=True):
+            upload = media.upload_later(self.user, 'avatar', source, folder='avatar_user/')
+            # nothing is uploaded before the row is committed
+            self.assertEqual(MediaUpload.objects.get(pk=upload.pk).status, MediaUpload.Status.PENDING)
+        return MediaUpload.objects.get(pk=upload.pk)
+
+    def test_complete(self):
+        upload = self.queue(SimpleUploadedFile('me.png', b'png bytes'))
+        self.assertEqual((upload.status, upload.attempts, upload.error), (MediaUpload.Status.DONE, 0, None))
+        self.assertTrue(upload.url.startswith('/media/avatar_user/') and upload.url.endswith('.png'))
+        with open(os.path.join(self.media_root, upload.url[len('/media/'):]), 'rb') as f:
+            self.assertEqual(f.read(), b'png bytes')
+        # the staged copy is removed once stored
+        self.assertFalse(os.path.exists(upload.source))
+        self.assertEqual(str(User.objects.get(pk=self.user.pk).avatar), upload.url)
+
+    def test_retried_until_it_succeeds(self):
+        storage = media.get_storage()
+        calls = []
+
+        def flaky(source, folder):
+            calls.append(source)
+            if len(calls) < 3:
+                raise ConnectionError('storage unavailable')
+            return '/media/avatar_user/done.png'
+
+        with mock.patch.object(storage, 'upload', side_effect=flaky):
+            upload = self.queue('data:image/png;base64,cG5n')
+        self.assertEqual(len(calls), 3)
+        # attempts counts the failures; the error is cleared by the upload that went through
+        self.assertEqual((upload.status, upload.attempts, upload.error, upload.url),
+                         (MediaUpload.Status.DONE, 2, None, '/media/avatar_user/done.png'))
+        self.assertEqual(str(User.objects.get(pk=self.user.pk).avatar), upload.url)
+
+    def test_failed_after_max_retries(self):
+        storage = media.get_storage()
+        with mock.patch.object(storage, 'upload', side_effect=ConnectionError('storage unavailable')) as upload_file:
+            self.queue('data:image/png;base64,cG5n')
+        # the last attempt's error is not propagated by an eager task, it is left on the row
+        upload = MediaUpload.objects.get()
+        self.assertEqual(upload_file.call_count, tasks.upload_media.max_retries + 1)
+        self.assertEqual((upload.status, upload.attempts, upload.error, upload.url),
+                         (MediaUpload.Status.FAILED, tasks.upload_media.max_retries + 1, 'storage unavailable', None))
+        self.assertFalse(User.objects.get(pk=self.user.pk).avatar)
+
+    def test_done_uploads_are_not_repeated(self):
+        upload = self.queue('data:image/png;base64,cG5n')
+        with mock.patch.object(media.get_storage(), 'upload') as upload_file:
+            tasks.upload_media.delay(upload.pk)
+        upload_file.assert_not_called()
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        jobs = [make_job(self.poster) for _ in range(9)]
+        # three jobs per timestamp, so pages break inside a run of equal created_at values
+        start = datetime(2024, 5, 1, 8, 0)
+        for index, job in enumerate(jobs):
+            Job.objects.filter(pk=job.pk).update(created_at=start + timedelta(minutes=index // 3))
+        self.expected = list(Job.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def page(self, url):
+        paginator = JobKeysetPaginator()
+        results = paginator.paginate_queryset(Job.objects.all(), Request(RequestFactory().get(url)))
+        return [job.id for job in results], paginator.get_paginated_response(None)['links']
+
+    def test_forward_and_back(self):
+        pages, links = [], {'next': '/jobs/?pagination=cursor'}
+        while links['next']:
+            ids, links = self.page(links['next'])
+            pages.append(ids)
+        self.assertEqual([len(ids) for ids in pages], [4, 4, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        backwards = []
+        while links['previous']:
+            ids, links = self.page(links['previous'])
+            backwards.append(ids)
+        self.assertEqual(backwards, pages[-2::-1])
+
+    def test_last_page(self):
+        ids, links = self.page('/jobs/?pagination=cursor')
+        ids, links = self.page(links['next'])
+        ids, links = self.page(links['next'])
+        self.assertEqual(ids, self.expected[-1:])
+        self.assertIsNone(links['next'])
+        self.assertIsNotNone(links['previous'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('%%%', 'bm9wZQ==', 'bnwyMDI0fDE='):
+            with self.assertRaisesMessage(NotFound, 'Invalid cursor'):
+                self.page(f'/jobs/?cursor={cursor}')
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.poster)
+        ids, url = [], '/jobs/?pagination=cursor'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [job['id'] for job in response.data['results']]
+            url = response.data['links']['next']
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(client.get('/jobs/?cursor=garbage').status_code, 404)
+
+
+class JSONRendererTest(SimpleTestCase):
+    data = {
+        'id': 2 ** 40, 'cost': Decimal('30000.50'), 'ratio': 0.25, 'ok': True, 'none': None,
+        'at': datetime(2024, 5, 1, 8, 30, 15, 123456), 'day': date(2024, 5, 1), 'uuid': uuid.UUID(int=7),
+        'text': 'Lê Lợi \u2028 "quoted" \\ </script>', 'nested': [{'a': [1, 2, {'b': None}]}], 1: 'key',
+    }
+
+    def test_same_output_as_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_floats_decode_to_the_same_values(self):
+        data = {'big': 1e16, 'small': 1e-7, 'pi': 3.141592653589793}
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_ints_beyond_64_bits_fall_back(self):
+        data = {'id': 2 ** 70, 'negative': -2 ** 64}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        self.assertEqual(ORJSONRenderer().render(self.data, 'application/json; indent=2'),
+                         JSONRenderer().render(self.data, 'application/json; indent=2'))
+
+    def test_parser_round_trip(self):
+        rendered = JSONRenderer().render(self.data)
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(rendered)), json.loads(rendered))
+
+    def test_parser_rejects_invalid_json(self):
+        for body in (b'{"a": 1', b'{"a": NaN}', b'{"a": Infinity}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+
+@override_settings(RESPONSE_COMPRESSION={'MIN_LENGTH': 1024, 'BROTLI_QUALITY': 5})
+class CompressionTest(SimpleTestCase):
+    body = json.dumps([{'id': i, 'status': 'FINDING_SHIPPER'} for i in range(100)]).encode()
+
+    def respond(self, accept_encoding, body=None, content_type='application/json'):
+        response = HttpResponse(self.body if body is None else body, content_type=content_type)
+        request = RequestFactory().get('/jobs/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware.CompressionMiddleware(lambda request: response)(request)
+
+    @skipIf(middleware.brotli is None, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        response = self.respond('gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), self.body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_gzip_when_brotli_not_accepted(self):
+        for accept_encoding in ('gzip, deflate', 'gzip, br;q=0'):
+            response = self.respond(accept_encoding)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_identity(self):
+        for accept_encoding in ('', 'identity', 'gzip;q=0'):
+            response = self.respond(accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response.content, self.body)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_responses_and_event_streams_are_not_compressed(self):
+        for response in (self.respond('gzip, br', body=b'{}'),
+                         self.respond('gzip, br', content_type='text/event-stream')):
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class MailBatchTest(SimpleTestCase):
+    recipients = [f'shipper{i}@example.com' for i in range(5)]
+
+    def setUp(self):
+        mailer._reset_connection()
+        self.addCleanup(mailer._reset_connection)
+
+    def failing(self, *calls):
+        """Make the given send_messages calls (1-based) raise like a dropped SMTP connection."""
+        counter = iter(range(1, 1000))
+        send_messages = EmailBackend.send_messages
+
+        def send(backend, messages):
+            if next(counter) in calls:
+                raise smtplib.SMTPServerDisconnected('connection lost')
+            return send_messages(backend, messages)
+
+        return mock.patch.object(EmailBackend, 'send_messages', send)
+
+    def test_one_message_per_recipient_in_batches(self):
+        batch = mailer.MailBatch(batch_size=2)
+        batch.add('Subject', 'email/apologia_email.html', {'uuid': 'abc'}, self.recipients)
+        stats = batch.flush()
+        self.assertEqual((stats['sent'], stats['failed'], stats['unsent'], stats['batches']), (5, 0, [], 3))
+        self.assertEqual([message.to for message in mail.outbox], [[r] for r in self.recipients])
+        self.assertEqual(len({message.alternatives[0][0] for message in mail.outbox}), 1)
+
+    def test_reconnects_once_then_reports_unsent(self):
+        batch = mailer.MailBatch(batch_size=2)
+        batch.add('Subject', 'email/apologia_email.html', {'uuid': 'abc'}, self.recipients)
+        with self.failing(2):
+            self.assertEqual(batch.flush()['sent'], 5)
+        mail.outbox = []
+        batch.add('Subject', 'email/apologia_email.html', {'uuid': 'abc'}, self.recipients)
+        with self.failing(3, 4), self.assertLogs('core.mailer', 'ERROR'):
+            stats = batch.flush()
+        self.assertEqual((stats['sent'], stats['unsent'], stats['batches']), (2, self.recipients[2:], 2))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_task_retries_only_unsent_recipients(self):
+        with self.failing(3, 4), self.assertLogs('core.mailer', 'ERROR'):
+            send_apologia.apply(args=(self.recipients, 'abc'))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), self.recipients)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.poster = User.objects.create_user(username='poster', password='x', role=User.Roles.BASIC_USER)
+        self.admin = User.objects.create_user(username='admin', password='x', role=User.Roles.ADMIN)
+
+    def make_jobs(self, *created):
+        jobs = []
+        for created_at in created:
+            job = make_job(self.poster)
+            # created_at is auto_now_add
+            Job.objects.filter(pk=job.pk).update(created_at=created_at)
+            jobs.append(job)
+        return jobs
+
+    def test_parse_filters(self):
+        filters = export.parse_filters('2024-02-01', '2024-02-29', '1, 5')
+        self.assertEqual(filters, {'since': date(2024, 2, 1), 'until': date(2024, 2, 29), 'statuses': ['1', '5']})
+        self.assertEqual(export.parse_filters(), {})
+        for since in ('yesterday', '2024-13-01', '2024-02-30'):
+            with self.assertRaises(export.ExportError):
+                export.parse_filters(since=since)
+        with self.assertRaises(export.ExportError):
+            export.parse_filters(status='1,9')
+
+    def test_invalid_date_is_a_bad_request(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/exports/jobs/', {'since': '2024-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_windows_cross_equal_created_at(self):
+        same = datetime(2024, 3, 1, 12, 0)
+        jobs = self.make_jobs(datetime(2024, 3, 1, 11, 0), same, same, same, same, same, datetime(2024, 3, 2))
+
+        for chunk_size in (1, 2, 3, 7, 100):
+            ids = [row[0] for row in export.rows(export.jobs(), chunk_size)]
+            self.assertEqual(ids, [job.id for job in jobs])
+
+        filters = export.parse_filters('2024-03-01', '2024-03-01')
+        self.assertEqual([row[0] for row in export.rows(export.jobs(**filters), 2)], [job.id for job in jobs[:6]])
+
+    def test_csv_and_ndjson(self):
+        job, = self.make_jobs(datetime(2024, 3, 1, 12, 0))
+
+        text = ''.join(export.lines(export.rows(export.jobs()), 'csv'))
+        header, row = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(header, export.HEADER)
+        record = dict(zip(header, row))
+        self.assertEqual(record['id'], str(job.id))
+        self.assertEqual(Decimal(record['shipment_cost']), 30000)
+        self.assertEqual(record['winner_id'], '')
+
+        data = b''.join(export.lines(export.rows(export.jobs()), 'ndjson'))
+        lines = data.decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(list(record), export.HEADER)
+        self.assertEqual(record['id'], job.id)
+        # decimals as strings, not floats
+        self.assertIsInstance(record['shipment_cost'], str)
+        self.assertEqual(Decimal(record['shipment_cost']), 30000)
+        self.assertIsNone(record['winner_id'])
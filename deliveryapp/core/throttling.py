@@ -0,0 +1,200 @@
+import logging
+import math
+import re
+import threading
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# Token bucket rate limiting.
+# A bucket holds up to N tokens and refills at N per period; each request takes one. The Redis
+# store keeps buckets in hashes updated by a Lua script, one atomic round trip per request, using
+# the Redis clock so app servers never disagree on time. When Redis can't be reached the store
+# falls back to per-process buckets instead of failing or letting everything through.
+
+_PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+_RATE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*$')
+
+
+def parse_rate(rate):
+    """'5/min', '3/10m', '100/h' -> (capacity, tokens per second); None -> None."""
+    if rate is None:
+        return None
+    match = _RATE.match(rate.lower())
+    if not match or match.group(3) not in _PERIODS:
+        raise ValueError(f'invalid rate {rate!r}')
+    count, multiplier, unit = match.groups()
+    period = int(multiplier or 1) * _PERIODS[unit]
+    return int(count), int(count) / period
+
+
+class InMemoryBucketStore:
+    """Per-process buckets, for tests, development and as the Redis store's fallback."""
+
+    max_buckets = 100_000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Take a token; returns (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if len(self._buckets) >= self.max_buckets and key not in self._buckets:
+                self._buckets.clear()
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1000)
+return {allowed, wait}
+"""
+
+
+class RedisBucketStore:
+    prefix = 'throttle'
+    # after a Redis error, stay on the fallback this long before trying again
+    retry_interval = 5
+
+    def __init__(self, url=None):
+        self.url = url or settings.THROTTLING['REDIS_URL']
+        self._script = None
+        self._fallback = InMemoryBucketStore()
+        self._retry_at = None
+
+    @property
+    def script(self):
+        if self._script is None:
+            # a short timeout: a slow Redis must not slow down every throttled request
+            client = redis.Redis.from_url(self.url, socket_timeout=0.05, socket_connect_timeout=0.05)
+            self._script = client.register_script(TAKE_SCRIPT)
+        return self._script
+
+    def take(self, key, capacity, rate):
+        if self._retry_at is not None and time.monotonic() < self._retry_at:
+            return self._fallback.take(key, capacity, rate)
+        try:
+            # the script works in milliseconds
+            allowed, wait = self.script(keys=[f'{self.prefix}:{key}'], args=[capacity, rate / 1000])
+        except redis.RedisError as e:
+            if self._retry_at is None:
+                logger.warning('rate limiting falls back to in-process buckets: %s', e)
+            self._retry_at = time.monotonic() + self.retry_interval
+            return self._fallback.take(key, capacity, rate)
+        self._retry_at = None
+        return bool(allowed), wait / 1000
+
+    def reset(self):
+        self._fallback.reset()
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(settings.THROTTLING['STORE'])()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle with a token bucket per scope and key. Rates come from THROTTLING['RATES'][scope];
+    a scope without a rate is not limited. Subclasses define get_key.
+    """
+    scope = None
+
+    def __init__(self):
+        self.bucket = parse_rate(settings.THROTTLING['RATES'].get(self.scope))
+        self.retry_after = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.bucket is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        capacity, rate = self.bucket
+        allowed, self.retry_after = get_store().take(f'{self.scope}:{key}', capacity, rate)
+        return allowed
+
+    def wait(self):
+        # DRF turns this into the Retry-After header
+        return math.ceil(self.retry_after) if self.retry_after else None
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Per signed-in user, per client IP for anonymous requests."""
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_key(self, request, view):
+        return f'ip:{self.get_ident(request)}'
+
+
+class EmailThrottle(TokenBucketThrottle):
+    """Per email address in the request body, whoever sends it."""
+
+    def get_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not email or not isinstance(email, str):
+            return None
+        return f'email:{email.strip().lower()}'
+
+
+class OTPIPThrottle(IPThrottle):
+    scope = 'otp_ip'
+
+
+class OTPEmailThrottle(EmailThrottle):
+    scope = 'otp_email'
+
+
+class RegistrationThrottle(IPThrottle):
+    scope = 'registration'
+
+
+class FindThrottle(UserThrottle):
+    scope = 'find'
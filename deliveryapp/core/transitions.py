@@ -0,0 +1,83 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.utils import timezone
+
+from . import rollups
+from .models import Auction, Job, Payment
+
+# Job state machine.
+# Every transition is a single conditional UPDATE ... WHERE status = <expected>, so two concurrent
+# requests can never both win: the loser's UPDATE matches no row. The outcome is read from the
+# affected row count, no SELECT is needed.
+
+JOINED = 'joined'
+ALREADY_JOINED = 'already_joined'
+NOT_AVAILABLE = 'not_available'
+
+
+def _move(job_id, expected, target, *conditions, filters=None, **changes):
+    query = Job.objects.filter(*conditions, pk=job_id, status=expected, **(filters or {}))
+    with transaction.atomic():
+        if query.update(status=target, version=F('version') + 1, updated_at=timezone.now(), **changes) != 1:
+            return False
+        rollups.job_moved(expected, target)
+    return True
+
+
+def _settle_payment(job_id, payment_filters=None):
+    # stamps the job's payment once, taking the amount from the shipment cost in the same statement
+    job = Job.objects.filter(pk=job_id)
+    Payment.objects.filter(Exists(job.filter(payment_id=OuterRef('pk'))), payment_date__isnull=True,
+                           **(payment_filters or {})).update(
+        payment_date=timezone.now(), amount=Subquery(job.values('shipment__cost')[:1]))
+
+
+def join(job_id, shipper_id):
+    with transaction.atomic():
+        # the version bump locks the job row until the auction is written,
+        # so an assign racing with this join waits for it instead of overtaking it
+        if not Job.objects.filter(pk=job_id, status=Job.Status.FINDING_SHIPPER).update(
+                version=F('version') + 1, updated_at=timezone.now()):
+            return NOT_AVAILABLE
+        try:
+            with transaction.atomic():
+                Auction.objects.create(job_id=job_id, shipper_id=shipper_id)
+        except IntegrityError:
+            if not Auction.objects.filter(job_id=job_id, shipper_id=shipper_id).exists():
+                # not a duplicate: the shipper does not exist
+                raise
+            transaction.set_rollback(True)
+            return ALREADY_JOINED
+    return JOINED
+
+
+def assign(job_id, shipper_id, poster_id):
+    """Pick the winner among the shippers that joined the poster's job."""
+    return _move(job_id, Job.Status.FINDING_SHIPPER, Job.Status.WAITING_SHIPPER,
+                 Exists(Auction.objects.filter(job_id=job_id, shipper_id=shipper_id)),
+                 filters={'poster_id': poster_id}, winner_id=shipper_id)
+
+
+def complete(job_id):
+    with transaction.atomic():
+        if not _move(job_id, Job.Status.WAITING_SHIPPER, Job.Status.DONE):
+            return False
+        _settle_payment(job_id)
+    return True
+
+
+def checkout(job_id, payment_id):
+    """An online payment went through: the job starts looking for a shipper."""
+    with transaction.atomic():
+        if not _move(job_id, Job.Status.WAITING_PAY, Job.Status.FINDING_SHIPPER, filters={'payment_id': payment_id}):
+            return False
+        _settle_payment(job_id)
+    return True
+
+
+def cancel(job_id, poster_id):
+    """A poster withdraws a job that has no shipper yet."""
+    for expected in (Job.Status.FINDING_SHIPPER, Job.Status.WAITING_PAY):
+        if _move(job_id, expected, Job.Status.CANCELED, filters={'poster_id': poster_id}):
+            return True
+    return False
@@ -21,6 +21,10 @@ r.register('payment-method', views.PaymentMethodViewSet)
 r.register('feedbacks', views.FeedbackViewSet)
 r.register('account',views.AccountViewSet)
 r.register('coupon',views.CouponViewSet)
+r.register('metrics', views.MetricsViewSet, basename='metrics')
+r.register('exports', views.ExportViewSet, basename='exports')
 urlpatterns = [
+    # before the router so 'feed' is not taken for a shipper-job pk
+    path('shipper-jobs/feed/', views.job_feed, name='shipper-job-feed'),
     path('', include(r.urls))
 ]
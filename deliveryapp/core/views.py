@@ -1,4 +1,5 @@
 import json
+import math
 import secrets
 import string
 import vnpay
@@ -15,14 +16,29 @@ from .serializers import *
 from rest_framework.decorators import action, permission_classes
 from rest_framework.views import Response, APIView
 from django.core.cache import cache
-import cloudinary.uploader
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from datetime import datetime
 from django.utils import timezone
 import random
 from .ultils import *
+from .throttling import FindThrottle, OTPEmailThrottle, OTPIPThrottle, RegistrationThrottle
+from .representation import represent_jobs
+from . import bulk, caching, conditional, events, export, geo, media, metrics, reference, rollups, transitions
+from .db import pool as db_pool
 from deliveryapp.celery import send_otp, send_apologia, send_congratulation, send_otp_to_reset_password
 
 
+DEFAULT_FIND_RADIUS = 5  # km
+MAX_FIND_RADIUS = 30  # km
+# job detail shows the winner's rating, which changes without touching the job
+JOB_DETAIL_VALIDATOR_FIELDS = ('winner__rating_stats__rating_count', 'winner__rating_stats__rating_sum')
+
+
 # Create your views here.
 class BasicUserViewSet(viewsets.ViewSet, generics.CreateAPIView):
     queryset = BasicUser.objects.all()
@@ -45,56 +61,49 @@ class BasicUserViewSet(viewsets.ViewSet, generics.CreateAPIView):
 class AccountViewSet(viewsets.ViewSet):
     queryset = User.objects.all()
 
-    @action(methods=['POST'], detail=False, url_path='user/register')
+    @action(methods=['POST'], detail=False, url_path='user/register', throttle_classes=[RegistrationThrottle])
     def register_user(self, request):
         try:
-            data = request.data
-            avatar = data.get('avatar')
-            res = cloudinary.uploader.upload(avatar, folder='avatar_user/')
-            new_user = User.objects.create_user(
-                first_name=data.get('first_name'),
-                last_name=data.get('last_name'),
-                username=data.get('username'),
-                email=data.get('email'),
-                password=data.get('password'),
-                avatar=res['secure_url'],
-                role=BasicUser.Roles.BASIC_USER
-            )
+            with transaction.atomic():
+                data = request.data
+                new_user = User.objects.create_user(
+                    first_name=data.get('first_name'),
+                    last_name=data.get('last_name'),
+                    username=data.get('username'),
+                    email=data.get('email'),
+                    password=data.get('password'),
+                    role=BasicUser.Roles.BASIC_USER
+                )
+                media.upload_later(new_user, 'avatar', data.get('avatar'), folder='avatar_user/')
             return Response(data=BasicUserSerializer(new_user, context={'request': request}).data,
                             status=status.HTTP_201_CREATED)
         except Exception as e:
             print(f"Error: {str(e)}")
             return Response({'error': 'Error creating user'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @action(methods=['POST'], detail=False, url_path='shipper/register')
+    @action(methods=['POST'], detail=False, url_path='shipper/register', throttle_classes=[RegistrationThrottle])
     def register_shipper(self, request):
         try:
             with transaction.atomic():
                 data = request.data
-                avatar = data.get('avatar')
-                res = cloudinary.uploader.upload(avatar, folder='avatar_user/')
-
                 new_user = User.objects.create_user(
                     first_name=data.get('first_name'),
                     last_name=data.get('last_name'),
                     username=data.get('username'),
                     email=data.get('email'),
                     password=data.get('password'),
-                    avatar=res['secure_url'],
                     role=BasicUser.Roles.SHIPPER,
                     verified=False
                 )
+                media.upload_later(new_user, 'avatar', data.get('avatar'), folder='avatar_user/')
 
-                cmnd = data.get('cmnd')
-                cmnd_file = cloudinary.uploader.upload(cmnd, folder='cmnd/')
-
-                ShipperMore.objects.create(
+                more = ShipperMore.objects.create(
                     user_id=new_user.id,
-                    cmnd=cmnd_file['secure_url'],
                     vehicle_id=data.get('vehicle_id'),
                     vehicle_number=data.get('vehicle_number')
 
                 )
+                media.upload_later(more, 'cmnd', data.get('cmnd'), folder='cmnd/')
 
                 return Response(data=ShipperSerializer(new_user, context={'request': request}).data,
                                 status=status.HTTP_201_CREATED)
@@ -117,7 +126,7 @@ class AccountViewSet(viewsets.ViewSet):
         else:
             return Response({'unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
 
-    @action(methods=['post'], detail=False, url_path='sent-otp')
+    @action(methods=['post'], detail=False, url_path='sent-otp', throttle_classes=[OTPIPThrottle, OTPEmailThrottle])
     def sent_otp(self, request):
         email = request.data.get('email')
 
@@ -157,7 +166,7 @@ class AccountViewSet(viewsets.ViewSet):
         else:
             return Response({'Email and new password are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(methods=['post'], detail=False, url_path='check-account')
+    @action(methods=['post'], detail=False, url_path='check-account', throttle_classes=[RegistrationThrottle])
     def check_account(self, request):
         email = request.data.get('email')
         username = request.data.get('username')
@@ -172,7 +181,8 @@ class AccountViewSet(viewsets.ViewSet):
         else:
             return Response({'Email and username are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(methods=['post'], detail=False, url_path='register/sent-otp')
+    @action(methods=['post'], detail=False, url_path='register/sent-otp',
+            throttle_classes=[OTPIPThrottle, OTPEmailThrottle])
     def sent_otp_to_new_email(self, request):
         email = request.data.get('email')
         username = request.data.get('username')
@@ -203,14 +213,27 @@ class ShipperViewSet(viewsets.ViewSet, generics.RetrieveAPIView, generics.Create
             return Response({}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ReferenceListMixin:
+    # served from core.reference; clients revalidate with If-None-Match
+    reference_table = None
+
+    def list(self, request, *args, **kwargs):
+        table = getattr(reference.get(), self.reference_table)
+        validators = (table.etag, None)
+        response = conditional.not_modified(request, validators) or Response(table.data, status=status.HTTP_200_OK)
+        response['Cache-Control'] = 'no-cache'
+        return conditional.stamp(response, validators)
+
+
 class ShipperMoreViewSet(viewsets.ViewSet):
     queryset = ShipperMore.objects.all()
     serializer_class = ShipperMoreSerializer
 
 
-class VehicleViewSet(viewsets.ViewSet):
+class VehicleViewSet(ReferenceListMixin, viewsets.ViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
+    reference_table = 'vehicles'
 
 
 class ProductViewSet(viewsets.ViewSet):
@@ -218,18 +241,21 @@ class ProductViewSet(viewsets.ViewSet):
     serializer_class = ProductSerializer
 
 
-class ProductCategoryViewSet(viewsets.ViewSet):
+class ProductCategoryViewSet(ReferenceListMixin, viewsets.ViewSet):
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategorySerializer
+    reference_table = 'categories'
 
 
-class JobViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView, generics.RetrieveAPIView):
+class JobViewSet(OptionalKeysetPaginationMixin, viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView,
+                 generics.RetrieveAPIView):
     queryset = Job.objects.select_related('shipment', 'shipment__pick_up', 'shipment__delivery_address', 'product',
                                           'product__category', 'payment',
                                           'payment__method',
                                           'vehicle').order_by('-created_at')
     serializer_class = JobSerializer
     pagination_class = JobPaginator
+    keyset_pagination_class = JobKeysetPaginator
     permission_classes = [BasicUserOwnerJob]
 
     def create(self, request, *args, **kwargs):
@@ -250,15 +276,15 @@ class JobViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView,
 
                 # Product
                 prod_data = json.loads(data.get('product'))
-                res = cloudinary.uploader.upload(prod_data['image'], folder='product/')
-                prod_data['image'] = res['secure_url']
+                image = prod_data.pop('image')
                 product = Product.objects.create(**prod_data)
+                media.upload_later(product, 'image', image, folder='product/')
 
                 # Payment
                 payment_data = json.loads(data.get('payment'))
                 payment = Payment.objects.create(**payment_data)
                 payment_method_id = int(payment_data['method_id'])
-                cash_payment_method_id = PaymentMethod.objects.filter(name__icontains='Tiền mặt').first().id
+                cash_payment_method_id = reference.cash_payment_method().id
 
                 # Job
                 job = json.loads(data.get('order'))
@@ -272,15 +298,44 @@ class JobViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView,
                 if payment_method_id != cash_payment_method_id:
                     job_instance.status = Job.Status.WAITING_PAY
                     job_instance.save(update_fields=['status'])
-                # delete data in redis db
-                for key in cache.keys("job*"):
-                    cache.delete(key)
+                else:
+                    shipment.pick_up = pick_up
+                    job_instance.shipment = shipment
+                    events.publish(events.JOB_CREATED, events.job_payload(job_instance))
+                rollups.shipment_added(shipment)
+                rollups.job_added(job_instance.status)
+                # drop cached job pages by moving to a new generation
+                caching.changed(caching.JOBS)
                 return Response(JobSerializer(job_instance, context={'request': request}).data,
                                 status=status.HTTP_201_CREATED)
         except Exception as e:
             print(e)
             return Response(e, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['post'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        orders = request.data.get('orders') if isinstance(request.data, dict) else None
+        if not isinstance(orders, list) or not orders:
+            return Response({'error_msg': 'orders must be a non-empty list!'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(orders) > settings.JOB_BULK_MAX_ORDERS:
+            return Response({'error_msg': f'At most {settings.JOB_BULK_MAX_ORDERS} orders per request!'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        valid, errors = {}, []
+        for index, order in enumerate(orders):
+            s = BulkJobSerializer(data=order)
+            if s.is_valid():
+                valid[index] = s.validated_data
+            else:
+                errors.append({'index': index, 'errors': s.errors})
+        bulk.check_references(valid, errors)
+        errors.sort(key=lambda error: error['index'])
+
+        jobs = bulk.create_jobs(request.user, list(valid.values())) if valid else []
+        created = [{'index': index, 'job': job} for index, job in zip(valid, represent_jobs(jobs))]
+        return Response({'created': created, 'errors': errors},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
     def list(self, request, *args, **kwargs):
         query = self.get_queryset().filter(poster=request.user.id)
         job_status = request.query_params.get('status')
@@ -289,56 +344,67 @@ class JobViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView,
             status_list = [s for s in job_status.split(',')]
             query = query.filter(status__in=status_list)
         if kw:
-            query = query.filter(Q(shipment__pick_up__city__icontains=kw) | Q(shipment__pick_up__district__icontains=kw)
-                                 | Q(shipment__pick_up__street__icontains=kw) | Q(
-                shipment__pick_up__home_number__icontains=kw))
-        query = self.paginate_queryset(query)
-        jobs = self.serializer_class(data=query, many=True)
-        jobs.is_valid()
-        return Response(self.get_paginated_response(jobs.data), status=status.HTTP_200_OK)
+            query = query.filter(AddressToken.objects.keyword_filter(kw, 'shipment__pick_up', 'shipment__delivery_address'))
+        page = self.paginate_queryset(query)
+        validators = conditional.for_page(request, self.paginator, page)
+        response = conditional.not_modified(request, validators)
+        if response is None:
+            response = Response(self.get_paginated_response(represent_jobs(page)), status=status.HTTP_200_OK)
+        return conditional.stamp(response, validators)
 
     def retrieve(self, request, *args, **kwargs):
-        query = self.get_queryset().filter(id=int(kwargs['pk']), poster=request.user.id).first()
-        return Response(JobDetailSerializer(query).data, status=status.HTTP_200_OK)
+        validators = conditional.for_job(Job.objects.filter(poster=request.user.id), int(kwargs['pk']),
+                                         *JOB_DETAIL_VALIDATOR_FIELDS)
+        response = conditional.not_modified(request, validators)
+        if response is None:
+            query = self.get_queryset().select_related('winner__rating_stats').filter(
+                id=int(kwargs['pk']), poster=request.user.id).first()
+            response = Response(JobDetailSerializer(query).data, status=status.HTTP_200_OK)
+        return conditional.stamp(response, validators)
 
     @action(methods=['post'], detail=True, url_path='assign')
     def assign(self, request, pk=None):
         shipper_id = request.data.get('shipper')
         if shipper_id:
-            selected_shipper = Shipper.objects.get(pk=int(shipper_id))
-            job = Job.objects.filter(id=pk).prefetch_related('auction_job')
-            shippers = [auction.shipper for auction in job[0].auction_job.select_related('shipper').all()]
-            rejected_shipper_emails = [s.email for s in shippers if s.id != int(shipper_id)]
+            shipper_id = int(shipper_id)
+            if not transitions.assign(pk, shipper_id, request.user.id):
+                return Response({'job is not finding shipper or the shipper did not join it'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            caching.changed(caching.JOBS)
+            events.publish(events.JOB_ASSIGNED, {'id': int(pk), 'winner': shipper_id})
+
+            job = self.get_queryset().get(pk=pk)
+            bidders = list(Auction.objects.filter(job_id=pk).values_list('shipper_id', 'shipper__email',
+                                                                        'shipper__first_name'))
+            rejected_shipper_emails = [email for bidder_id, email, _ in bidders if bidder_id != shipper_id]
+            _, winner_email, winner_first_name = next(b for b in bidders if b[0] == shipper_id)
             try:
-                send_apologia.delay(rejected_shipper_emails, str(job[0].uuid.int)[:12])
-                send_congratulation.delay(selected_shipper.email, selected_shipper.first_name)
+                send_apologia.delay(rejected_shipper_emails, job.track_number)
+                send_congratulation.delay(winner_email, winner_first_name)
             except Exception as e:
                 return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            j = Job.objects.get(pk=pk)
-            j.status = Job.Status.WAITING_SHIPPER
-            j.winner_id = shipper_id
-            j.save(update_fields=['status', 'winner_id'])
-            return Response(JobSerializer(job[0], context={'request': request}).data, status=status.HTTP_200_OK)
+            return Response(JobSerializer(job, context={'request': request}).data, status=status.HTTP_200_OK)
         else:
             return Response({'shipper_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['post'], detail=True, url_path='cancel')
+    def cancel(self, request, pk=None):
+        if transitions.cancel(pk, request.user.id):
+            caching.changed(caching.JOBS)
+            events.publish(events.JOB_CANCELLED, {'id': int(pk)})
+            return Response({}, status=status.HTTP_200_OK)
+        else:
+            return Response({'job can not be cancelled'}, status=status.HTTP_400_BAD_REQUEST)
+
     @action(methods=['get'], detail=True, url_path='list-shipper')
     def list_shipper(self, request, pk):
-        user = request.user
-        job = Job.objects.prefetch_related('auction_job').get(pk=pk)
-        try:
-            shippers = [auction.shipper for auction in job.auction_job.select_related('shipper').prefetch_related(
-                Prefetch('shipper', queryset=Shipper.objects.prefetch_related('feedback_shipper'))).all()]
-            feedback_query = [s.feedback_shipper.all() for s in shippers]
-            if feedback_query:
-                return Response(
-                    ShipperWithRatingSerializer(shippers, many=True, context={'feedback': feedback_query[0]}).data,
-                    status=status.HTTP_200_OK)
-            else:
-                return Response(ShipperWithRatingSerializer(shippers, many=True).data, status=status.HTTP_200_OK)
-        except Job.DoesNotExist:
+        # one query: bidders joined with their profile, vehicle and stored rating
+        shippers = Shipper.objects.filter(auction_shipper__job_id=pk).select_related(
+            'shippermore__vehicle', 'rating_stats').order_by('auction_shipper__id')
+        data = ShipperWithRatingSerializer(shippers, many=True).data
+        if not data and not Job.objects.filter(pk=pk).exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_200_OK)
 
     @action(methods=['post'], detail=True, url_path='feedback')
     def feedback(self, request, pk=None):
@@ -349,7 +415,9 @@ class JobViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView,
                 feedback_data = request.data.dict()
                 feedback_data['job_id'] = job.id
                 feedback_data['user_id'] = request.user.id
-                feedback = Feedback.objects.create(**feedback_data)
+                with transaction.atomic():
+                    feedback = Feedback.objects.create(**feedback_data)
+                    ShipperRating.objects.record(feedback.shipper_id, feedback.rating)
                 return Response(FeedbackSerializer(feedback).data, status=status.HTTP_201_CREATED)
             except Exception as e:
                 print(e)
@@ -358,54 +426,105 @@ class JobViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.ListAPIView,
             return Response(status=status.HTTP_403_FORBIDDEN)
 
 
-class ShipperJobViewSet(viewsets.ViewSet, generics.RetrieveAPIView):
+class ShipperJobViewSet(OptionalKeysetPaginationMixin, viewsets.ViewSet, generics.RetrieveAPIView):
     queryset = Job.objects.select_related('shipment', 'shipment__pick_up', 'shipment__delivery_address', 'product',
                                           'product__category', 'payment',
                                           'payment__method',
                                           'vehicle')
     serializer_class = JobSerializer
     pagination_class = JobPaginator
+    keyset_pagination_class = JobKeysetPaginator
     permission_classes = [IsShipper]
 
-    @action(methods=['get'], detail=False, url_path='find')
+    @action(methods=['get'], detail=False, url_path='find', throttle_classes=[FindThrottle])
     def find(self, request):
-        if len(request.query_params) == 1 and 'page' in request.query_params:
-            page = int(request.query_params.get('page'))
-            redis_key = f'job:page:{page}'
-            redis_data = cache.get(redis_key)
-            redis_expire_time = 60 * 5
+        if 'latitude' in request.query_params and 'longitude' in request.query_params:
+            return self.find_nearby(request)
+        if self.use_keyset_pagination():
+            page_key = f"cursor:{request.query_params.get('cursor', '')}"
+        elif len(request.query_params) == 1 and 'page' in request.query_params:
+            page_key = f"page:{int(request.query_params.get('page'))}"
+        else:
+            page_key = None
+        if page_key:
+            # pages exclude jobs the shipper already joined, so they are cached per shipper
+            redis_key = caching.make_key([caching.JOBS, caching.shipper_namespace(request.user.id)],
+                                         f'find:{page_key}')
+            redis_data = caching.get(redis_key)
             if redis_data:
                 return Response(redis_data, status=status.HTTP_200_OK)
             else:
                 query = self.get_queryset().filter(
                     ~Q(auction_job__shipper_id=request.user.id) & Q(status=Job.Status.FINDING_SHIPPER))
                 query = self.paginate_queryset(query)
-                jobs = self.serializer_class(query, many=True)
-                data = self.get_paginated_response(jobs.data)
-                cache.set(redis_key, data, redis_expire_time)
+                data = self.get_paginated_response(represent_jobs(query))
+                caching.set(redis_key, data)
                 return Response(data, status=status.HTTP_200_OK)
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    def find_nearby(self, request):
+        try:
+            latitude = float(request.query_params.get('latitude'))
+            longitude = float(request.query_params.get('longitude'))
+            radius = float(request.query_params.get('radius', DEFAULT_FIND_RADIUS))
+        except (TypeError, ValueError):
+            return Response({'latitude, longitude and radius must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        # float() accepts 'nan' and 'inf', which slip through the range checks below
+        if not all(map(math.isfinite, (latitude, longitude, radius))):
+            return Response({'latitude, longitude and radius must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius <= 0:
+            return Response({'invalid location or radius'}, status=status.HTTP_400_BAD_REQUEST)
+        radius = min(radius, MAX_FIND_RADIUS)
+
+        # only rows under the covering geohash cells are read, then ranked by exact distance
+        cells = geo.covering_cells(latitude, longitude, radius)
+        in_cells = Q()
+        for cell in cells:
+            in_cells |= Q(shipment__pick_up__geohash__startswith=cell)
+        candidates = Job.objects.filter(in_cells, status=Job.Status.FINDING_SHIPPER).exclude(
+            auction_job__shipper_id=request.user.id).values_list(
+            'id', 'shipment__pick_up__latitude', 'shipment__pick_up__longitude')
+
+        ranked = []
+        for job_id, lat, lng in candidates:
+            distance = geo.haversine(latitude, longitude, lat, lng)
+            if distance <= radius:
+                ranked.append((distance, job_id))
+        ranked.sort()
+
+        # results are ranked by distance, so this mode always pages by number
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        jobs = self.get_queryset().in_bulk([job_id for _, job_id in page])
+        data = represent_jobs(jobs[job_id] for _, job_id in page)
+        for job, (distance, _) in zip(data, page):
+            job['distance'] = round(distance, 2)
+        return Response(paginator.get_paginated_response(data), status=status.HTTP_200_OK)
+
     def retrieve(self, request, *args, **kwargs):
         try:
-            query = Job.objects.get(pk=int(kwargs['pk']))
+            # shipper_count changes with joins, which bump the job too
+            validators = conditional.for_job(Job.objects.all(), int(kwargs['pk']), *JOB_DETAIL_VALIDATOR_FIELDS)
+            response = conditional.not_modified(request, validators)
+            if response is not None:
+                return conditional.stamp(response, validators)
+            query = Job.objects.select_related('winner__rating_stats').get(pk=int(kwargs['pk']))
             data = JobDetailSerializer(query).data
             shipper_count = Auction.objects.filter(job__id=int(kwargs['pk'])).count()
             data['shipper_count'] = shipper_count
-            return Response(data, status=status.HTTP_200_OK)
+            return conditional.stamp(Response(data, status=status.HTTP_200_OK), validators)
         except Job.DoesNotExist:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
     @action(methods=['post'], detail=True, url_path='join')
     def join(self, request, pk=None):
-        job = Job.objects.get(pk=pk)
-        if job.status == Job.Status.FINDING_SHIPPER:
-            try:
-                Auction.objects.create(job_id=pk, shipper_id=request.user.id)
-                return Response({"join successfully"}, status=status.HTTP_201_CREATED)
-            except IntegrityError:
-                return Response({"you've already joined this job"}, status=status.HTTP_400_BAD_REQUEST)
+        outcome = transitions.join(pk, request.user.id)
+        if outcome == transitions.JOINED:
+            caching.changed(caching.shipper_namespace(request.user.id))
+            return Response({"join successfully"}, status=status.HTTP_201_CREATED)
+        elif outcome == transitions.ALREADY_JOINED:
+            return Response({"you've already joined this job"}, status=status.HTTP_400_BAD_REQUEST)
         else:
             return Response({"job is not in finding shipper state"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -418,27 +537,17 @@ class ShipperJobViewSet(viewsets.ViewSet, generics.RetrieveAPIView):
             status_list = [int(s) for s in job_status.split(',')]
             query = query.filter(status__in=status_list)
         if kw:
-            query = query.filter(Q(shipment__pick_up__city__icontains=kw) | Q(shipment__pick_up__district__icontains=kw)
-                                 | Q(shipment__pick_up__street__icontains=kw) | Q(
-                shipment__pick_up__home_number__icontains=kw))
-        query = self.paginate_queryset(query)
-        jobs = self.serializer_class(data=query, many=True)
-        jobs.is_valid()
-        return Response(self.get_paginated_response(jobs.data), status=status.HTTP_200_OK)
+            query = query.filter(AddressToken.objects.keyword_filter(kw, 'shipment__pick_up', 'shipment__delivery_address'))
+        page = self.paginate_queryset(query)
+        validators = conditional.for_page(request, self.paginator, page)
+        response = conditional.not_modified(request, validators)
+        if response is None:
+            response = Response(self.get_paginated_response(represent_jobs(page)), status=status.HTTP_200_OK)
+        return conditional.stamp(response, validators)
 
     @action(methods=['post'], detail=True, url_path='complete')
     def complete(self, request, pk=None):
-        job = Job.objects.filter(id=pk).select_related('payment', 'payment__method', 'shipment').first()
-        if job.status == Job.Status.WAITING_SHIPPER:
-            payment = job.payment
-            if payment.payment_date is None:
-                payment.payment_date = timezone.now()
-                payment.amount = job.shipment.cost
-                payment.save(update_fields=['payment_date', 'amount'])
-
-            job.status = Job.Status.DONE
-            job.save(update_fields=['status'])
-
+        if transitions.complete(pk):
             return Response({"complete!!!"}, status=status.HTTP_200_OK)
         else:
             return Response({"job is not in waiting shipper state"}, status=status.HTTP_400_BAD_REQUEST)
@@ -462,22 +571,23 @@ class PaymentViewSet(viewsets.ViewSet):
     @action(methods=['post'], detail=True, url_path='checkout')
     def checkout(self, request, pk=None):
         try:
-            job = Job.objects.filter(id=int(request.data.get('order_id'))).select_related('shipment').first()
-            payment = Payment.objects.get(pk=pk)
-            job.status = Job.Status.FINDING_SHIPPER
-            job.save(update_fields=['status'])
-
-            payment.amount = job.shipment.cost
-            payment.payment_date = timezone.now()
-            payment.save(update_fields=['amount', 'payment_date'])
+            order_id = int(request.data.get('order_id'))
+        except (TypeError, ValueError):
+            return Response({}, status=status.HTTP_400_BAD_REQUEST)
+        if transitions.checkout(order_id, pk):
+            caching.changed(caching.JOBS)
+            # the job becomes visible to shippers only once it is paid
+            job = Job.objects.select_related('shipment__pick_up').get(pk=order_id)
+            events.publish(events.JOB_CREATED, events.job_payload(job))
             return Response({}, status=status.HTTP_200_OK)
-        except Payment.DoesNotExist or Job.DoesNotExist:
+        else:
             return Response({}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PaymentMethodViewSet(viewsets.ViewSet):
+class PaymentMethodViewSet(ReferenceListMixin, viewsets.ViewSet):
     queryset = PaymentMethod.objects.all()
     serializer_class = PaymentMethodSerializer
+    reference_table = 'payment_methods'
 
 
 class AuctionViewSet(viewsets.ViewSet, generics.CreateAPIView):
@@ -494,19 +604,29 @@ class AuctionViewSet(viewsets.ViewSet, generics.CreateAPIView):
         shipper = request.data.get('shipper')
         if job and shipper is not None:
             try:
-                a = Auction.objects.create(job_id=job, shipper_id=shipper)
-                return Response(AuctionSerializer(a).data, status=status.HTTP_201_CREATED)
-            except IntegrityError:
+                # the same transition as shipper-jobs/<id>/join/: checks the job's state and bumps it
+                outcome = transitions.join(job, shipper)
+            except (IntegrityError, ValueError):
                 return Response(data={'error_msg': "job or shipper does not exist!"},
                                 status=status.HTTP_400_BAD_REQUEST)
+            if outcome == transitions.ALREADY_JOINED:
+                return Response(data={'error_msg': "shipper has already joined this job!"},
+                                status=status.HTTP_409_CONFLICT)
+            if outcome == transitions.NOT_AVAILABLE:
+                return Response(data={'error_msg': "job is not in finding shipper state!"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            caching.changed(caching.shipper_namespace(shipper))
+            a = Auction.objects.select_related('shipper').get(job_id=job, shipper_id=shipper)
+            return Response(AuctionSerializer(a).data, status=status.HTTP_201_CREATED)
         else:
             return Response(data={'error_msg': "Job and shipper are required!!!"}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class FeedbackViewSet(viewsets.ViewSet, generics.ListAPIView):
+class FeedbackViewSet(OptionalKeysetPaginationMixin, viewsets.ViewSet, generics.ListAPIView):
     queryset = Feedback.objects.select_related('user', 'job').order_by('-created_at')
     serializer_class = FeedbackSerializer
     pagination_class = FeedbackPaginator
+    keyset_pagination_class = FeedbackKeysetPaginator
     permission_classes = [IsBasicUser]
 
     def list(self, request, *args, **kwargs):
@@ -554,3 +674,79 @@ class CouponViewSet(viewsets.ViewSet):
                 return JsonResponse({'mess': 'coupon not found', 'code': '00'})
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+def _feed_user(request):
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return drf_request.user
+    except exceptions.APIException:
+        return None
+
+
+async def job_feed(request):
+    """
+    Server-sent events stream of job.created / job.assigned / job.cancelled for shippers.
+    Reconnect with the Last-Event-ID header (or ?cursor=) to resume after the last received event.
+    Needs an ASGI server, e.g. uvicorn deliveryapp.asgi:application.
+    """
+    user = await sync_to_async(_feed_user)(request)
+    if user is None or user.is_anonymous:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    if user.role != User.Roles.SHIPPER:
+        return JsonResponse({'detail': 'Only shippers can subscribe to the job feed.'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    heartbeat = settings.JOB_EVENTS['HEARTBEAT']
+
+    async def stream():
+        yield 'retry: 3000\n\n'
+        async for item in events.get_broker().subscribe(cursor, heartbeat):
+            if item is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield events.format_sse(*item)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class ExportViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdmin]
+
+    @action(methods=['get'], detail=False, url_path='jobs')
+    def jobs(self, request):
+        # ?as=csv|ndjson&since=YYYY-MM-DD&until=YYYY-MM-DD&status=1,5
+        export_format = request.query_params.get('as', 'csv')
+        if export_format not in export.FORMATS:
+            return Response({f"as must be one of {', '.join(export.FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            filters = export.parse_filters(request.query_params.get('since'), request.query_params.get('until'),
+                                           request.query_params.get('status'))
+        except export.ExportError as e:
+            return Response({str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(export.lines(export.rows(export.jobs(**filters)), export_format),
+                                         content_type=export.FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{export.filename(export_format, filters)}"'
+        return response
+
+
+class MetricsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdmin]
+
+    def list(self, request):
+        return Response(metrics.report(), status=status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=False, url_path='reset')
+    def reset(self, request):
+        metrics.get_store().reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(methods=['get'], detail=False, url_path='db-pool')
+    def db_pool(self, request):
+        # connection pools are per process: this is the process that answered
+        return Response(db_pool.status(), status=status.HTTP_200_OK)
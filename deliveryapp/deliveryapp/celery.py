@@ -2,10 +2,7 @@ import os
 from django.conf import settings
 from celery import Celery
 
-from django.core.mail import send_mail, EmailMultiAlternatives
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from core.mailer import send_template
 
 # from django.template.loader import render_to_string
 # from django.utils.html import strip_tags
@@ -22,76 +19,51 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
-@app.task(ignore_result=True)
-def send_otp(receiver, otp, first_name):
-    template_name = "email/send_otp_email.html"
-    html_message = render_to_string(template_name, {'first_name': first_name, 'otp': otp})
+def _retry_unsent(task, stats, **retry):
+    # a recipient the SMTP server was not reachable for is mailed again later, with backoff;
+    # pass args/kwargs in retry to narrow a multi-recipient task down to stats['unsent']
+    # (settings are read here: this module is imported while the settings are still loading)
+    retries = settings.EMAIL_BATCH_RETRIES
+    if stats['unsent'] and task.request.retries < retries:
+        raise task.retry(countdown=2 ** task.request.retries, max_retries=retries, **retry)
 
-    message = EmailMultiAlternatives(
-        subject="Mã OTP Xác Thực Cho Tài Khoản Của Bạn",
-        from_email=settings.EMAIL_HOST_USER,
-        to=[receiver]
-    )
-    message.attach_alternative(html_message, "text/html")
-    message.send()
-    return None
 
+@app.task(bind=True, ignore_result=True)
+def send_otp(self, receiver, otp, first_name):
+    stats = send_template("Mã OTP Xác Thực Cho Tài Khoản Của Bạn", "email/send_otp_email.html",
+                          {'first_name': first_name, 'otp': otp}, [receiver])
+    _retry_unsent(self, stats)
+    return None
 
-@app.task(ignore_result=True)
-def send_new_password(receiver, username, password):
-    template_name = "email/send_reset_password_email.html"
-    html_message = render_to_string(template_name, {'username': username, 'password': password})
 
-    message = EmailMultiAlternatives(
-        subject="Mật Khẩu Của Bạn Vừa Được Thay Đổi",
-        from_email=settings.EMAIL_HOST_USER,
-        to=[receiver]
-    )
-    message.attach_alternative(html_message, "text/html")
-    message.send()
+@app.task(bind=True, ignore_result=True)
+def send_new_password(self, receiver, username, password):
+    stats = send_template("Mật Khẩu Của Bạn Vừa Được Thay Đổi", "email/send_reset_password_email.html",
+                          {'username': username, 'password': password}, [receiver])
+    _retry_unsent(self, stats)
     return None
 
 
-@app.task(ignore_result=True)
-def send_otp_to_reset_password(receiver, otp):
-    template_name = "email/send_otp_to_reset_password_email.html"
-    html_message = render_to_string(template_name, {'otp': otp})
-
-    message = EmailMultiAlternatives(
-        subject="Mã OTP Xác Thực Cho Tài Khoản Của Bạn",
-        from_email=settings.EMAIL_HOST_USER,
-        to=[receiver]
-    )
-    message.attach_alternative(html_message, "text/html")
-    message.send()
+@app.task(bind=True, ignore_result=True)
+def send_otp_to_reset_password(self, receiver, otp):
+    stats = send_template("Mã OTP Xác Thực Cho Tài Khoản Của Bạn",
+                          "email/send_otp_to_reset_password_email.html", {'otp': otp}, [receiver])
+    _retry_unsent(self, stats)
     return None
 
 
-@app.task(ignore_result=True)
-def send_apologia(receivers, uuid):
-    template_name = "email/apologia_email.html"
-    html_message = render_to_string(template_name, {'uuid': uuid})
-
-    message = EmailMultiAlternatives(
-        subject="Thông Báo Từ Chối Cho Đơn Hàng Vận Chuyển",
-        from_email=settings.EMAIL_HOST_USER,
-        to=receivers
-    )
-    message.attach_alternative(html_message, "text/html")
-    message.send()
+@app.task(bind=True, ignore_result=True)
+def send_apologia(self, receivers, uuid):
+    # rendered once, then one message per rejected shipper over the pooled connection
+    stats = send_template("Thông Báo Từ Chối Cho Đơn Hàng Vận Chuyển", "email/apologia_email.html",
+                          {'uuid': uuid}, receivers)
+    _retry_unsent(self, stats, args=(stats['unsent'], uuid))
     return None
 
 
-@app.task(ignore_result=True)
-def send_congratulation(receiver, first_name):
-    template_name = "email/congratulation_email.html"
-    html_message = render_to_string(template_name, {'first_name': first_name})
-
-    message = EmailMultiAlternatives(
-        subject="Thông Báo Chọn Làm Shipper Cho Đơn Hàng",
-        from_email=settings.EMAIL_HOST_USER,
-        to=[receiver]
-    )
-    message.attach_alternative(html_message, "text/html")
-    message.send()
+@app.task(bind=True, ignore_result=True)
+def send_congratulation(self, receiver, first_name):
+    stats = send_template("Thông Báo Chọn Làm Shipper Cho Đơn Hàng", "email/congratulation_email.html",
+                          {'first_name': first_name}, [receiver])
+    _retry_unsent(self, stats)
     return None
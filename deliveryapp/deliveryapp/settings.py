@@ -67,6 +67,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,6 +76,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'core.middleware.ProvideClientIdAndClinetSecret',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -82,9 +85,28 @@ REST_FRAMEWORK = {
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     # 'PAGE_SIZE': 2,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
+        'core.authentication.CachedOAuth2Authentication',
         'drf_social_oauth2.authentication.SocialAuthentication',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # reverse proxies in front of the app (docker-compose exposes it directly): the client IP of
+    # throttling comes from X-Forwarded-For only that many hops back, else from REMOTE_ADDR, so a
+    # client can't pick a fresh bucket by sending its own header
+    'NUM_PROXIES': int(os.getenv("NUM_PROXIES", "0")),
+}
+# core.middleware.CompressionMiddleware: brotli when the client accepts it (and the brotli
+# package is installed), gzip otherwise; smaller responses are not worth compressing
+RESPONSE_COMPRESSION = {
+    'MIN_LENGTH': 1024,
+    'BROTLI_QUALITY': 5,
 }
 ROOT_URLCONF = 'deliveryapp.urls'
 
@@ -111,16 +133,39 @@ WSGI_APPLICATION = 'deliveryapp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# core.db.mysql: the MySQL backend with a per-process connection pool (web workers and the Celery
+# worker alike); CONN_MAX_AGE stays 0 so every request / task hands its connection back
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': os.environ.get("DB_ENGINE", "core.db.mysql"),
         'NAME': os.environ.get("MYSQL_DATABASE","deliverydb"),
         'USER': os.environ.get("MYSQL_USER","root"),
         'PASSWORD': os.environ.get("MYSQL_PASSWORD","Admin@123"),
         'HOST': os.environ.get("MYSQL_HOST"),
         'PORT': os.environ.get("DB_PORT",3306),
+        'POOL': {
+            'SIZE': int(os.environ.get("DB_POOL_SIZE", 10)),
+            'TIMEOUT': float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            'MAX_LIFETIME': int(os.environ.get("DB_POOL_MAX_LIFETIME", 30 * 60)),
+            'HEALTH_CHECK_AFTER': int(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", 30)),
+        },
     }
 }
+# read replicas: MYSQL_REPLICA_HOSTS is a comma separated list, each host becomes an alias
+# (replica1, replica2, ...) with the primary's settings; core.db.routers decides who reads where
+for index, host in enumerate(filter(None, os.environ.get("MYSQL_REPLICA_HOSTS", "").split(",")), 1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['core.db.routers.PrimaryReplicaRouter']
+
+REPLICA_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    # after a write, the user's reads stay on the primary this long (replication lag headroom)
+    'STICKY_SECONDS': int(os.environ.get("REPLICA_STICKY_SECONDS", 5)),
+    # apps whose reads always go to the primary: tokens, sessions and payment callbacks
+    'PRIMARY_APPS': ['oauth2_provider', 'sessions', 'social_django', 'vnpay'],
+}
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -144,6 +189,44 @@ CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_TIMEZONE = "Asia/Ho_Chi_Minh"
 CELERY_TASK_TRACK_STARTED = True
 
+# Live job feed (core.events); use core.events.InMemoryBroker for a single process
+JOB_EVENTS = {
+    'BROKER': os.getenv("JOB_EVENT_BROKER", "core.events.RedisBroker"),
+    'REDIS_URL': os.getenv("JOB_EVENT_REDIS_URL", "redis://redis:6379/0"),
+    'HISTORY': 1000,
+    'HEARTBEAT': 15,
+}
+
+# token bucket rate limits (core.throttling), 'count/period' with s, m, h or d and an optional
+# multiplier ('3/10m'); a scope without a rate is not limited
+THROTTLING = {
+    'STORE': os.getenv("THROTTLING_STORE", "core.throttling.RedisBucketStore"),
+    'REDIS_URL': os.getenv("THROTTLING_REDIS_URL", "redis://redis:6379/0"),
+    'RATES': {
+        'otp_email': '3/10m',
+        'otp_ip': '20/h',
+        'registration': '30/h',
+        'find': '60/m',
+    },
+}
+
+# validated access tokens cached with their user (core.authentication): TIMEOUT seconds in Redis
+# and in a per-process LRU of LOCAL_SIZE tokens, never past the token's expiry
+AUTH_TOKEN_CACHE = {
+    'ENABLED': os.getenv("AUTH_TOKEN_CACHE", "1") == "1",
+    'TIMEOUT': int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", "300")),
+    'LOCAL_SIZE': 10000,
+}
+
+# Request metrics (core.middleware.RequestMetricsMiddleware): Server-Timing on every response,
+# SAMPLE_RATE of the requests logged and added to the /metrics/ histograms
+REQUEST_METRICS = {
+    'ENABLED': os.getenv("REQUEST_METRICS", "1") == "1",
+    'SAMPLE_RATE': float(os.getenv("REQUEST_METRICS_SAMPLE_RATE", "0.1")),
+    'STORE': os.getenv("REQUEST_METRICS_STORE", "core.metrics.RedisMetricsStore"),
+    'REDIS_URL': os.getenv("REQUEST_METRICS_REDIS_URL", "redis://redis:6379/0"),
+}
+
 # SMTP Settings
 
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND")
@@ -153,6 +236,9 @@ EMAIL_PORT = os.getenv("EMAIL_PORT")
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL")
+# core.mailer: messages per SMTP batch, and Celery retries of the recipients a task could not reach
+EMAIL_BATCH_SIZE = 50
+EMAIL_BATCH_RETRIES = 3
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -201,6 +287,12 @@ cloudinary.config(
     api_secret=os.getenv("API_SECRET"),
     secure=True
 )
+# Media pipeline: uploads run on the Celery worker through this backend
+# (core.media.LocalMediaStorage keeps files under MEDIA_ROOT for offline use)
+MEDIA_STORAGE_BACKEND = os.getenv("MEDIA_STORAGE_BACKEND", "core.media.CloudinaryMediaStorage")
+MEDIA_UPLOAD_MAX_RETRIES = 5
+# most orders accepted by one POST /jobs/bulk/
+JOB_BULK_MAX_ORDERS = 500
 AUTHENTICATION_BACKENDS = (
     # Others auth providers (e.g. Facebook, OpenId, etc)
     # Google  OAuth2